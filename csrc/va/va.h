@@ -14,6 +14,9 @@ struct vertex_array {
 
 
 void _vertex_array_check_grow(struct vertex_array * va, size_t n);
+void vertex_array_reserve(struct vertex_array * va, size_t n);
+void vertex_array_shrink_to_fit(struct vertex_array * va);
+void vertex_array_alloc_counts(size_t * allocs, size_t * reallocs);
 
 /* hoist the size check into the caller */
 static inline void vertex_array_check_grow(struct vertex_array * va, size_t n)
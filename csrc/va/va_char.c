@@ -34,6 +34,16 @@ void tex_array_append(struct vertex_array * va, float x, float y, float tx, floa
 	_tex_array_append(va, x, y, tx, ty);
 }
 
+/*
+ * Append n vertices, from n rows of (x, y, tx, ty)
+ */
+void tex_array_extend(struct vertex_array * va, const double * rows, size_t n)
+{
+	CHECK(n);
+	for (size_t i=0; i<n; i++, rows += 4)
+		_tex_array_append(va, rows[0], rows[1], rows[2], rows[3]);
+}
+
 /*
  *   Element layout
  *
@@ -12,17 +12,35 @@ struct vertex_xyrgb {
 const int vertex_xy_rgb_offs_r = offsetof(struct vertex_xyrgb, y);
 
 
+/*
+ * Number of data blocks allocated, and reallocated, since load. Exposed for tests,
+ * see vertex_array_alloc_counts
+ */
+static size_t n_block_allocs;
+static size_t n_block_reallocs;
+
 struct vertex_array  * vertex_array_alloc(size_t n, size_t stride) {
 	struct vertex_array * va = (struct vertex_array *)calloc(1, sizeof(struct vertex_array));
 	if (!va)
 		return NULL;
 
-	va->data = calloc(n, stride);
+	// Ensure we always have a block, so growth can double
+	if (n == 0)
+		n = 1;
+
+	if (n > SIZE_MAX/stride)
+	{
+		free(va);
+		return NULL;
+	}
+
+	va->data = malloc(n * stride);
 	if (!va->data)
 	{
 		free(va);
 		return NULL;
 	}
+	n_block_allocs++;
 
 	va->size = n;
 	va->count = 0;
@@ -33,6 +51,26 @@ struct vertex_array  * vertex_array_alloc(size_t n, size_t stride) {
 	return va;
 }
 
+/*
+ * Resize the data block to new_size elements. Aborts on failure, like the append paths
+ */
+static void _vertex_array_resize(struct vertex_array * va, size_t new_size)
+{
+	// Ensure copy size will not wrap
+	if (new_size > SIZE_MAX/va->stride)
+		abort();
+
+	void * new_block = realloc(va->data, new_size * va->stride);
+
+	if (!new_block)
+		abort();
+
+	n_block_reallocs++;
+
+	va->size = new_size;
+	va->data = new_block;
+}
+
 void _vertex_array_check_grow(struct vertex_array * va, size_t n) {
 
 	// Ensure copy size will not wrap
@@ -41,26 +79,39 @@ void _vertex_array_check_grow(struct vertex_array * va, size_t n) {
 
 	size_t new_size = va->size;
 
-	while (new_size < va->size + n)
-		new_size = new_size * 2;
-
 	// Ensure we can grow a 0-sized array
 	if (new_size == 0)
 		new_size = 1024;
 
-	void * old_block = va->data;
-
-	void * new_block = calloc(new_size, va->stride);
+	while (new_size < va->index + n)
+		new_size = new_size * 2;
 
-	if (!new_block)
-		abort();
+	_vertex_array_resize(va, new_size);
+}
 
-	memcpy(new_block, old_block, va->size * va->stride);
+/*
+ * Make room for at least n elements in total
+ */
+void vertex_array_reserve(struct vertex_array * va, size_t n)
+{
+	if (n > va->size)
+		_vertex_array_resize(va, n);
+}
 
-	va->size = new_size;
-	va->data = new_block;
+/*
+ * Release the capacity beyond the current count
+ */
+void vertex_array_shrink_to_fit(struct vertex_array * va)
+{
+	size_t n = va->count ? va->count : 1;
+	if (n < va->size)
+		_vertex_array_resize(va, n);
+}
 
-	free(old_block);
+void vertex_array_alloc_counts(size_t * allocs, size_t * reallocs)
+{
+	*allocs = n_block_allocs;
+	*reallocs = n_block_reallocs;
 }
 
 
@@ -35,3 +35,13 @@ void trace_array_append(struct vertex_array * va, float ax, float ay, float bx,
 	_trace_array_append(va, ax, ay, bx, by, t);
 }
 
+/*
+ * Append n traces, from n rows of (ax, ay, bx, by, t)
+ */
+void trace_array_extend(struct vertex_array * va, const double * rows, size_t n)
+{
+	CHECK(n);
+	for (size_t i=0; i<n; i++, rows += 5)
+		_trace_array_append(va, rows[0], rows[1], rows[2], rows[3], rows[4]);
+}
+
@@ -52,6 +52,16 @@ void via_array_append(struct vertex_array * va, float x, float y, float r, float
 	_via_array_append(va, x, y, r, r_inside);
 }
 
+/*
+ * Public export - append n vias, from n rows of (x, y, r, r_inside)
+ */
+void via_array_extend(struct vertex_array * va, const double * rows, size_t n)
+{
+	CHECK(n);
+	for (size_t i=0; i<n; i++, rows += 4)
+		_via_array_append(va, rows[0], rows[1], rows[2], rows[3]);
+}
+
 
 /*
  * 
@@ -55,6 +55,19 @@ void vertex_xy_array_line(struct vertex_array * va, float x0, float y0, float x1
 	_vertex_xy_array_line(va, x0, y0, x1, y1);
 }
 
+/*
+ * Append n lines, from n rows of (x0, y0, x1, y1)
+ */
+void vertex_xy_array_lines(struct vertex_array * va, const double * rows, size_t n)
+{
+	if (n > SIZE_MAX / 2)
+		abort();
+
+	CHECK(n * 2);
+	for (size_t i=0; i<n; i++, rows += 4)
+		_vertex_xy_array_line(va, rows[0], rows[1], rows[2], rows[3]);
+}
+
 void vertex_xy_array_aligned_box(struct vertex_array * va, float cx, float cy, float w, float h)
 {
 	CHECK(8);
@@ -71,10 +84,8 @@ void vertex_xy_array_aligned_box(struct vertex_array * va, float cx, float cy, f
 	_vertex_xy_array_line(va, x_1, y_2, x_1, y_1);
 }
 
-void vertex_xy_array_box(struct vertex_array * va, float cx, float cy, float w, float h, float theta)
+static void _vertex_xy_array_box(struct vertex_array * va, float cx, float cy, float w, float h, float theta)
 {
-	CHECK(8);
-
 	/* Rotation matrix coefficients
 	 *    2 _
 	 *    /  -_  1
@@ -107,6 +118,25 @@ void vertex_xy_array_box(struct vertex_array * va, float cx, float cy, float w,
 	
 }
 
+void vertex_xy_array_box(struct vertex_array * va, float cx, float cy, float w, float h, float theta)
+{
+	CHECK(8);
+	_vertex_xy_array_box(va, cx, cy, w, h, theta);
+}
+
+/*
+ * Append n boxes, from n rows of (cx, cy, w, h, theta)
+ */
+void vertex_xy_array_boxes(struct vertex_array * va, const double * rows, size_t n)
+{
+	if (n > SIZE_MAX / 8)
+		abort();
+
+	CHECK(n * 8);
+	for (size_t i=0; i<n; i++, rows += 5)
+		_vertex_xy_array_box(va, rows[0], rows[1], rows[2], rows[3], rows[4]);
+}
+
 void vertex_xy_array_roundrect(struct vertex_array * va, float cx, float cy, float w, float h, float theta, float corner_r, size_t n_corner_step)
 {
 
@@ -4,7 +4,8 @@ import sysconfig
 
 def find_so(name: str) -> str:
     # This terrible hack seems to be able to find the compiled acceleration library
-    extension = sysconfig.get_config_var('SO')
+    # 'SO' was removed in Python 3.11 in favour of 'EXT_SUFFIX'
+    extension = sysconfig.get_config_var('EXT_SUFFIX') or sysconfig.get_config_var('SO')
     if extension is None:
         raise ValueError("No system extension for shared objects")
 
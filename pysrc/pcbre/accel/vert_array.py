@@ -3,9 +3,11 @@ from .find_so import find_so
 import pcbre.model.artwork_geom
 import pcbre.model.pad
 
-from typing import TYPE_CHECKING
+import numpy
+
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional
 if TYPE_CHECKING:
-    import numpy
+    import numpy.typing as npt
 
 ffi = FFI()
 
@@ -19,13 +21,18 @@ size_t vertex_array_size(struct vertex_array * va);
 size_t vertex_array_clear(struct vertex_array * va);
 size_t vertex_array_size_bytes(struct vertex_array * va);
 void vertex_array_free(struct vertex_array * va);
+void vertex_array_reserve(struct vertex_array * va, size_t n);
+void vertex_array_shrink_to_fit(struct vertex_array * va);
+void vertex_array_alloc_counts(size_t * allocs, size_t * reallocs);
 void * vertex_array_raw(struct vertex_array * va);
 void vertex_array_concat(struct vertex_array * dest, struct vertex_array * src);
 
 void vertex_xy_array_append(struct vertex_array * va, float x, float y);
 void vertex_xy_array_bench(struct vertex_array * va, size_t count);
 void vertex_xy_array_line(struct vertex_array * va, float x0, float y0, float x1, float y1);
+void vertex_xy_array_lines(struct vertex_array * va, const double * rows, size_t n);
 void vertex_xy_array_box(struct vertex_array * va, float cx, float cy, float w, float h, float theta);
+void vertex_xy_array_boxes(struct vertex_array * va, const double * rows, size_t n);
 void vertex_xy_array_aligned_box(struct vertex_array * va, float cx, float cy, float w, float h);
 void vertex_xy_array_roundrect(struct vertex_array * va, float cx, float cy, float w, float h, float theta,
     float corner_r, size_t n_corner_step);
@@ -36,10 +43,13 @@ void vertex_xy_array_arc(struct vertex_array * va, float cx, float cy, float r,
     size_t n_step);
 
 void trace_array_append(struct vertex_array * va, float ax, float ay, float bx, float by, float t);
+void trace_array_extend(struct vertex_array * va, const double * rows, size_t n);
 
 void via_array_append(struct vertex_array * va, float x, float y, float r, float r_inside);
+void via_array_extend(struct vertex_array * va, const double * rows, size_t n);
 
 void tex_array_append(struct vertex_array * va, float x, float y, float tx, float ty);
+void tex_array_extend(struct vertex_array * va, const double * rows, size_t n);
 void tex_extend_project(struct vertex_array * dest, struct vertex_array * src,
         float c0, float c1, float c2, float c3, float c4, float c5);
 """)
@@ -48,10 +58,78 @@ void tex_extend_project(struct vertex_array * dest, struct vertex_array * src,
 lib = ffi.dlopen(find_so("_va"))
 
 
+def _rows(rows: 'npt.ArrayLike', width: int) -> 'numpy.ndarray':
+    """rows as a C contiguous (n, width) float64 array, for the *_extend calls"""
+    a = numpy.ascontiguousarray(rows, dtype=numpy.float64)
+    if a.size == 0:
+        a = a.reshape(0, width)
+    if a.ndim != 2 or a.shape[1] != width:
+        raise ValueError("Expected an (n, %d) array, got shape %r" % (width, a.shape))
+    return a
+
+
+class AllocStats(NamedTuple):
+    allocs: int      # data blocks malloc'd
+    reallocs: int    # growth, reserve and shrink_to_fit
+    pool_hits: int   # arrays recycled from the pool instead of allocated
+
+
+# Freed arrays, by stride, so that the short lived arrays built per frame (overlays, tools) don't go through malloc
+# each time. Arrays are only kept while small, and only a few per stride
+POOL_MAX_PER_STRIDE = 16
+POOL_MAX_BYTES = 1 << 20
+
+_pool: Dict[int, List[Any]] = {}
+_pool_hits = 0
+
+
+def alloc_stats() -> AllocStats:
+    allocs = ffi.new("size_t *")
+    reallocs = ffi.new("size_t *")
+    lib.vertex_array_alloc_counts(allocs, reallocs)
+    return AllocStats(allocs[0], reallocs[0], _pool_hits)
+
+
+def clear_pool() -> None:
+    for arrays in _pool.values():
+        for va in arrays:
+            lib.vertex_array_free(va)
+    _pool.clear()
+
+
+def _acquire(size: int, stride: int) -> Any:
+    global _pool_hits
+
+    arrays = _pool.get(stride)
+    if not arrays:
+        return lib.vertex_array_alloc(size, stride)
+
+    _pool_hits += 1
+    va = arrays.pop()
+    lib.vertex_array_clear(va)
+    lib.vertex_array_reserve(va, size)
+    return va
+
+
+def _release(va: Any, stride: int) -> None:
+    arrays = _pool.setdefault(stride, [])
+    if len(arrays) < POOL_MAX_PER_STRIDE and lib.vertex_array_size(va) * stride <= POOL_MAX_BYTES:
+        arrays.append(va)
+    else:
+        lib.vertex_array_free(va)
+
+
 class VA:
+    # Long lived arrays are given a version by their owner, changed whenever the contents change, so that renderers
+    # can keep a copy on the GPU. Arrays without one are uploaded on every draw
+    version: Optional[int] = None
+
+    # Layout of one element, see as_numpy
+    dtype: numpy.dtype
+
     def __init__(self, size: int, stride: int) -> None:
         self._stride = stride
-        self._va = lib.vertex_array_alloc(size, stride)
+        self._va = _acquire(size, stride)
 
     @property
     def stride(self) -> int:
@@ -72,6 +150,14 @@ class VA:
     def size(self) -> int:
         return lib.vertex_array_size(self._va) # type: ignore
 
+    def reserve(self, n: int) -> None:
+        """Make room for at least n elements in total, so that appending up to n doesn't reallocate"""
+        lib.vertex_array_reserve(self._va, n)
+
+    def shrink_to_fit(self) -> None:
+        """Give back the space beyond count(), for arrays that are kept around after being built"""
+        lib.vertex_array_shrink_to_fit(self._va)
+
     def raw(self) ->  int:
         buf = lib.vertex_array_raw(self._va)
         return buf # type: ignore
@@ -82,13 +168,22 @@ class VA:
     def buffer(self) -> bytearray:
         return ffi.buffer(self.raw(), self.size_bytes()) # type: ignore
 
+    def as_numpy(self) -> 'numpy.ndarray':
+        """
+        Writable view of the elements, without copying. Only valid until the array next grows, since that moves the
+        storage
+        """
+        return numpy.frombuffer(self.buffer(), dtype=self.dtype)
+
     def __del__(self) -> None:
         if self._va is not None:
-            lib.vertex_array_free(self._va)
+            _release(self._va, self._stride)
             self._va = None
 
 
 class VA_xy(VA):
+    dtype = numpy.dtype([("vertex", numpy.float32, 2)])
+
     def __init__(self, size: int) -> None:
         super(VA_xy, self).__init__(size, 8)
 
@@ -98,9 +193,19 @@ class VA_xy(VA):
     def add_line(self, x0: float, y0: float, x1: float, y1: float) -> None:
         lib.vertex_xy_array_line(self._va, x0, y0, x1, y1)
 
+    def add_line_array(self, lines: 'npt.ArrayLike') -> None:
+        """Add each row (x0, y0, x1, y1) of lines, as add_line does"""
+        a = _rows(lines, 4)
+        lib.vertex_xy_array_lines(self._va, ffi.from_buffer("double[]", a), len(a))
+
     def add_box(self, cx: float, cy: float, w: float, h: float, theta: float) -> None:
         lib.vertex_xy_array_box(self._va, cx, cy, w, h, theta)
 
+    def add_box_array(self, boxes: 'npt.ArrayLike') -> None:
+        """Add each row (cx, cy, w, h, theta) of boxes, as add_box does"""
+        a = _rows(boxes, 5)
+        lib.vertex_xy_array_boxes(self._va, ffi.from_buffer("double[]", a), len(a))
+
     def add_box_round(self, cx: float, cy: float, w: float, h: float, theta: float, r: float, n_steps: int=4) -> None:
         lib.vertex_xy_array_roundrect(self._va, cx, cy, w, h, theta, r, n_steps)
 
@@ -120,12 +225,19 @@ class VA_xy(VA):
         lib.vertex_array_concat(self._va, va._va)
 
 class VA_thickline(VA):
+    dtype = numpy.dtype([("pos_a", numpy.float32, 2), ("pos_b", numpy.float32, 2), ("thickness", numpy.float32)])
+
     def __init__(self, size: int) -> None:
         super(VA_thickline, self).__init__(size, 20)
 
     def add_thickline(self, x0: float, y0: float, x1: float, y1: float, t: float) -> None:
         lib.trace_array_append(self._va, x0, y0, x1, y1, t)
 
+    def add_thickline_array(self, lines: 'npt.ArrayLike') -> None:
+        """Add each row (x0, y0, x1, y1, t) of lines, as add_thickline does"""
+        a = _rows(lines, 5)
+        lib.trace_array_extend(self._va, ffi.from_buffer("double[]", a), len(a))
+
     # Convenience function for adding a trace to the thickline draw set
     def add_trace(self, t: pcbre.model.artwork_geom.Trace) -> None:
         lib.trace_array_append(self._va, t.p0.x, t.p0.y, t.p1.x, t.p1.y, t.thickness/2)
@@ -135,12 +247,19 @@ class VA_thickline(VA):
 
 
 class VA_via(VA):
+    dtype = numpy.dtype([("pos", numpy.float32, 2), ("r", numpy.float32), ("r_inside_frac_sq", numpy.float32)])
+
     def __init__(self, size: int) -> None:
         super(VA_via, self).__init__(size, 16)
 
     def add_donut(self, x: float, y: float, r: float, r_inside: float = 0) -> None:
         lib.via_array_append(self._va, x, y, r, r_inside)
 
+    def add_donut_array(self, donuts: 'npt.ArrayLike') -> None:
+        """Add each row (x, y, r, r_inside) of donuts, as add_donut does"""
+        a = _rows(donuts, 4)
+        lib.via_array_extend(self._va, ffi.from_buffer("double[]", a), len(a))
+
     def add_th_pad(self, pad: pcbre.model.pad.Pad) -> None:
         self.add_donut(pad.center.x, pad.center.y, pad.width/2, pad.th_diam/2)
 
@@ -151,6 +270,8 @@ class VA_via(VA):
         lib.vertex_array_concat(self._va, va._va)
 
 class VA_tex(VA):
+    dtype = numpy.dtype([("vertex", numpy.float32, 2), ("texpos", numpy.float32, 2)])
+
     def __init__(self, size: int) -> None:
         """
         Preallocate a texture VA, reserving space for `size` elements
@@ -160,6 +281,11 @@ class VA_tex(VA):
     def add_tex(self, x: float, y: float, tx: float, ty: float) -> None:
         lib.tex_array_append(self._va, x, y, tx, ty)
 
+    def add_tex_array(self, verts: 'npt.ArrayLike') -> None:
+        """Add each row (x, y, tx, ty) of verts, as add_tex does"""
+        a = _rows(verts, 4)
+        lib.tex_array_extend(self._va, ffi.from_buffer("double[]", a), len(a))
+
     def extend(self, va: 'VA_tex') -> None:
         lib.vertex_array_concat(self._va, va._va)
 
@@ -27,15 +27,14 @@ def dist_trace_trace(trace_1: Trace, trace_2: Trace) -> float:
 
 
 def dist_via_trace(via: Via, trace: Trace) -> float:
-    if trace.layer not in via.viapair.all_layers:
+    if not via.viapair.layer_mask & trace.layer.mask:
         return float("inf")
     return (dist_pt_line_seg(via.pt, trace.p0, trace.p1) -
             trace.thickness / 2 - via.r)
 
 
 def dist_via_via(via_1: Via, via_2: Via) -> float:
-    if not set(via_1.viapair.all_layers) \
-            .intersection(via_2.viapair.all_layers):
+    if not via_1.viapair.layer_mask & via_2.viapair.layer_mask:
         return float("inf")
     d = (via_1.pt - via_2.pt).mag()
     return d - via_1.r - via_2.r
@@ -97,7 +96,7 @@ dist_polygon_trace = dist_polygon_polygon
 
 
 def dist_polygon_via(p: Polygon, v: Via) -> float:
-    if p.layer not in v.viapair.all_layers:
+    if not v.viapair.layer_mask & p.layer.mask:
         return float("inf")
 
     # ignoring typing here since we don't have stubs for the polygon lib
@@ -126,10 +125,10 @@ dist_virtual_line_polygon = dist_virtual_line_XX
 
 
 def dist_virtual_line_via(airwire: Airwire, via: Via) -> float:
-    layers = via.viapair.all_layers
-    if airwire.p0_layer in layers and point_inside(via, airwire.p0):
+    mask = via.viapair.layer_mask
+    if airwire.p0_layer.mask & mask and point_inside(via, airwire.p0):
         return 0
-    elif airwire.p1_layer in layers and point_inside(via, airwire.p1):
+    elif airwire.p1_layer.mask & mask and point_inside(via, airwire.p1):
         return 0
 
     return float("inf")
@@ -0,0 +1,301 @@
+"""Batched NumPy versions of the distance functions in pcbre.algo.geom.
+
+GeomArrays packs a sequence of geometry into a struct-of-arrays: segment endpoints, half widths, centers and layer
+bitmasks. GeomArrays.distances then computes the distance for many index pairs in one vectorized call.
+
+Traces, vias and pads are vectorized. The kernels repeat the operation order of the scalar functions, including their
+per-type layer rules, so results agree with pcbre.algo.geom.distance to within float rounding. Pairs involving any
+other geometry (polygons, airwires) fall back to the scalar function."""
+
+from typing import Any, Dict, List, Sequence, TYPE_CHECKING
+
+import numpy
+
+from pcbre.algo.geom import distance
+from pcbre.model.artwork_geom import Trace, Via
+from pcbre.model.pad import Pad
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+    from pcbre.model.artwork_geom import Geom
+
+__author__ = 'davidc'
+
+KIND_TRACE = 0
+KIND_VIA = 1
+KIND_PAD = 2
+KIND_OTHER = 3
+
+# Layer masks are held in a uint64, larger stackups use the scalar path
+MAX_LAYERS = 64
+
+# Smallest candidate list distances_to will vectorize
+BATCH_MIN = 32
+
+
+def _pt_seg(px: 'npt.NDArray[numpy.float64]', py: 'npt.NDArray[numpy.float64]',
+            l1x: 'npt.NDArray[numpy.float64]', l1y: 'npt.NDArray[numpy.float64]',
+            l2x: 'npt.NDArray[numpy.float64]', l2y: 'npt.NDArray[numpy.float64]') -> 'npt.NDArray[numpy.float64]':
+    """Vectorized pcbre.matrix.dist_point_off_line_seg"""
+    vx = l2x - l1x
+    vy = l2y - l1y
+    length_square = vx ** 2 + vy ** 2
+
+    dx = px - l1x
+    dy = py - l1y
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = (dx * vx + dy * vy) / length_square
+
+    # Zero length segments collapse to distance-to-point. NaN compares false, so use the start point
+    t = numpy.where(length_square == 0, 0.0, t)
+
+    d_start = numpy.sqrt(dx ** 2 + dy ** 2)
+    d_end = numpy.sqrt((px - l2x) ** 2 + (py - l2y) ** 2)
+    d_proj = numpy.sqrt((px - (l1x + vx * t)) ** 2 + (py - (l1y + vy * t)) ** 2)
+
+    return numpy.where((t < 0) | (length_square == 0), d_start, numpy.where(t > 1.0, d_end, d_proj))
+
+
+def _seg_seg(ax0: 'npt.NDArray[numpy.float64]', ay0: 'npt.NDArray[numpy.float64]',
+             ax1: 'npt.NDArray[numpy.float64]', ay1: 'npt.NDArray[numpy.float64]',
+             bx0: 'npt.NDArray[numpy.float64]', by0: 'npt.NDArray[numpy.float64]',
+             bx1: 'npt.NDArray[numpy.float64]', by1: 'npt.NDArray[numpy.float64]') -> 'npt.NDArray[numpy.float64]':
+    """Vectorized pcbre.matrix.line_distance_segment"""
+    v1x = ax1 - ax0
+    v1y = ay1 - ay0
+    v2x = bx1 - bx0
+    v2y = by1 - by0
+    qpx = bx0 - ax0
+    qpy = by0 - ay0
+
+    u_num = qpx * v1y - qpy * v1x
+    v_num = qpx * v2y - qpy * v2x
+    denom = v1x * v2y - v1y * v2x
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        u = u_num / denom
+        v = v_num / denom
+
+    crossing = (u_num != 0) & (denom != 0) & (0 <= u) & (u <= 1) & (0 <= v) & (v <= 1)
+
+    d = numpy.minimum(
+        numpy.minimum(_pt_seg(ax0, ay0, bx0, by0, bx1, by1), _pt_seg(ax1, ay1, bx0, by0, bx1, by1)),
+        numpy.minimum(_pt_seg(bx0, by0, ax0, ay0, ax1, ay1), _pt_seg(bx1, by1, ax0, ay0, ax1, ay1)))
+
+    return numpy.where(crossing, 0.0, d)
+
+
+class GeomArrays:
+    """
+    Struct-of-arrays view of a sequence of geometry, for batched distance queries
+
+    Per object:
+        x0, y0, x1, y1: segment. Traces use their endpoints, vias their center, pads their trace representation
+        hw: half width of the segment (trace thickness / 2, via radius)
+        cx, cy, cw: pad center and half pad width, used by the circular pad and via-pad cases
+        mask: bitmask of layers the object is on
+        through: pad is through-hole
+        circle: pad is circular
+    """
+
+    def __init__(self, geoms: Sequence['Geom']) -> None:
+        self.geoms = list(geoms)
+        n = len(self.geoms)
+
+        self.__layer_bits: Dict[Any, int] = {}
+        self.__viapair_masks: Dict[Any, int] = {}
+
+        self.kind = numpy.full(n, KIND_OTHER, dtype=numpy.int8)
+        self.x0 = numpy.zeros(n)
+        self.y0 = numpy.zeros(n)
+        self.x1 = numpy.zeros(n)
+        self.y1 = numpy.zeros(n)
+        self.hw = numpy.zeros(n)
+        self.cx = numpy.zeros(n)
+        self.cy = numpy.zeros(n)
+        self.cw = numpy.zeros(n)
+        self.mask = numpy.zeros(n, dtype=numpy.uint64)
+        self.through = numpy.zeros(n, dtype=bool)
+        self.circle = numpy.zeros(n, dtype=bool)
+
+        for i, g in enumerate(self.geoms):
+            try:
+                self.__pack(i, g)
+            except OverflowError:
+                self.kind[i] = KIND_OTHER
+
+    def __len__(self) -> int:
+        return len(self.geoms)
+
+    def __layer_mask(self, layers: Sequence[Any]) -> int:
+        mask = 0
+        for layer in layers:
+            try:
+                bit = self.__layer_bits[layer]
+            except KeyError:
+                bit = len(self.__layer_bits)
+                if bit >= MAX_LAYERS:
+                    raise OverflowError()
+                self.__layer_bits[layer] = bit
+
+            mask |= 1 << bit
+        return mask
+
+    def __pack(self, i: int, g: 'Geom') -> None:
+        if isinstance(g, Trace):
+            self.x0[i], self.y0[i] = g.p0.x, g.p0.y
+            self.x1[i], self.y1[i] = g.p1.x, g.p1.y
+            self.hw[i] = g.thickness / 2
+            self.mask[i] = self.__layer_mask([g.layer])
+            self.kind[i] = KIND_TRACE
+
+        elif isinstance(g, Via):
+            self.x0[i] = self.x1[i] = self.cx[i] = g.pt.x
+            self.y0[i] = self.y1[i] = self.cy[i] = g.pt.y
+            self.hw[i] = g.r
+            try:
+                self.mask[i] = self.__viapair_masks[g.viapair]
+            except KeyError:
+                self.mask[i] = self.__viapair_masks[g.viapair] = self.__layer_mask(g.viapair.all_layers)
+            self.kind[i] = KIND_VIA
+
+        elif isinstance(g, Pad):
+            self.cx[i], self.cy[i] = g.center.x, g.center.y
+            self.cw[i] = g.width / 2
+            self.through[i] = g.is_through()
+            self.circle[i] = g.width == g.length
+            self.mask[i] = self.__layer_mask([g.layer])
+
+            if not self.circle[i]:
+                tr = g.trace_repr
+                self.x0[i], self.y0[i] = tr.p0.x, tr.p0.y
+                self.x1[i], self.y1[i] = tr.p1.x, tr.p1.y
+                self.hw[i] = tr.thickness / 2
+
+            self.kind[i] = KIND_PAD
+
+    def distances(self, ia: 'npt.NDArray[numpy.intp]', ib: 'npt.NDArray[numpy.intp]') -> \
+            'npt.NDArray[numpy.float64]':
+        """
+        Distance between geoms[ia[k]] and geoms[ib[k]] for all k. Equivalent to
+        [distance(geoms[a], geoms[b]) for a, b in zip(ia, ib)]
+        """
+        ia = numpy.asarray(ia, dtype=numpy.intp)
+        ib = numpy.asarray(ib, dtype=numpy.intp)
+        out = numpy.empty(len(ia))
+
+        ka = self.kind[ia]
+        kb = self.kind[ib]
+
+        # Pairs are grouped by kind, then swapped where needed so each kernel sees a fixed argument order
+        def sel(k1: int, k2: int) -> 'npt.NDArray[numpy.intp]':
+            return numpy.flatnonzero((ka == k1) & (kb == k2))
+
+        # distance() dispatches pairs of the same type with the arguments swapped. It matters for pad-pad, which
+        # only checks the through-hole flag of its first argument
+        s = sel(KIND_TRACE, KIND_TRACE)
+        out[s] = self.__trace_trace(ib[s], ia[s])
+
+        # via-trace is symmetric
+        s = sel(KIND_VIA, KIND_TRACE)
+        out[s] = self.__via_trace(ia[s], ib[s])
+        s = sel(KIND_TRACE, KIND_VIA)
+        out[s] = self.__via_trace(ib[s], ia[s])
+
+        s = sel(KIND_VIA, KIND_VIA)
+        out[s] = self.__via_via(ib[s], ia[s])
+
+        s = sel(KIND_VIA, KIND_PAD)
+        out[s] = self.__via_pad(ia[s], ib[s])
+        s = sel(KIND_PAD, KIND_VIA)
+        out[s] = self.__via_pad(ib[s], ia[s])
+
+        s = sel(KIND_TRACE, KIND_PAD)
+        out[s] = self.__trace_pad(ia[s], ib[s])
+        s = sel(KIND_PAD, KIND_TRACE)
+        out[s] = self.__trace_pad(ib[s], ia[s])
+
+        s = sel(KIND_PAD, KIND_PAD)
+        out[s] = self.__pad_pad(ib[s], ia[s])
+
+        for k in numpy.flatnonzero((ka == KIND_OTHER) | (kb == KIND_OTHER)):
+            out[k] = distance(self.geoms[ia[k]], self.geoms[ib[k]])
+
+        return out
+
+    def __seg_seg(self, a: 'npt.NDArray[numpy.intp]', b: 'npt.NDArray[numpy.intp]') -> 'npt.NDArray[numpy.float64]':
+        return _seg_seg(self.x0[a], self.y0[a], self.x1[a], self.y1[a],
+                        self.x0[b], self.y0[b], self.x1[b], self.y1[b])
+
+    def __same_layer(self, a: 'npt.NDArray[numpy.intp]', b: 'npt.NDArray[numpy.intp]') -> 'npt.NDArray[numpy.bool_]':
+        return (self.mask[a] & self.mask[b]) != 0
+
+    def __trace_trace(self, a: 'npt.NDArray[numpy.intp]', b: 'npt.NDArray[numpy.intp]') -> \
+            'npt.NDArray[numpy.float64]':
+        d = self.__seg_seg(a, b) - self.hw[a] - self.hw[b]
+        return numpy.where(self.__same_layer(a, b), d, numpy.inf)
+
+    def __via_trace(self, v: 'npt.NDArray[numpy.intp]', t: 'npt.NDArray[numpy.intp]') -> \
+            'npt.NDArray[numpy.float64]':
+        d = _pt_seg(self.cx[v], self.cy[v], self.x0[t], self.y0[t], self.x1[t], self.y1[t]) - self.hw[t] - self.hw[v]
+        return numpy.where(self.__same_layer(v, t), d, numpy.inf)
+
+    def __via_via(self, a: 'npt.NDArray[numpy.intp]', b: 'npt.NDArray[numpy.intp]') -> 'npt.NDArray[numpy.float64]':
+        d = numpy.sqrt((self.cx[a] - self.cx[b]) ** 2 + (self.cy[a] - self.cy[b]) ** 2) - self.hw[a] - self.hw[b]
+        return numpy.where(self.__same_layer(a, b), d, numpy.inf)
+
+    def __via_pad(self, v: 'npt.NDArray[numpy.intp]', p: 'npt.NDArray[numpy.intp]') -> 'npt.NDArray[numpy.float64]':
+        # No layer test, matches dist_via_pad
+        return numpy.sqrt((self.cx[v] - self.cx[p]) ** 2 + (self.cy[v] - self.cy[p]) ** 2) - self.cw[p] - self.hw[v]
+
+    def __trace_pad(self, t: 'npt.NDArray[numpy.intp]', p: 'npt.NDArray[numpy.intp]') -> \
+            'npt.NDArray[numpy.float64]':
+        circle = self.circle[p]
+        same_layer = self.__same_layer(t, p)
+
+        d_circle = _pt_seg(self.cx[p], self.cy[p], self.x0[t], self.y0[t], self.x1[t], self.y1[t]) - \
+            self.hw[t] - self.cw[p]
+        d_rect = self.__seg_seg(p, t) - self.hw[p] - self.hw[t]
+
+        # Circular through-hole pads are on all layers. Rectangular pads go through dist_trace_trace, which
+        # always requires the same layer
+        ok = numpy.where(circle, same_layer | self.through[p], same_layer)
+        return numpy.where(ok, numpy.where(circle, d_circle, d_rect), numpy.inf)
+
+    def __pad_pad(self, a: 'npt.NDArray[numpy.intp]', b: 'npt.NDArray[numpy.intp]') -> 'npt.NDArray[numpy.float64]':
+        both_circle = self.circle[a] & self.circle[b]
+        same_layer = self.__same_layer(a, b)
+
+        d_circle = numpy.sqrt((self.cx[a] - self.cx[b]) ** 2 + (self.cy[a] - self.cy[b]) ** 2) - \
+            self.cw[a] - self.cw[b]
+
+        # A circular pad on its own has no segment packed, fill in the degenerate trace_repr
+        ax0 = numpy.where(self.circle[a], self.cx[a], self.x0[a])
+        ay0 = numpy.where(self.circle[a], self.cy[a], self.y0[a])
+        ax1 = numpy.where(self.circle[a], self.cx[a], self.x1[a])
+        ay1 = numpy.where(self.circle[a], self.cy[a], self.y1[a])
+        bx0 = numpy.where(self.circle[b], self.cx[b], self.x0[b])
+        by0 = numpy.where(self.circle[b], self.cy[b], self.y0[b])
+        bx1 = numpy.where(self.circle[b], self.cx[b], self.x1[b])
+        by1 = numpy.where(self.circle[b], self.cy[b], self.y1[b])
+        hwa = numpy.where(self.circle[a], self.cw[a], self.hw[a])
+        hwb = numpy.where(self.circle[b], self.cw[b], self.hw[b])
+        d_rect = _seg_seg(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1) - hwa - hwb
+
+        # The first pad's through-hole flag only exempts the circle-circle case, as in dist_pad_pad
+        ok = numpy.where(both_circle, same_layer | self.through[a], same_layer)
+        return numpy.where(ok, numpy.where(both_circle, d_circle, d_rect), numpy.inf)
+
+
+def distances_to(query: 'Geom', candidates: Sequence['Geom']) -> List[float]:
+    """
+    Distance from query to each candidate. Small candidate lists don't amortize the cost of packing arrays, so they
+    use the scalar functions
+    """
+    n = len(candidates)
+    if n < BATCH_MIN:
+        return [distance(query, c) for c in candidates]
+
+    arrays = GeomArrays([query, *candidates])
+    return arrays.distances(numpy.zeros(n, dtype=numpy.intp), numpy.arange(1, n + 1)).tolist()
@@ -0,0 +1,203 @@
+"""Parallel broad-phase/narrow-phase search for intersecting geometry, used to rebuild board connectivity.
+
+The board bounding box is cut into a grid of tiles, and every trace and via is assigned to each tile its bbox
+overlaps. Tiles are processed independently in a process pool. Each worker rebuilds lightweight Trace/Via objects
+and runs the same batched distance kernels as the serial path, so the resulting pairs are identical.
+
+A pair of objects can share several tiles. To avoid duplicates, a pair is only reported by the tile containing the
+lower-left corner of the intersection of the two bboxes. That point lies in both bboxes, and tile assignment is
+monotonic in x and y, so that tile always has both objects.
+
+Only traces and vias are sent to the workers. Pads, polygons and airwires need their parent objects and make up a
+small part of a typical board, so pairs involving them are found serially on the calling process."""
+
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, TYPE_CHECKING
+
+import numpy
+from rtree import index  # type: ignore
+
+from pcbre.algo.geom_batch import GeomArrays
+from pcbre.matrix import Point2
+from pcbre.model.artwork_geom import Trace, Via
+
+if TYPE_CHECKING:
+    from pcbre.model.artwork_geom import Geom
+    from pcbre.model.stackup import Layer, ViaPair
+
+__author__ = 'davidc'
+
+# Tiles per worker. More tiles than workers balances load when geometry density varies across the board
+TILES_PER_WORKER = 4
+
+_BBox = Tuple[float, float, float, float]
+
+# left, bottom, tile width, tile height, tiles in x, tiles in y
+_Grid = Tuple[float, float, float, float, int, int]
+
+# Packed geometry records sent to workers
+# (position, bbox, 'T', x0, y0, x1, y1, thickness, layer_no)
+# (position, bbox, 'V', x, y, r, viapair_no)
+_Record = Tuple[Any, ...]
+
+
+class _ViaPairSpan:
+    """Stand-in for ViaPair in worker processes, a ViaSpan. Layers are replaced by their stackup position"""
+
+    def __init__(self, all_layers: Tuple[int, ...]) -> None:
+        self.all_layers = all_layers
+
+
+def _bbox_tuple(geom: 'Geom') -> _BBox:
+    bbox = geom.bbox
+    return bbox.left, bbox.bottom, bbox.right, bbox.top
+
+
+def pack_geometry(geoms: Sequence[Tuple[int, 'Geom']],
+                  layer_no: Dict['Layer', int],
+                  viapair_no: Dict['ViaPair', int]) -> List[_Record]:
+    records: List[_Record] = []
+    for n, g in geoms:
+        if isinstance(g, Trace):
+            records.append((n, _bbox_tuple(g), 'T',
+                            g.p0.x, g.p0.y, g.p1.x, g.p1.y, g.thickness, layer_no[g.layer]))
+        elif isinstance(g, Via):
+            records.append((n, _bbox_tuple(g), 'V',
+                            g.pt.x, g.pt.y, g.r, viapair_no[g.viapair]))
+        else:
+            raise TypeError("Only traces and vias may be packed, not %r" % g)
+
+    return records
+
+
+def _unpack_record(rec: _Record, spans: Sequence[_ViaPairSpan]) -> 'Geom':
+    if rec[2] == 'T':
+        _, _, _, x0, y0, x1, y1, thickness, layer = rec
+        return Trace(Point2(x0, y0), Point2(x1, y1), thickness, layer)
+    else:
+        _, _, _, x, y, r, vp = rec
+        return Via(Point2(x, y), spans[vp], r)
+
+
+def _cell(grid: _Grid, x: float, y: float) -> Tuple[int, int]:
+    # Both the tile assignment and the dedup test must use this, so that they agree exactly on tile edges
+    left, bottom, tw, th, nx, ny = grid
+    return min(nx - 1, int((x - left) / tw)), min(ny - 1, int((y - bottom) / th))
+
+
+def _tile_pairs(grid: _Grid, tile: Tuple[int, int], records: Sequence[_Record],
+                span_layers: Sequence[Tuple[int, ...]]) -> List[Tuple[int, int]]:
+    """
+    Worker entry point. Returns (lower position, higher position) for all intersecting pairs owned by the tile
+    """
+    spans = [_ViaPairSpan(i) for i in span_layers]
+
+    geoms = [_unpack_record(rec, spans) for rec in records]
+
+    idx = index.Index(((n, rec[1], None) for n, rec in enumerate(records)))
+
+    ia = []
+    ib = []
+    for n, rec in enumerate(records):
+        pos_a = rec[0]
+        l_a, b_a, _, _ = rec[1]
+
+        for m in idx.intersection(rec[1]):
+            other = records[m]
+            pos_b = other[0]
+            if pos_b <= pos_a:
+                continue
+
+            # Reference point dedup
+            if _cell(grid, max(l_a, other[1][0]), max(b_a, other[1][1])) != tile:
+                continue
+
+            ia.append(n)
+            ib.append(m)
+
+    if not ia:
+        return []
+
+    hits = (GeomArrays(geoms).distances(numpy.array(ia), numpy.array(ib)) <= 0).nonzero()[0]
+    return [(records[ia[k]][0], records[ib[k]][0]) for k in hits.tolist()]
+
+
+def _tile_grid(bboxes: Sequence[_BBox], tile_count: int) -> _Grid:
+    left = min(b[0] for b in bboxes)
+    bottom = min(b[1] for b in bboxes)
+    right = max(b[2] for b in bboxes)
+    top = max(b[3] for b in bboxes)
+
+    nx = ny = max(1, int(math.ceil(math.sqrt(tile_count))))
+
+    # Degenerate boards (all geometry on a line) still need a nonzero tile size
+    tw = (right - left) / nx or 1.0
+    th = (top - bottom) / ny or 1.0
+    return left, bottom, tw, th, nx, ny
+
+
+def parallel_intersecting_pairs(
+        all_geom: Sequence['Geom'],
+        serial_pairs: Callable[[Sequence[int]], Iterable[Tuple[int, int]]],
+        layer_no: Dict['Layer', int],
+        viapair_layers: Dict['ViaPair', Tuple[int, ...]],
+        workers: int,
+        progress_cb: Callable[[int, int], None] = lambda x, y: None) -> List[Tuple[int, int]]:
+    """
+    Find all intersecting pairs within all_geom, by position
+
+    :param all_geom: geometry to search
+    :param serial_pairs: callback that returns all intersecting pairs with at least one member in the given
+                         positions, for geometry the workers can't handle
+    :param layer_no: stackup position of each layer
+    :param viapair_layers: stackup positions of all layers spanned by each via pair
+    :param workers: process count
+    :param progress_cb: progress callback, called with (tiles done, tile count)
+    :return: list of (lower position, higher position) pairs
+    """
+    packable = []
+    other = []
+    for n, g in enumerate(all_geom):
+        if isinstance(g, (Trace, Via)):
+            packable.append((n, g))
+        else:
+            other.append(n)
+
+    viapair_no = {vp: n for n, vp in enumerate(viapair_layers)}
+    span_layers = list(viapair_layers.values())
+
+    pairs: List[Tuple[int, int]] = []
+
+    if packable:
+        records = pack_geometry(packable, layer_no, viapair_no)
+
+        grid = _tile_grid([r[1] for r in records], workers * TILES_PER_WORKER)
+
+        tiles: Dict[Tuple[int, int], List[_Record]] = {}
+        for rec in records:
+            l, b, r, t = rec[1]
+            ix0, iy0 = _cell(grid, l, b)
+            ix1, iy1 = _cell(grid, r, t)
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    tiles.setdefault((ix, iy), []).append(rec)
+
+        # Spawned rather than forked, so this is safe to call from the GUI process
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [executor.submit(_tile_pairs, grid, tile, recs, span_layers)
+                       for tile, recs in tiles.items()]
+
+            for done, f in enumerate(as_completed(futures)):
+                progress_cb(done, len(futures))
+                pairs.extend(f.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    pairs.extend(serial_pairs(other))
+
+    # Worker completion order varies, sort for a repeatable edge order
+    pairs.sort()
+    return pairs
@@ -1,20 +1,36 @@
 """The skyline algorithm is a clean python implementation of the skyline best fit bin packing algorithm.
 (See: http://clb.demon.fi/files/RectangleBinPack.pdf pp 25). It is used in pcbre for packing rectangular sprites into
-textures. An example usage is text-sprite generation"""
+textures. An example usage is text-sprite generation
 
-import itertools
+The skyline is held as two parallel lists, the left edge and height of each segment, in left to right order. A
+rectangle is placed at the start of the segment where its bottom would be lowest, the leftmost such segment winning
+ties. Fits for every start are computed at once with numpy, using a sparse table of segment heights for the range
+maxima.
+
+pack_multiple keeps the best fit for each distinct rectangle width. Heights only ever grow, so a fit stays the best
+one until a placement touches the span it covers or the gap beside it; only the fits around each placement are
+found again."""
+
+import bisect
+import heapq
 import math
-import operator
-from typing import Sequence, Optional, Tuple, List, Generator, TypeVar
+from typing import Dict, Generator, List, Optional, Sequence, Tuple
+
+import numpy
 
 __author__ = 'davidc'
 
+# Height of a start a rectangle doesn't fit at
+_NO_FIT = numpy.iinfo(numpy.int64).max // 4
+
 
 class _SkyLineNode:
     """ A set of skyline nodes describe the skyline. They are organized in a singly linked list.
     Each node has a coordinate (left, height) that describes the upper-left corner edge of a skyline block.
     The width of the block (which continues at 'height') is implicit to either the 'left' of the next block, or to the
     width of the area on which the skyline is being run.
+
+    SkyLine doesn't use nodes itself. They're a view of it, for inspecting it and building skylines node by node
     """
 
     def __init__(self, left: int = 0, height: int = 0) -> None:
@@ -28,56 +44,36 @@ class _SkyLineNode:
         return "<node: %d,%d>" % (self.left, self.height)
 
 
-def print_skyline(s: _SkyLineNode) -> str:
-    return ", ".join("%d,%d" % (s.left, s.height) for s in _node_iter(s))
-
-
-class _StartHeight:
-    def __init__(self, startnode: _SkyLineNode, head: bool = False) -> None:
-        self.height = startnode.height
-        self.node = startnode
-
-        self.wasted_width = -1
-
-        self.head = True
-        self.reset()
-        self.head = head
+def _node_iter(node: Optional[_SkyLineNode]) -> Generator[_SkyLineNode, None, None]:
+    while node is not None:
+        yield node
+        node = node.next
 
-    def reset(self) -> None:
-        assert self.head
-        self.prev: '_StartHeight' = self
-        self.next: '_StartHeight' = self
 
-    def unlink(self) -> None:
-        assert not self.head
-        self.prev.next = self.next
-        self.next.prev = self.prev
+def print_skyline(s: _SkyLineNode) -> str:
+    return ", ".join("%d,%d" % (s.left, s.height) for s in _node_iter(s))
 
-        self.prev = self
-        self.next = self
 
-    def append(self, node: "_StartHeight") -> None:
-        node.prev = self
-        node.next = self.next
+class _Fit:
+    """Where a rectangle fits: on the segment 'node', with its bottom at 'height'. 'wasted_width' is the gap between
+    its right edge and the next taller segment"""
 
-        self.next.prev = node
-        self.next = node
+    def __init__(self, node: _SkyLineNode, height: int, wasted_width: int) -> None:
+        self.node = node
+        self.height = height
+        self.wasted_width = wasted_width
 
     def __repr__(self) -> str:
-        if self.head:
-            nodes = itertools.takewhile(lambda x: x != self, _node_iter(self.next))
-            return ", ".join("%s height: %d fw:%d" % (s.node, s.height, s.wasted_width) for s in nodes)
-        else:
-            return "<%s height: %d fw:%d>" % (self.node, self.height, self.wasted_width)
-
+        return "<%s height: %d fw:%d>" % (self.node, self.height, self.wasted_width)
 
-T = TypeVar('T', _SkyLineNode, _StartHeight)
 
+class _Fits:
+    """Best fits for an array of widths, see SkyLine.fits"""
 
-def _node_iter(node: Optional[T]) -> Generator[T, None, None]:
-    while node is not None:
-        yield node
-        node = node.next
+    def __init__(self, left: 'numpy.ndarray', height: 'numpy.ndarray', wasted_width: 'numpy.ndarray') -> None:
+        self.left = left
+        self.height = height
+        self.wasted_width = wasted_width
 
 
 class SkyLine:
@@ -91,117 +87,167 @@ class SkyLine:
         self.width: int = width
         self.height: int = height
 
-        self.first: _SkyLineNode = _SkyLineNode()
+        self.__lefts: List[int] = [0]
+        self.__heights: List[int] = [0]
+
+        # Node view handed out by 'first', read back before the next operation in case it was edited
+        self.__view: Optional[_SkyLineNode] = None
+
+        # Segment arrays and sparse table, rebuilt after changes
+        self.__arrays: Optional[Tuple['numpy.ndarray', 'numpy.ndarray', 'numpy.ndarray']] = None
+
+    @property
+    def first(self) -> _SkyLineNode:
+        """The leftmost node of a linked list view of the skyline"""
+        self.__sync()
+
+        nodes = [_SkyLineNode(left, height) for left, height in zip(self.__lefts, self.__heights)]
+        for a, b in zip(nodes, nodes[1:]):
+            a.next = b
+            b.prev = a
+
+        self.__view = nodes[0]
+        return nodes[0]
 
     def first_iter(self) -> Generator[_SkyLineNode, None, None]:
         """return an iterator that walks the nodes from left to right"""
         return _node_iter(self.first)
 
+    def __sync(self) -> None:
+        if self.__view is None:
+            return
+
+        nodes = list(_node_iter(self.__view))
+        self.__view = None
+        self.__lefts = [n.left for n in nodes]
+        self.__heights = [n.height for n in nodes]
+        self.__arrays = None
+
+    def __index(self, left: int) -> int:
+        i = bisect.bisect_left(self.__lefts, left)
+        assert i < len(self.__lefts) and self.__lefts[i] == left
+        return i
+
     def next_left(self, node: _SkyLineNode) -> int:
-        if node.next is None:
+        self.__sync()
+        i = self.__index(node.left)
+        if i + 1 == len(self.__lefts):
             return self.width
 
-        return node.next.left
+        return self.__lefts[i + 1]
 
     def merge(self) -> None:
-        node = self.first
+        """Join neighbouring segments of the same height"""
+        self.__sync()
 
-        for node in self.first_iter():
-            for next_node in _node_iter(node.next):
-                if next_node.height != node.height:
-                    break
-                node.next = next_node.next
+        lefts, heights = [self.__lefts[0]], [self.__heights[0]]
+        for left, height in zip(self.__lefts[1:], self.__heights[1:]):
+            if height != heights[-1]:
+                lefts.append(left)
+                heights.append(height)
+
+        self.__lefts, self.__heights = lefts, heights
+        self.__arrays = None
 
     def split(self, node: _SkyLineNode, splitpoint: int, height: int) -> None:
+        """Raise the skyline to 'height' from the left of node up to splitpoint"""
+        self.__sync()
+
         assert splitpoint > node.left
         assert splitpoint <= self.width
         assert height > node.height
 
-        last_height = node.height
-        node.height = height
+        self.__raise(self.__index(node.left), splitpoint, height)
+
+    def __raise(self, i: int, splitpoint: int, height: int) -> None:
+        lefts, heights = self.__lefts, self.__heights
+        x0 = lefts[i]
+
+        # Segments covered up to the split point go, the one it falls inside continues from it
+        j = bisect.bisect_left(lefts, splitpoint, i)
+        if splitpoint < self.width and (j == len(lefts) or lefts[j] != splitpoint):
+            lefts.insert(j, splitpoint)
+            heights.insert(j, heights[j - 1])
+
+        lefts[i:j] = [x0]
+        heights[i:j] = [height]
+
+        # Only the new segment's ends can need merging
+        if i + 1 < len(lefts) and heights[i + 1] == height:
+            del lefts[i + 1], heights[i + 1]
+        if i > 0 and heights[i - 1] == height:
+            del lefts[i], heights[i]
+
+        self.__arrays = None
+
+    def __segments(self) -> Tuple['numpy.ndarray', 'numpy.ndarray', 'numpy.ndarray']:
+        """
+        Segment lefts and heights, and a sparse table of heights: row k, column i holds the highest segment of
+        i..i + 2**k - 1, cut short at the last segment
+        """
+        if self.__arrays is None:
+            lefts = numpy.array(self.__lefts, dtype=numpy.int64)
+            heights = numpy.array(self.__heights, dtype=numpy.int64)
+
+            table = [heights]
+            step = 1
+            while step < len(heights):
+                row = table[-1].copy()
+                numpy.maximum(row[:-step], table[-1][step:], out=row[:-step])
+                table.append(row)
+                step *= 2
+
+            self.__arrays = lefts, heights, numpy.array(table)
+
+        return self.__arrays
+
+    def fits(self, widths: 'numpy.ndarray') -> _Fits:
+        """
+        Best fit for each of an array of widths: the start where the bottom of the rectangle would be lowest, the
+        leftmost of those on ties. A width that doesn't fit has height _NO_FIT. Widths are integers
+        """
+        self.__sync()
+        lefts, heights, table = self.__segments()
+        m = len(lefts)
+        widths = numpy.asarray(widths, dtype=numpy.int64)
+
+        # Segments under a rectangle starting on each segment are start..end-1
+        rights = lefts[None, :] + widths[:, None]
+        start = numpy.broadcast_to(numpy.arange(m), rights.shape)
+        end = numpy.maximum(numpy.searchsorted(lefts, rights, side="left"), start + 1)
+
+        # Highest of them, as the highest of two overlapping power of two runs
+        level = numpy.log2(end - start).astype(numpy.int64)
+        fit = numpy.maximum(table[level, start], table[level, end - (1 << level)])
+        fit[rights > self.width] = _NO_FIT
+
+        best = numpy.argmin(fit, axis=1)
+        rows = numpy.arange(len(widths))
+        height = fit[rows, best]
+
+        # Find the next taller segment, by binary lifting through the table
+        pos = end[rows, best]
+        for k in range(len(table) - 1, -1, -1):
+            step = numpy.minimum(pos, m - 1)
+            lower = (pos < m) & (table[k, step] <= height)
+            pos = numpy.where(lower, numpy.minimum(pos + (1 << k), m), pos)
+
+        left = lefts[best]
+        taller = numpy.where(pos < m, lefts[numpy.minimum(pos, m - 1)], self.width)
+        return _Fits(left, height, taller - left - widths)
+
+    def find(self, width: int, height: int) -> Optional[_Fit]:
+        fits = self.fits(numpy.array([width]))
+        y = int(fits.height[0])
+
+        if y == _NO_FIT or y + height > self.height:
+            return None
 
-        # If the splitpoint is at the RHS of the packing bin
-        # just shortcut out
-        if splitpoint == self.width:
-            node.next = None
-            return
+        left = int(fits.left[0])
+        return _Fit(_SkyLineNode(left, self.__heights[self.__index(left)]), y, int(fits.wasted_width[0]))
 
-        # walk the nodes ahead
-        for next in _node_iter(node.next):
-
-            # If one of the nodes ahead has left == our splitpoint
-            # Then we just adopt the node as our next
-            if next.left == splitpoint:
-                node.next = next
-                self.merge()
-                return
-
-            # Else if the node ahead has left > our split point
-            # we need to insert a node to split the difference
-            elif next.left > splitpoint:
-                if next.height == last_height:
-                    print(next.height, last_height)
-                    print(splitpoint, height)
-                    print(print_skyline(node))
-                    # This case should be impossible
-                    # if it occurs, something is wrong with the skyline
-                    assert False
-                else:
-                    newnode = _SkyLineNode(splitpoint, last_height)
-                    newnode.next = next
-                    node.next = newnode
-                    # TODO: This merge shouldn't be needed
-                    self.merge()
-                    return
-            last_height = next.height
-
-        newnode = _SkyLineNode(splitpoint, last_height)
-        newnode.next = None
-        node.next = newnode
-        self.merge()
-
-    def find(self, width: int, height: int) -> Optional[_StartHeight]:
-        # We use a left-to-right sweep that tracks the viable
-        # candidate start points as seen looking back to the left
-
-        candidates = []
-
-        fake = _SkyLineNode(self.width, self.height)
-        # left-to-right pass
-        s_h_list = _StartHeight(fake, True)
-
-        # List with fake node at the end for end-of-list
-        # Fake node will always fail-to-pack because
-        for node in itertools.chain(self.first_iter(), [fake]):
-
-            while node.height > s_h_list.prev.height:
-                # If the packing rect doesn't fit inside
-                if node.left - s_h_list.prev.node.left < width:
-                    s_h_list.prev.height = node.height
-
-                    if s_h_list.prev.height >= s_h_list.prev.prev.height:
-                        s_h_list.prev.unlink()
-                else:
-                    # Packing rect fits inside:
-                    s_h_list.prev.wasted_width = node.left - s_h_list.prev.node.left - width
-
-                    assert s_h_list.prev != s_h_list
-
-                    # If we've bumped the height to the point it no longer fits, discard it
-                    if height + s_h_list.prev.height <= self.height:
-                        candidates.append(s_h_list.prev)
-
-                    # This candidate will be strictly better than any others in flight
-                    s_h_list.reset()
-
-            # Otherwise, start a new candidate
-            if node.height < s_h_list.prev.height:
-                s_h_list.prev.append(_StartHeight(node))
-
-        if len(candidates):
-            return sorted(candidates, key=operator.attrgetter("height", "wasted_width"))[0]
-
-        return None
+    def __place(self, left: int, width: int, bottom: int, height: int) -> None:
+        self.__raise(self.__index(left), left + width, bottom + height)
 
     def pack(self, width: int, height: int) -> Optional[Tuple[int, int]]:
         width = math.ceil(width)
@@ -211,32 +257,71 @@ class SkyLine:
         if cand is None:
             return None
 
-        self.split(cand.node, cand.node.left + width, cand.height + height)
+        self.__place(cand.node.left, width, cand.height, height)
 
         return cand.node.left, cand.height
 
     def pack_multiple(self, tuples: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
-        packl = list(enumerate(tuples))
-
-        results: List[Tuple[int, Tuple[int, int]]] = []
-
-        while packl:
-            scores: List[Tuple[int, int, _StartHeight]] = []
-
-            for n_l, (n_initial, (width, height)) in enumerate(packl):
-                sh = self.find(width, height)
-                if sh is not None:
-                    scores.append((n_l, height, sh))
-
-            win_index, glyph_height, win_cand = min(scores, key=lambda x: (x[2].height + x[1], x[2].wasted_width))
-            width, height = packl[win_index][1]
-
-            self.split(win_cand.node, win_cand.node.left + width, win_cand.height + height)
-
-            results.append((packl[win_index][0], (win_cand.node.left, win_cand.height)))
-
-            del packl[win_index]
-
-        assert len(results) == len(tuples)
-
-        return [t for _, t in sorted(results, key=lambda x: x[0])]
+        """
+        Pack rectangles, placing whichever would have the lowest top next, then the one wasting the least width
+        beside it, then the first given. Raises ValueError if they don't all fit
+        """
+        self.__sync()
+
+        # Rectangles of the same width share a fit, the shortest of them is the best
+        by_width: Dict[int, List[Tuple[int, int]]] = {}
+        for n, (width, height) in enumerate(tuples):
+            heapq.heappush(by_width.setdefault(math.ceil(width), []), (math.ceil(height), n))
+
+        widths = numpy.array(sorted(by_width), dtype=numpy.int64)
+        queues = [by_width[w] for w in widths.tolist()]
+
+        # Best fit of each width, and how far right a change can affect it
+        fit_left = numpy.zeros(len(widths), dtype=numpy.int64)
+        fit_height = numpy.full(len(widths), _NO_FIT, dtype=numpy.int64)
+        fit_waste = numpy.zeros(len(widths), dtype=numpy.int64)
+        fit_reach = numpy.zeros(len(widths), dtype=numpy.int64)
+
+        # Shortest and first remaining rectangle of each width
+        shortest = numpy.array([q[0][0] for q in queues], dtype=numpy.int64)
+        first = numpy.array([q[0][1] for q in queues], dtype=numpy.int64)
+
+        stale = numpy.ones(len(widths), dtype=bool)
+        results: List[Optional[Tuple[int, int]]] = [None] * len(tuples)
+
+        for _ in range(len(tuples)):
+            if stale.any():
+                idx = numpy.flatnonzero(stale)
+                fits = self.fits(widths[idx])
+                fit_left[idx] = fits.left
+                fit_height[idx] = fits.height
+                fit_waste[idx] = fits.wasted_width
+                fit_reach[idx] = fits.left + widths[idx] + fits.wasted_width
+                stale[idx] = False
+
+            top = fit_height + shortest
+            ok = numpy.flatnonzero((fit_height != _NO_FIT) & (top <= self.height))
+            if not len(ok):
+                raise ValueError("Rectangles don't all fit")
+
+            win = ok[numpy.lexsort((first[ok], fit_waste[ok], top[ok]))[0]]
+            width = int(widths[win])
+            height, n = heapq.heappop(queues[win])
+            left, bottom = int(fit_left[win]), int(fit_height[win])
+
+            self.__place(left, width, bottom, height)
+            results[n] = left, bottom
+
+            if queues[win]:
+                shortest[win], first[win] = queues[win][0]
+            else:
+                # Width used up
+                shortest[win] = self.height + 1
+                fit_height[win] = _NO_FIT
+                fit_reach[win] = -1
+
+            # Fits over or beside the placed rectangle may have moved, those elsewhere can't have
+            live = fit_height != _NO_FIT
+            stale = live & (fit_left <= left + width) & (fit_reach >= left)
+
+        return results  # type: ignore
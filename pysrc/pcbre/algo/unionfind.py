@@ -0,0 +1,90 @@
+"""Disjoint-set (union-find) forest, used for board connectivity. Uses path compression and union by rank, so a
+sequence of n unions and finds runs in near linear time. Edges may be added at any point after construction, which
+allows a connectivity map to be built in bulk and then extended incrementally."""
+
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Set, Tuple, TypeVar
+
+__author__ = 'davidc'
+
+T = TypeVar('T', bound=Hashable)
+
+
+class UnionFind(Generic[T]):
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        self.__parent: Dict[T, T] = {}
+        self.__rank: Dict[T, int] = {}
+
+        for i in items:
+            self.add(i)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self.__parent
+
+    def __len__(self) -> int:
+        return len(self.__parent)
+
+    def add(self, item: T) -> None:
+        """Add item as a singleton set. Adding an item already present is a no-op"""
+        if item in self.__parent:
+            return
+
+        self.__parent[item] = item
+        self.__rank[item] = 0
+
+    def find(self, item: T) -> T:
+        """Return the root of the set containing item"""
+        parent = self.__parent
+
+        root = item
+        while parent[root] is not root:
+            root = parent[root]
+
+        # Path compression
+        while parent[item] is not root:
+            parent[item], item = root, parent[item]
+
+        return root
+
+    def union(self, a: T, b: T) -> bool:
+        """
+        Join the sets containing a and b
+        :return: True if a and b were in separate sets before the call
+        """
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra is rb:
+            return False
+
+        # Union by rank
+        if self.__rank[ra] < self.__rank[rb]:
+            ra, rb = rb, ra
+        elif self.__rank[ra] == self.__rank[rb]:
+            self.__rank[ra] += 1
+
+        self.__parent[rb] = ra
+        return True
+
+    def union_all(self, pairs: Iterable[Tuple[T, T]]) -> None:
+        for a, b in pairs:
+            self.union(a, b)
+
+    def connected(self, a: T, b: T) -> bool:
+        return self.find(a) is self.find(b)
+
+    def groups(self) -> List[Set[T]]:
+        """
+        Return all sets, ordered by their first added item. The order does not depend on the order in which unions
+        were made
+        """
+        by_root: Dict[T, Set[T]] = {}
+        for i in self.__parent:
+            root = self.find(i)
+            try:
+                by_root[root].add(i)
+            except KeyError:
+                by_root[root] = {i}
+
+        return list(by_root.values())
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.__parent)
@@ -2,13 +2,18 @@ import itertools
 import operator
 import weakref
 from collections import defaultdict
-from typing import Dict, Any, Callable, List, Tuple, Iterable, Union, Sequence, Optional, Set, Generator, FrozenSet
+from typing import Dict, Any, Callable, List, Tuple, Iterable, Iterator, Union, Sequence, Optional, Set, Generator, \
+    FrozenSet
 
+import numpy
 from rtree import index  # type: ignore
 
 import pcbre.model.project
 from pcbre.algo.geom import dist_via_via, dist_via_trace, dist_trace_trace, \
     dist_via_pad, dist_trace_pad, dist_pad_pad, distance, point_inside, can_self_intersect, intersect
+from pcbre.algo.geom_batch import GeomArrays, distances_to
+from pcbre.algo.parallel_connectivity import parallel_intersecting_pairs
+from pcbre.algo.unionfind import UnionFind
 from pcbre.matrix import Point2
 from pcbre.matrix import Rect
 from pcbre.model.artwork_geom import Trace, Via, Polygon, Airwire, Geom
@@ -26,6 +31,23 @@ InsertableGeomComponent = Union[InsertableGeom, Component]
 ArtworkComponentPad = Union[ArtworkComponent, Pad]
 GeomPad = Union[Geom, Pad]
 
+# Pick priority for point queries. Lower values are returned first. Matches the historic
+# order of get_all_artwork(), with components last
+_PICK_PRIORITY = {
+    IntersectionClass.VIA: 0,
+    IntersectionClass.VIRTUAL_LINE: 1,
+    IntersectionClass.TRACE: 2,
+    IntersectionClass.POLYGON: 3,
+    IntersectionClass.PAD: 4,
+}
+_PICK_PRIORITY_COMPONENT = 5
+
+
+def _pick_priority(aw: ArtworkComponentPad) -> int:
+    if isinstance(aw, Component):
+        return _PICK_PRIORITY_COMPONENT
+    return _PICK_PRIORITY[aw.ISC]
+
 
 #   Once an item is added to artwork, it should be considered geometrically and electrically immutable
 #
@@ -37,31 +59,42 @@ class ArtworkIndex:
     """
     Artwork index provides a wrapper on the Rtree spatial query library. Specifically, it resolves query results to
     physical geom objects, as well as uses the "fast" query paths
+
+    Each indexed object is given a dense integer handle, stored on the object as _index_handle, which is also its
+    Rtree id. Hits are resolved through a plain list. Handles of removed objects are reused
     """
 
     def __init__(self) -> None:
         self.__index = index.Index()
-        self.__idx = 0
 
-        self.__obj_to_idx: weakref.WeakKeyDictionary[Any, int] = \
-            weakref.WeakKeyDictionary()
-        self.__idx_to_obj: weakref.WeakValueDictionary[int, Any] = \
-            weakref.WeakValueDictionary()
+        # Handle -> object, None for free handles
+        self.__objects: List[Any] = []
+        self.__free: List[int] = []
+
+        # Handle -> insertion sequence number. Handles are reused, so they don't give insertion order on their own
+        self.__seq: List[int] = []
+        self.__next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self.__objects) - len(self.__free)
 
     def __get_idx(self, k: Any) -> int:
-        try:
-            return self.__obj_to_idx[k]
-        except KeyError:
-            r = self.__obj_to_idx[k] = self.__idx
-            self.__idx_to_obj[r] = k
-            self.__idx += 1
-            return r
+        h = getattr(k, "_index_handle", -1)
+        if 0 <= h < len(self.__objects) and self.__objects[h] is k:
+            return h
+
+        if self.__free:
+            h = self.__free.pop()
+            self.__objects[h] = k
+            self.__seq[h] = self.__next_seq
+        else:
+            h = len(self.__objects)
+            self.__objects.append(k)
+            self.__seq.append(self.__next_seq)
 
-    def __get_obj(self, idx: int) -> Any:
-        try:
-            return self.__idx_to_obj[idx]
-        except KeyError:
-            raise
+        self.__next_seq += 1
+        k._index_handle = h
+        return h
 
     @staticmethod
     def __rect_index_order(rect: Rect) -> Tuple[float, float, float, float]:
@@ -70,23 +103,88 @@ class ArtworkIndex:
     def insert(self, geom: Any) -> None:
         self.__index.insert(self.__get_idx(geom), self.__rect_index_order(geom.bbox))
 
-    def intersect(self, bbox: Rect) -> Iterable[Any]:
-        idxs = self.__index.intersection(self.__rect_index_order(bbox))
-        return (self.__get_obj(idx) for idx in idxs)
+    def bulk_insert(self, geoms: Sequence[Any]) -> None:
+        """
+        Insert many objects. If the index is empty, the tree is rebuilt with rtree's stream loader, which is much
+        faster than repeated inserts and gives a better packed tree
+        """
+        if not geoms:
+            return
+
+        if len(self):
+            for geom in geoms:
+                self.insert(geom)
+            return
+
+        self.__index = index.Index((self.__get_idx(geom), self.__rect_index_order(geom.bbox), None)
+                                   for geom in geoms)
+
+    def intersect(self, bbox: Rect) -> List[Any]:
+        objects = self.__objects
+        return [objects[idx] for idx in self.__index.intersection(self.__rect_index_order(bbox))]
+
+    def intersect_many(self, bboxes: Sequence[Rect]) -> List[List[Any]]:
+        """
+        Return the objects intersecting each of bboxes, in a single Rtree call
+        """
+        if not bboxes:
+            return []
+
+        mins = numpy.array([(b.left, b.bottom) for b in bboxes], dtype=numpy.float64)
+        maxs = numpy.array([(b.right, b.top) for b in bboxes], dtype=numpy.float64)
+        ids, counts = self.__index.intersection_v(mins, maxs)
+
+        objects = self.__objects
+        hits = [objects[idx] for idx in ids.tolist()]
+
+        result = []
+        start = 0
+        for count in counts.tolist():
+            result.append(hits[start:start + count])
+            start += count
+        return result
+
+    def intersect_point(self, pt: Point2) -> List[Any]:
+        """
+        Return all objects whose bbox contains pt, in insertion order. Rtree result order depends on
+        tree shape, so hits are sorted to keep the result deterministic
+        """
+        idxs = sorted(self.__index.intersection((pt.x, pt.y, pt.x, pt.y)), key=self.__seq.__getitem__)
+        objects = self.__objects
+        return [objects[idx] for idx in idxs]
 
     def nearest(self, bbox: Rect) -> Iterable[Any]:
-        idxs = self.__index.nearest(self.__rect_index_order(bbox))
-        return (self.__get_obj(idx) for idx in idxs)
+        objects = self.__objects
+        return [objects[idx] for idx in self.__index.nearest(self.__rect_index_order(bbox))]
 
     def remove(self, geom: Any) -> None:
-        idx = self.__obj_to_idx[geom]
-        del self.__obj_to_idx[geom]
-        del self.__idx_to_obj[idx]
+        idx = geom._index_handle
+        assert self.__objects[idx] is geom
 
         self.__index.delete(idx, self.__rect_index_order(geom.bbox))
 
+        self.__objects[idx] = None
+        self.__free.append(idx)
+        geom._index_handle = -1
+
+
+class ArtworkListener:
+    """
+    Told of every object added to or removed from an Artwork, see Artwork.add_listener. Objects are immutable while
+    they're in the artwork, so these two are the only changes to follow
+    """
+
+    def artwork_added(self, objs: Sequence[InsertableGeomComponent]) -> None:
+        pass
+
+    def artwork_removed(self, objs: Sequence[InsertableGeomComponent]) -> None:
+        pass
+
 
 class Artwork:
+    # Objects per batched distance call in the connectivity search
+    PAIR_CHUNK = 4096
+
     def __init__(self, project: 'pcbre.model.project.Project') -> None:
         self._project = project
         self.__index = ArtworkIndex()
@@ -112,6 +210,52 @@ class Artwork:
         self.polygons = ImmutableSetProxy(self.__polygons)
         self.polygons_generation = 0
 
+        # Reverse index of net to all geometry (including pads) on that net. Kept in sync by the net setters
+        # through _net_changed. Geometry that is mid-way through a net split may briefly be filed under None
+        self.__net_members: Dict[Optional[Net], Set[GeomPad]] = defaultdict(set)
+
+        # Held weakly, so a view's caches go away with the view
+        self.__listeners: 'weakref.WeakSet[ArtworkListener]' = weakref.WeakSet()
+
+    def add_listener(self, listener: ArtworkListener) -> None:
+        """Notify listener of every object added or removed from now on"""
+        self.__listeners.add(listener)
+
+    def remove_listener(self, listener: ArtworkListener) -> None:
+        self.__listeners.discard(listener)
+
+    def __notify_added(self, objs: Sequence[InsertableGeomComponent]) -> None:
+        for listener in list(self.__listeners):
+            listener.artwork_added(objs)
+
+    def __notify_removed(self, objs: Sequence[InsertableGeomComponent]) -> None:
+        for listener in list(self.__listeners):
+            listener.artwork_removed(objs)
+
+    def __net_index_add(self, aw: GeomPad) -> None:
+        self.__net_members[aw.net].add(aw)
+
+    def __net_index_remove(self, aw: GeomPad) -> None:
+        members = self.__net_members[aw.net]
+        members.remove(aw)
+        if not members:
+            del self.__net_members[aw.net]
+
+    def _net_changed(self, aw: GeomPad, old: Optional[Net], new: Optional[Net]) -> None:
+        """
+        Called by the geometry net setters when the net of an object changes. Objects that aren't
+        currently in the artwork are ignored
+        """
+        members = self.__net_members.get(old)
+        if members is None or aw not in members:
+            return
+
+        members.remove(aw)
+        if not members:
+            del self.__net_members[old]
+
+        self.__net_members[new].add(aw)
+
     def add_artwork(self, aw: InsertableGeom) -> None:
         """
         Add any single-net piece of geometry to the board artwork
@@ -143,9 +287,78 @@ class Artwork:
             raise NotImplementedError()
 
         self.__index.insert(aw)
+        self.__net_index_add(aw)
 
         aw._project = self._project
 
+        self.__notify_added((aw,))
+
+    def bulk_load(self, geoms: Iterable[InsertableGeom] = (), components: Iterable[Component] = ()) -> None:
+        """
+        Add many objects at once, eg: when opening a project. Equivalent to add_artwork and add_component for each
+        object, but the spatial index is built in one pass and each generation counter is bumped once
+        """
+        vias: List[Via] = []
+        airwires: List[Airwire] = []
+        traces: List[Trace] = []
+        polygons: List[Polygon] = []
+        geoms = list(geoms)
+        components = list(components)
+
+        for aw in geoms:
+            assert aw is not None
+            assert aw._project is None
+            assert aw.net is not None
+            assert aw.net._project is self._project
+
+            if isinstance(aw, Trace):
+                traces.append(aw)
+            elif isinstance(aw, Via):
+                vias.append(aw)
+            elif isinstance(aw, Polygon):
+                polygons.append(aw)
+            elif isinstance(aw, Airwire):
+                airwires.append(aw)
+            else:
+                raise NotImplementedError()
+
+        # Pads look up their net through the parent project
+        for cmp in components:
+            cmp._project = self._project
+
+        pads = [pad for cmp in components for pad in cmp.get_pads()]
+
+        self.__index.bulk_insert([*geoms, *components, *pads])
+
+        for g in itertools.chain(geoms, pads):
+            self.__net_index_add(g)
+
+        for aw in geoms:
+            aw._project = self._project
+
+        if traces:
+            self.__traces.update(traces)
+            self.traces_generation += 1
+
+        if vias:
+            self.__vias.update(vias)
+            self.vias_generation += 1
+
+        if polygons:
+            self.__polygons.update(polygons)
+            self.polygons_generation += 1
+
+        if airwires:
+            self.__airwires.update(airwires)
+            self.airwires_generation += 1
+
+        if components:
+            self.__components.update(components)
+            self.components_generation += 1
+
+        if geoms or components:
+            self.__notify_added([*geoms, *components])
+
     def add_component(self, cmp: Component) -> None:
         """
         :param cmp:
@@ -157,9 +370,12 @@ class Artwork:
         self.__index.insert(cmp)
         for pad in cmp.get_pads():
             self.__index.insert(pad)
+            self.__net_index_add(pad)
 
         self.components_generation += 1
 
+        self.__notify_added((cmp,))
+
     def merge_component(self, cmp: Component) -> None:
         """
         :return:
@@ -174,21 +390,32 @@ class Artwork:
         for pad in cmp.get_pads():
             self.remove_aw_nets(pad, suppress_presence_error=False)
             self.__index.remove(pad)
+            self.__net_index_remove(pad)
 
         self.__index.remove(cmp)
         self.__components.remove(cmp)
 
         self.components_generation += 1
 
+        self.__notify_removed((cmp,))
+
     def remove_artwork(self, aw: InsertableGeom) -> None:
         assert aw._project is self._project
         assert aw.net is not None
 
         # Strip
         aw_net = aw.net
+
+        # Any airwire relying on this geom must be on the same net. Capture them before the net is split
+        if not isinstance(aw, Airwire):
+            net_airwires = [i for i in self.__net_members[aw_net] if isinstance(i, Airwire)]
+        else:
+            net_airwires = []
+
         self.remove_aw_nets(aw)
 
         self.__index.remove(aw)
+        self.__net_index_remove(aw)
 
         if isinstance(aw, Trace):
             self.__traces.remove(aw)
@@ -209,14 +436,19 @@ class Artwork:
         else:
             raise NotImplementedError()
 
+        removed: List[InsertableGeom] = [aw]
+
         # If its not an airwire we're removing
         # We need to find any airwires that rely on the geom
         # and remove them
-        if not isinstance(aw, Airwire):
-            for airwire in set(self.__airwires):
-                if intersect(aw, airwire):
-                    self.__airwires.remove(airwire)
-                    self.airwires_generation += 1
+        for airwire in net_airwires:
+            if intersect(aw, airwire):
+                self.__airwires.remove(airwire)
+                self.__index.remove(airwire)
+                self.__net_index_remove(airwire)
+                airwire._project = None
+                self.airwires_generation += 1
+                removed.append(airwire)
 
         # If no remaining geometry is on the net, we need to drop it
         n = self.get_geom_for_net(aw_net)
@@ -226,6 +458,8 @@ class Artwork:
 
         aw._project = None
 
+        self.__notify_removed(removed)
+
     def remove(self, aw: InsertableGeomComponent) -> None:
         if isinstance(aw, Component):
             self.remove_component(aw)
@@ -238,6 +472,16 @@ class Artwork:
         else:
             self.merge_artwork(aw)
 
+    def drop_poly_reprs(self) -> None:
+        """
+        Free the cached shapely polygons of all traces and vias, eg: under memory pressure. They are rebuilt when
+        next needed
+        """
+        for trace in self.__traces:
+            trace.drop_poly_repr()
+        for via in self.__vias:
+            via.drop_poly_repr()
+
     @property
     def __all_pads(self) -> Iterable[Pad]:
         for c in self.components:
@@ -254,7 +498,10 @@ class Artwork:
         return gen()
 
     def get_geom_for_net(self, net: Net) -> Sequence[GeomPad]:
-        return [i for i in self.get_all_artwork() if i.net is net]
+        members = self.__net_members.get(net)
+        if members is None:
+            return []
+        return list(members)
 
     def merge_nets(self, net1: Net, net2: Net) -> None:
         """
@@ -264,14 +511,18 @@ class Artwork:
         :param net2: source Net object
         :return: None
         """
-        for aw in self.get_all_artwork():
-            if aw.net == net2:
-                aw.net = net1
+        for aw in self.get_geom_for_net(net2):
+            aw.net = net1
 
         self._project.nets.remove_net(net2)
 
     def merge_nets_many(self, nets: Iterable[Net]) -> Net:
-        queue = list(nets)
+        """
+        Merge all nets into one. The destination is the highest ranked net (named, then classed),
+        with ties going to the largest net so that only the smaller nets need to be relabeled
+        """
+        queue = sorted(nets, key=lambda x: (x.has_assigned_name, x.net_class != "",
+                                            len(self.__net_members.get(x, ()))))
         acc = queue.pop()
 
         while queue:
@@ -282,34 +533,35 @@ class Artwork:
 
     def query_point(self, pt: Point2) -> Union[Geom, Pad, Component, None]:
         """
-        Queries a single point to identify geometry at that location
+        Queries a single point to identify geometry at that location. Returns the highest pick-priority item
         """
+        found_aw = self.query_point_multiple(pt)
+        if not found_aw:
+            return None
 
-        for aw in self.get_all_artwork():
-            if point_inside(aw, pt):
-                return aw
-
-        for cmp in self.components:
-            if cmp.point_inside(pt):
-                return cmp
-
-        return None
+        return found_aw[0]
 
     def query_point_multiple(self, pt: Point2) -> Sequence[Union[Geom, Pad, Component]]:
         """
         Queries a single point to identify geometry at that location
+
+        Candidates are found by a point-rect query on the spatial index, then tested exactly.
+        Results are ordered by pick priority (vias, airwires, traces, polygons, pads, components), ties
+        are broken by insertion order
         """
 
         found_aw = []
 
-        for aw in self.get_all_artwork():
-            if point_inside(aw, pt):
-                found_aw.append(aw)
+        for aw in self.__index.intersect_point(pt):
+            if isinstance(aw, Component):
+                if aw.point_inside(pt):
+                    found_aw.append(aw)
 
-        for cmp in self.components:
-            if cmp.point_inside(pt):
-                found_aw.append(cmp)
+            elif point_inside(aw, pt):
+                found_aw.append(aw)
 
+        # sort is stable, so insertion order is preserved within a priority class
+        found_aw.sort(key=_pick_priority)
         return found_aw
 
     def merge_aw_nets(self, new_geom: QueryableGeom) -> None:
@@ -359,10 +611,7 @@ class Artwork:
                 raise
 
         # Build list of all geometry on the net
-        all_geom = []
-        for aw in self.get_all_artwork():
-            if aw.net == geom.net and aw is not geom:
-                all_geom.append(aw)
+        all_geom = [aw for aw in self.get_geom_for_net(geom.net) if aw is not geom]
 
         subgroups = self.compute_connected(all_geom)
 
@@ -383,69 +632,143 @@ class Artwork:
 
         geom.net = None
 
+    def _intersecting_pairs(
+            self, all_geom: Sequence[GeomPad],
+            progress_cb: Callable[[int, int], None] = lambda x, y: None) -> Iterator[Tuple[GeomPad, GeomPad]]:
+        """
+        Yield each intersecting pair of geometry within all_geom once. Candidates come from a bbox query on the
+        spatial index, and only pairs where the candidate comes later in all_geom are distance-tested. Candidate
+        pairs are collected in chunks and distance-tested in a single batched call per chunk
+        """
+        order = {g: n for n, g in enumerate(all_geom)}
+        size = len(all_geom)
+        arrays = GeomArrays(all_geom)
+
+        for start in range(0, size, self.PAIR_CHUNK):
+            stop = min(start + self.PAIR_CHUNK, size)
+            candidates = self.__index.intersect_many([all_geom[n].bbox for n in range(start, stop)])
+
+            ia: List[int] = []
+            ib: List[int] = []
+            for n, others in zip(range(start, stop), candidates):
+                progress_cb(n, size)
+
+                for other in others:
+                    m = order.get(other)
+                    if m is None or m <= n:
+                        continue
+
+                    ia.append(n)
+                    ib.append(m)
+
+            for a, b in self.__touching(arrays, ia, ib):
+                yield all_geom[a], all_geom[b]
+
+    @staticmethod
+    def __touching(arrays: GeomArrays, ia: List[int], ib: List[int]) -> Iterator[Tuple[int, int]]:
+        if not ia:
+            return
+
+        dist = arrays.distances(numpy.asarray(ia, dtype=numpy.intp), numpy.asarray(ib, dtype=numpy.intp))
+        hits = (dist <= 0).nonzero()[0]
+        for k in hits.tolist():
+            yield ia[k], ib[k]
+
+    def __pairs_involving(self, all_geom: Sequence[GeomPad], positions: Sequence[int]) -> Iterator[Tuple[int, int]]:
+        """
+        Yield (lower, higher) positions within all_geom of each intersecting pair that has at least one member in
+        positions. Pairs are distance-tested in the same order as _intersecting_pairs
+        """
+        order = {g: n for n, g in enumerate(all_geom)}
+        involved = set(positions)
+
+        candidates = self.__index.intersect_many([all_geom[n].bbox for n in positions])
+
+        ia: List[int] = []
+        ib: List[int] = []
+        for n, others in zip(positions, candidates):
+            for other in others:
+                m = order.get(other)
+                if m is None or m == n or (m < n and m in involved):
+                    continue
+
+                a, b = (n, m) if n < m else (m, n)
+                ia.append(a)
+                ib.append(b)
+
+        # Only pack the geometry that is involved, and renumber the pairs to match
+        ia_pos = numpy.asarray(ia, dtype=numpy.intp)
+        ib_pos = numpy.asarray(ib, dtype=numpy.intp)
+        used = numpy.union1d(ia_pos, ib_pos)
+        used_pos = used.tolist()
+        arrays = GeomArrays([all_geom[i] for i in used_pos])
+
+        local_a = numpy.searchsorted(used, ia_pos).tolist()
+        local_b = numpy.searchsorted(used, ib_pos).tolist()
+        for a, b in self.__touching(arrays, local_a, local_b):
+            yield used_pos[a], used_pos[b]
+
+    def connectivity_for(
+            self, all_geom: Iterable[GeomPad],
+            progress_cb: Callable[[int, int], None] = lambda x, y: None,
+            workers: Optional[int] = None) -> UnionFind[GeomPad]:
+        """
+        Build a union-find connectivity map for all_geom. Further edges may be added to the result with
+        UnionFind.union
+
+        :param workers: if more than one, find intersecting traces and vias in a process pool. The result is the same
+                        as the serial path
+        """
+        all_geom = list(all_geom)
+        uf = UnionFind(all_geom)
+
+        if workers is None or workers <= 1:
+            uf.union_all(self._intersecting_pairs(all_geom, progress_cb))
+            return uf
+
+        stackup = self._project.stackup
+        layer_no = {layer: n for n, layer in enumerate(stackup.layers)}
+        viapair_layers = {vp: tuple(layer_no[layer] for layer in vp.all_layers) for vp in stackup.via_pairs}
+
+        pairs = parallel_intersecting_pairs(
+            all_geom, lambda positions: self.__pairs_involving(all_geom, positions),
+            layer_no, viapair_layers, workers, progress_cb)
+
+        for a, b in pairs:
+            uf.union(all_geom[a], all_geom[b])
+
+        return uf
+
     def compute_connected(
-            self, all_geom: Iterable[Geom],
-            progress_cb: Callable[[int, int], None] = lambda x, y: None) -> List[Set[Geom]]:
-
-        qh = set(all_geom)
-        labno = 0
-        # TODO: refine these types
-        geom_to_label: Dict[Geom, int] = dict()
-        label_to_geom: Dict[int, Set[Geom]] = defaultdict(set)
-        seen: Set[Any] = set()
-
-        size = len(qh)
-        while qh:
-            progress_cb(size - len(qh), size)
-            k = qh.pop()
-            label = None
-
-            connected = self.intersect_with(k, seen)
-            seen.add(k)
-
-            for n in connected:
-                eg = geom_to_label[n]
-
-                if label is None:
-                    # If we don't have a label then take the label of what we're connected to
-                    label_to_geom[eg].add(k)
-                    geom_to_label[k] = eg
-                    label = eg
-
-                elif eg != label:
-                    # If we do have a label, but this group isn't us
-                    # Update all such that it has the same group
-                    update_set = label_to_geom[eg]
-                    del label_to_geom[eg]
-                    label_to_geom[label].update(update_set)
-
-                    for i in update_set:
-                        geom_to_label[i] = label
-
-            # Still no label
-            if label is None:
-                geom_to_label[k] = labno
-                label_to_geom[labno].add(k)
-                labno += 1
-
-        return list(label_to_geom.values())
-
-    def rebuild_connectivity(self, progress_cb: Callable[[int, int], None] = lambda x, y: None) -> None:
-        connectivity = self.compute_connected(self.get_all_artwork(), progress_cb=progress_cb)
-        connectivity = [frozenset(i) for i in connectivity]
+            self, all_geom: Iterable[GeomPad],
+            progress_cb: Callable[[int, int], None] = lambda x, y: None,
+            workers: Optional[int] = None) -> List[Set[GeomPad]]:
+
+        return self.connectivity_for(all_geom, progress_cb, workers).groups()
+
+    def rebuild_connectivity(self, progress_cb: Callable[[int, int], None] = lambda x, y: None,
+                             workers: Optional[int] = None) -> None:
+        """
+        Recompute all nets from geometry
+
+        :param workers: process count for the intersection search, None or 1 for serial
+        """
+        groups = self.compute_connected(self.get_all_artwork(), progress_cb=progress_cb, workers=workers)
+        connectivity: List[FrozenSet[GeomPad]] = [frozenset(i) for i in groups]
 
         # First, for each existing net, we identify which groups are owned by the net
         # and remove the groups having the smaller amounts of geometry (by count)
         # TODO: Change to by (ranked)
         # Most pads on section
         # Largest area
-        nets_to_groups: Dict[Net, Set[FrozenSet[Geom]]] = defaultdict(set)
+        nets_to_groups: Dict[Net, Set[FrozenSet[GeomPad]]] = defaultdict(set)
         for g in connectivity:
             for i in g:
-                nets_to_groups[i.net].add(g)
+                if i.net is not None:
+                    nets_to_groups[i.net].add(g)
 
-        for net, groups in nets_to_groups.items():
-            groups_sorted = sorted(groups, key=len)
+        for net, net_groups in nets_to_groups.items():
+            groups_sorted = sorted(net_groups, key=len)
             for g in groups_sorted[:-1]:
                 for i in g:
                     if i.net == net:
@@ -465,14 +788,13 @@ class Artwork:
             for i in group:
                 i.net = n0
 
-        assigned_nets = set(i.net for i in self.get_all_artwork())
+        assigned_nets = set(self.__net_members.keys())
 
         existing_nets = set(self._project.nets.nets)
 
         to_remove_nets = existing_nets - assigned_nets
 
-        for net in to_remove_nets:
-            self._project.nets.remove_net(net)
+        self._project.nets.remove_nets(to_remove_nets)
 
     def merge_artwork(self, geom: InsertableGeom) -> None:
         """
@@ -501,13 +823,9 @@ class Artwork:
 
         bbox_items = self.__index.intersect(a.bbox)
 
-        pruned_list = b.intersection(bbox_items)
+        pruned_list = list(b.intersection(bbox_items))
 
-        res = []
-        for i in pruned_list:
-            if distance(a, i) <= 0:
-                res.append(i)
-        return res
+        return [i for i, d in zip(pruned_list, distances_to(a, pruned_list)) if d <= 0]
 
     # return distance-sorted list of intersects
     def query(self, geom: QueryableGeom, bbox_prune: bool = False) -> List[Tuple[float, Geom]]:
@@ -522,7 +840,7 @@ class Artwork:
             ilist = self.__index.intersect(geom.bbox)
             ilist = [i for i in ilist if i.ISC != IntersectionClass.NONE]
 
-            return sorted([(distance(geom, other), other) for other in ilist], key=operator.itemgetter(0))
+            return sorted(zip(distances_to(geom, ilist), ilist), key=operator.itemgetter(0))
 
         bbox = geom.bbox
 
@@ -1,5 +1,5 @@
 from abc import ABCMeta, abstractmethod
-from typing import Sequence, Optional, TYPE_CHECKING
+from typing import Any, Sequence, Optional, TYPE_CHECKING, Union, cast
 
 import p2t  # type: ignore
 # Shapely library is used for polygon operations
@@ -16,6 +16,14 @@ if TYPE_CHECKING:
     import pcbre.model.stackup
     from pcbre.model.net import Net
     from pcbre.model.stackup import Layer, ViaPair
+    from typing_extensions import Protocol
+
+    class ViaSpan(Protocol):
+        """What intersection tests need of a via pair. Worker processes build vias on stand-ins for them"""
+
+        @property
+        def all_layers(self) -> Sequence[Any]:
+            ...
 
 if shapely.speedups.available:
     shapely.speedups.enable()
@@ -29,12 +37,18 @@ __author__ = 'davidc'
 
 
 class Geom(metaclass=ABCMeta):
+    # __dict__ stays available for ad-hoc attributes, but is only created if one is set
+    __slots__ = ('_project', '_index_handle', '__weakref__', '__dict__')
+
     ISC: IntersectionClass = IntersectionClass.NONE
     TYPE_FLAGS: int = 0
 
     def __init__(self) -> None:
         self._project: Optional['Project'] = None
 
+        # Handle in the artwork spatial index, -1 when not indexed
+        self._index_handle = -1
+
     @property
     @abstractmethod
     def net(self) -> Optional['Net']: pass
@@ -46,6 +60,11 @@ class Geom(metaclass=ABCMeta):
     @abstractmethod
     def bbox(self) -> Rect: pass
 
+    def _notify_net_changed(self, old: Optional['Net'], new: Optional['Net']) -> None:
+        # Keeps the artwork net membership index in sync once the geom has been added to a project
+        if self._project is not None and old is not new:
+            self._project.artwork._net_changed(self, old, new)
+
     # @property
     # @abstractmethod
     # def layer(self) -> Optional['Layer']: pass
@@ -84,7 +103,9 @@ class Polygon(Geom):
 
     @net.setter
     def net(self, net: Optional['Net']) -> None:
+        old = self._net
         self._net = net
+        self._notify_net_changed(old, net)
 
     @property
     def layer(self) -> 'Layer':
@@ -109,6 +130,8 @@ class Trace(Geom):
     ISC = IntersectionClass.TRACE
     TYPE_FLAGS = TFF.HAS_GEOM | TFF.HAS_NET
 
+    __slots__ = ('p0', 'p1', 'thickness', '_layer', '_net', '_bbox', '__poly_repr')
+
     def __init__(self, p0: Vec2, p1: Vec2, thickness: float,
                  layer: 'Layer', net: Optional['Net'] = None) -> None:
         super(Trace, self).__init__()
@@ -125,8 +148,8 @@ class Trace(Geom):
         self._bbox = Rect.from_points(self.p0, self.p1)
         self._bbox.feather(self.thickness, self.thickness)
 
-        self.__poly_repr = ShapelyLineString(
-            [self.p0, self.p1]).buffer(self.thickness / 2)
+        # Built on first use, see get_poly_repr
+        self.__poly_repr: Optional[ShapelyPolygon] = None
 
     @property
     def net(self) -> Optional['Net']:
@@ -134,7 +157,9 @@ class Trace(Geom):
 
     @net.setter
     def net(self, net: Optional['Net']) -> None:
+        old = self._net
         self._net = net
+        self._notify_net_changed(old, net)
 
     @property
     def layer(self) -> 'Layer':
@@ -145,8 +170,15 @@ class Trace(Geom):
         return self._bbox
 
     def get_poly_repr(self) -> ShapelyPolygon:
+        """Shapely polygon of the trace outline. Buffering is slow, so it is only built when first needed"""
+        if self.__poly_repr is None:
+            self.__poly_repr = ShapelyLineString([self.p0, self.p1]).buffer(self.thickness / 2)
         return self.__poly_repr
 
+    def drop_poly_repr(self) -> None:
+        """Free the cached shapely polygon. It is rebuilt on next use"""
+        self.__poly_repr = None
+
     def __repr__(self) -> str:
         netname = self.net.name if self.net is not None else "none"
         layername = self.layer.name if self.layer is not None else "none",
@@ -179,7 +211,9 @@ class Airwire(Geom):
 
     @net.setter
     def net(self, net: Optional['Net']) -> None:
+        old = self._net
         self._net = net
+        self._notify_net_changed(old, net)
 
     @property
     def bbox(self) -> Rect:
@@ -190,19 +224,23 @@ class Via(Geom):
     ISC = IntersectionClass.VIA
     TYPE_FLAGS = TFF.HAS_GEOM | TFF.HAS_NET
 
-    def __init__(self, pt: Vec2, viapair: 'ViaPair', r: float,
+    __slots__ = ('pt', 'r', 'viapair', '_net', '_bbox', '__poly_repr')
+
+    def __init__(self, pt: Vec2, viapair: Union['ViaPair', 'ViaSpan'], r: float,
                  net: Optional['pcbre.model.net.Net'] = None) -> None:
         super(Via, self).__init__()
         self.pt = pt
         self.r = r
-        self.viapair = viapair
+        # Worker processes build vias on a stand-in, those never reach a project
+        self.viapair: 'ViaPair' = cast('ViaPair', viapair)
         self._net = net
 
         self._bbox = Rect.from_center_size(pt, r * 2, r * 2)
 
         self._project = None
 
-        self.__poly_repr = ShapelyPoint(pt).buffer(self.r)
+        # Built on first use, see get_poly_repr
+        self.__poly_repr: Optional[ShapelyPolygon] = None
 
     @property
     def net(self) -> Optional['Net']:
@@ -210,15 +248,24 @@ class Via(Geom):
 
     @net.setter
     def net(self, net: Optional['Net']) -> None:
+        old = self._net
         self._net = net
+        self._notify_net_changed(old, net)
 
     @property
     def bbox(self) -> 'Rect':
         return self._bbox
 
     def get_poly_repr(self) -> ShapelyPolygon:
+        """Shapely polygon of the via outline. Buffering is slow, so it is only built when first needed"""
+        if self.__poly_repr is None:
+            self.__poly_repr = ShapelyPoint(self.pt).buffer(self.r)
         return self.__poly_repr
 
+    def drop_poly_repr(self) -> None:
+        """Free the cached shapely polygon. It is rebuilt on next use"""
+        self.__poly_repr = None
+
     def __repr__(self) -> str:
         return "<Via %s r:%f ly=(%s:%s) net=%s>" % (
             self.pt, self.r,
@@ -37,6 +37,9 @@ class Component:
         self.__side_layer_oracle = side_layer_oracle
         self._project: 'Project' = project
 
+        # Handle in the artwork spatial index, -1 when not indexed
+        self._index_handle = -1
+
     @property
     def _side_layer_oracle(self) -> 'Project':
         if self._project is not None:
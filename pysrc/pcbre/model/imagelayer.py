@@ -1,7 +1,11 @@
+import binascii
 import cv2  # type: ignore
+import hashlib
 import os.path
 
 from pcbre.model.util import ImmutableSetProxy
+from pcbre.model.imagepyramid import ImagePyramid, image_shape
+from pcbre.model.tilestore import default_tile_store
 from pcbre.matrix import project_point, Vec2
 from pcbre.model.serialization import PersistentID, PersistentIDClass
 import numpy
@@ -120,10 +124,18 @@ class RectAlignment:
 class ImageLayer:
     def __init__(self, project: 'Project',
                  unique_id: PersistentID,
-                 name: str, data: bytes, transform_matrix: 'numpy.typing.ArrayLike' = numpy.identity(3)):
+                 name: str, data: Union[bytes, memoryview], transform_matrix: 'numpy.typing.ArrayLike' = numpy.identity(3),
+                 content_hash: Optional[str] = None):
+        """
+        :param content_hash: hex SHA-256 of data, if already known. Computed on first use otherwise
+        """
 
         self.__unique_id = unique_id
         self.__cached_decode: Optional['numpy.typing.NDArray[numpy.uint8]'] = None
+        self.__shape: Optional[Tuple[int, int]] = None
+        self.__content_hash: Optional[str] = content_hash
+        self.__decoded_replaced = False
+        self.__pyramid: Optional[ImagePyramid] = None
         self._project = project
         self.name = name
         self.__data = data
@@ -153,12 +165,21 @@ class ImageLayer:
         self.__alignment = align
 
     @property
-    def data(self) -> bytes:
+    def data(self) -> Union[bytes, memoryview]:
         """
-        :return: raw (compressed) image file
+        :return: raw (compressed) image file. A memoryview when the project was loaded from a memory-mapped file
         """
         return self.__data
 
+    @property
+    def content_hash(self) -> str:
+        """
+        :return: hex SHA-256 of the raw image file
+        """
+        if self.__content_hash is None:
+            self.__content_hash = binascii.b2a_hex(hashlib.sha256(self.data).digest()).decode("ascii")
+        return self.__content_hash
+
     @property
     # TODO: image decoded type
     def decoded_image(self) -> 'numpy.typing.NDArray[numpy.uint8]':
@@ -170,11 +191,62 @@ class ImageLayer:
 
         return self.__cached_decode
 
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """
+        (height, width) of the image. Read from the file header where possible, so the image isn't decoded
+        """
+        if self.__cached_decode is not None:
+            return self.__cached_decode.shape[:2]
+
+        if self.__shape is None:
+            self.__shape = image_shape(self.data)
+            if self.__shape is None:
+                self.__shape = self.decoded_image.shape[:2]
+
+        return self.__shape
+
+    def decode_level(self, level: int) -> 'npt.NDArray[numpy.uint8]':
+        """
+        Decode the image scaled by 1/2**level. The result isn't cached. JPEGs are decoded directly at reduced
+        size for levels up to 3
+        """
+        h, w = self.shape
+        target = (-(-w >> level), -(-h >> level))
+
+        if self.__cached_decode is not None:
+            im = self.__cached_decode
+        else:
+            buf = numpy.frombuffer(self.data, dtype=numpy.uint8)  # type: ignore
+            flags = (cv2.IMREAD_COLOR, cv2.IMREAD_REDUCED_COLOR_2,
+                     cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_COLOR_8)[min(level, 3)]
+            im = cv2.imdecode(buf, flags)
+
+        if (im.shape[1], im.shape[0]) != target:
+            im = cv2.resize(im, target, interpolation=cv2.INTER_AREA)
+
+        return im
+
+    @property
+    def pyramid(self) -> ImagePyramid:
+        """
+        Tiled multi-resolution view of the image, for drawing. Decoded levels are kept in the on-disk tile store,
+        unless the decoded image was replaced with set_decoded_data
+        """
+        if self.__pyramid is None:
+            if self.__decoded_replaced:
+                self.__pyramid = ImagePyramid(self.decode_level, self.shape)
+            else:
+                self.__pyramid = ImagePyramid(self.decode_level, self.shape,
+                                              key=self.content_hash, store=default_tile_store())
+        return self.__pyramid
+
     def get_corner_points(self) -> List[Vec2]:
         # Normalized_dims
-        max_dim = float(max(self.__cached_decode.shape))
-        x = self.__cached_decode.shape[1]/max_dim
-        y = self.__cached_decode.shape[0]/max_dim
+        h, w = self.shape
+        max_dim = float(max(h, w))
+        x = w/max_dim
+        y = h/max_dim
 
         corners = (
                 (-1, -1),
@@ -243,3 +315,5 @@ class ImageLayer:
 
     def set_decoded_data(self, ar: 'npt.NDArray[numpy.uint8]') -> None:
         self.__cached_decode = ar
+        self.__decoded_replaced = True
+        self.__pyramid = None
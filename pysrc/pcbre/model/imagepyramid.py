@@ -0,0 +1,456 @@
+"""Tiled multi-resolution pyramid for image layers.
+
+Board scans are far too large to decode and upload whole. A pyramid presents an image as power-of-two levels
+(level 0 is full resolution, each following level half the size of the previous), each cut into fixed-size square
+tiles. Tiles are decoded on first use and held in a TileCache, an LRU cache bounded by total bytes. Decoded levels
+may also be kept on disk in a TileStore, so they needn't be decoded again next time the image is opened.
+
+A level that has to be decoded may be decoded on a background thread, so drawing doesn't wait on it. The view
+falls back to a coarser level that is already at hand until the decode finishes.
+
+Nothing here needs a GL context, so tile selection and caching can be used and tested without one."""
+
+import math
+import struct
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple, TYPE_CHECKING, Union
+
+import cv2  # type: ignore
+import numpy
+
+from pcbre.matrix import Point2, Rect, project_point
+from pcbre.model.tilestore import TileStore
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+__author__ = 'davidc'
+
+TILE_SIZE = 512
+
+# Default byte budget of the shared tile cache
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def image_shape(data: Union[bytes, memoryview]) -> Optional[Tuple[int, int]]:
+    """
+    (height, width) of a PNG or JPEG image read from its header, or None if the format isn't recognized and the
+    image must be decoded to find out
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return height, width
+
+    if data[:2] == b"\xff\xd8":
+        pos = 2
+        while pos + 4 <= len(data):
+            if data[pos] != 0xff:
+                return None
+
+            marker = data[pos + 1]
+            if marker == 0xff:
+                # Fill byte
+                pos += 1
+                continue
+
+            if marker == 0x01 or 0xd0 <= marker <= 0xd7:
+                # Markers without a length
+                pos += 2
+                continue
+
+            # Start of frame markers. C4, C8 and CC share the range but are something else
+            if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                if pos + 9 > len(data):
+                    return None
+                height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+                return height, width
+
+            seg_len, = struct.unpack(">H", data[pos + 2:pos + 4])
+            pos += 2 + seg_len
+
+    return None
+
+
+class TileCache:
+    """
+    LRU cache of decoded tiles, bounded by their total size in bytes. One cache may be shared by several pyramids,
+    so the budget covers all open images. The most recently added tile is never evicted, even if it alone
+    exceeds the budget
+    """
+
+    def __init__(self, budget: int = DEFAULT_CACHE_BYTES) -> None:
+        self.budget = budget
+        self.__tiles: 'OrderedDict[Hashable, npt.NDArray[numpy.uint8]]' = OrderedDict()
+        self.__nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.__tiles)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__tiles
+
+    @property
+    def nbytes(self) -> int:
+        return self.__nbytes
+
+    def get(self, key: Hashable) -> 'Optional[npt.NDArray[numpy.uint8]]':
+        try:
+            tile = self.__tiles[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.__tiles.move_to_end(key)
+        self.hits += 1
+        return tile
+
+    def put(self, key: Hashable, tile: 'npt.NDArray[numpy.uint8]') -> None:
+        old = self.__tiles.pop(key, None)
+        if old is not None:
+            self.__nbytes -= old.nbytes
+
+        self.__tiles[key] = tile
+        self.__nbytes += tile.nbytes
+
+        while self.__nbytes > self.budget and len(self.__tiles) > 1:
+            _, evicted = self.__tiles.popitem(last=False)
+            self.__nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.__tiles.clear()
+        self.__nbytes = 0
+
+
+_default_cache: Optional[TileCache] = None
+
+
+def default_tile_cache() -> TileCache:
+    """Tile cache shared by all pyramids that aren't given one"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TileCache()
+    return _default_cache
+
+
+_decode_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _background_decoder() -> ThreadPoolExecutor:
+    """Thread that background decodes run on, shared by all pyramids. One at a time, as each may be a whole scan"""
+    global _decode_executor
+    if _decode_executor is None:
+        _decode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyramid-decode")
+    return _decode_executor
+
+
+class Tile(NamedTuple):
+    level: int
+    tx: int
+    ty: int
+
+    # Area covered, in level 0 pixels. Clipped to the image
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+
+    image: 'npt.NDArray[numpy.uint8]'
+
+
+class ImagePyramid:
+    """
+    Tiled pyramid over one image.
+
+    Pixel coordinates have their origin at the first pixel of the image data, as decoded by cv2. Normalized
+    coordinates are those ImageLayer.transform_matrix maps to world, where the image is centered on the origin
+    and its longest side spans -1..1
+    """
+
+    def __init__(self, decode: Callable[[int], 'npt.NDArray[numpy.uint8]'], shape: Tuple[int, int],
+                 tile_size: int = TILE_SIZE, cache: Optional[TileCache] = None, key: Optional[Hashable] = None,
+                 store: Optional[TileStore] = None):
+        """
+        :param decode: returns the whole image at a level, ie: scaled by 1/2**level to level_shape(level)
+        :param shape: (height, width) of the full resolution image
+        :param cache: tile cache, defaults to the shared cache
+        :param key: identifies the image content in the cache. Pyramids over identical images may share a key
+        :param store: on-disk store that decoded levels are kept in and loaded from. key must be a content hash
+                      string to use a store
+        """
+        if store is not None and not isinstance(key, str):
+            raise ValueError("A tile store needs a content hash key")
+
+        self.__decode = decode
+        self.height, self.width = shape
+        self.tile_size = tile_size
+        self.cache = cache if cache is not None else default_tile_cache()
+        self.store = store
+        self.__key = key if key is not None else object()
+
+        self.levels = 1
+        while max(self.level_shape(self.levels - 1)) > tile_size:
+            self.levels += 1
+
+        # Number of times a level was decoded, or loaded from the store
+        self.decodes = 0
+        self.loads = 0
+
+        # Background decodes still running. Each gives the tiles to cache, when there's no store to read them from
+        self.__decoding: 'Dict[int, Future[List[Tuple[Tuple[int, int], npt.NDArray[numpy.uint8]]]]]' = {}
+
+    def level_shape(self, level: int) -> Tuple[int, int]:
+        """(height, width) of a level. Partial pixels at the edge are rounded up"""
+        return -(-self.height >> level), -(-self.width >> level)
+
+    def tile_grid(self, level: int) -> Tuple[int, int]:
+        """(rows, columns) of tiles at a level"""
+        h, w = self.level_shape(level)
+        return -(-h // self.tile_size), -(-w // self.tile_size)
+
+    def level_for_scale(self, pixels_per_screen_pixel: float) -> int:
+        """
+        Coarsest level that still has at least one pixel per screen pixel, given how many full resolution pixels
+        fall on one screen pixel
+        """
+        if pixels_per_screen_pixel <= 1:
+            return 0
+
+        return min(int(math.log2(pixels_per_screen_pixel)), self.levels - 1)
+
+    def tiles_in_rect(self, level: int, x0: float, y0: float, x1: float, y1: float) -> List[Tuple[int, int]]:
+        """(tx, ty) of the tiles at a level that overlap a rect given in level 0 pixels"""
+        rows, cols = self.tile_grid(level)
+        span = self.tile_size << level
+
+        tx0 = max(int(math.floor(x0 / span)), 0)
+        ty0 = max(int(math.floor(y0 / span)), 0)
+        tx1 = min(int(math.floor(x1 / span)), cols - 1)
+        ty1 = min(int(math.floor(y1 / span)), rows - 1)
+
+        return [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def __tile(self, level: int, tx: int, ty: int, image: 'npt.NDArray[numpy.uint8]') -> Tile:
+        span = self.tile_size << level
+        return Tile(level, tx, ty,
+                    tx * span, ty * span,
+                    min((tx + 1) * span, self.width), min((ty + 1) * span, self.height),
+                    image)
+
+    def __cut(self, level_image: 'npt.NDArray[numpy.uint8]', tx: int, ty: int) -> 'npt.NDArray[numpy.uint8]':
+        ts = self.tile_size
+        # Copy, so the tile doesn't keep the whole level alive
+        tile = level_image[ty * ts:(ty + 1) * ts, tx * ts:(tx + 1) * ts].copy()
+        tile.flags.writeable = False
+        return tile
+
+    def __cut_stored(self, level: int, tiles: 'npt.NDArray[numpy.uint8]', tx: int, ty: int) \
+            -> 'npt.NDArray[numpy.uint8]':
+        h, w = self.level_shape(level)
+        ts = self.tile_size
+        # Copy out of the memory map, dropping the edge padding
+        tile = numpy.array(tiles[ty, tx, :min(ts, h - ty * ts), :min(ts, w - tx * ts)])
+        tile.flags.writeable = False
+        return tile
+
+    def __decode_level(self, level: int) -> 'npt.NDArray[numpy.uint8]':
+        level_image = self.__decode(level)
+        self.decodes += 1
+
+        expected = self.level_shape(level)
+        if level_image.shape[:2] != expected:
+            raise ValueError("Decoded level %d is %r, expected %r" % (level, level_image.shape[:2], expected))
+
+        return level_image
+
+    def __load_stored(self, level: int) -> 'Optional[npt.NDArray[numpy.uint8]]':
+        if self.store is None:
+            return None
+
+        assert isinstance(self.__key, str)
+        return self.store.load(self.__key, level, self.tile_size, self.level_shape(level))
+
+    def __save_levels(self, level: int, level_image: 'npt.NDArray[numpy.uint8]') -> None:
+        """Store a decoded level, and the coarser levels that aren't stored yet, downsampled from it"""
+        assert self.store is not None and isinstance(self.__key, str)
+        self.store.save(self.__key, level, self.tile_size, level_image)
+
+        for coarser in range(level + 1, self.levels):
+            h, w = self.level_shape(coarser)
+            level_image = cv2.resize(level_image, (w, h), interpolation=cv2.INTER_AREA)  # type: ignore
+            if self.store.load(self.__key, coarser, self.tile_size, (h, w)) is None:
+                self.store.save(self.__key, coarser, self.tile_size, level_image)
+
+    def __decode_stored(self, level: int) -> 'npt.NDArray[numpy.uint8]':
+        level_image = self.__decode_level(level)
+        if self.store is not None:
+            self.__save_levels(level, level_image)
+        return level_image
+
+    def __ready(self, level: int, positions: Sequence[Tuple[int, int]]) -> bool:
+        """Whether get_tiles can return these tiles without decoding"""
+        if all((self.__key, level) + pos in self.cache for pos in positions):
+            return True
+
+        return self.__load_stored(level) is not None
+
+    def __decode_tiles(self, level: int, positions: Sequence[Tuple[int, int]]) \
+            -> 'List[Tuple[Tuple[int, int], npt.NDArray[numpy.uint8]]]':
+        """Background decode. Tiles to cache, those at positions last, or none if the level went in the store"""
+        level_image = self.__decode_stored(level)
+        if self.store is not None:
+            return []
+
+        requested = {pos: self.__cut(level_image, *pos) for pos in positions}
+        neighbours = self.__neighbours(level, level_image, positions, requested)
+        return [(pos, self.__cut(level_image, *pos)) for pos in neighbours] + list(requested.items())
+
+    def __decode_in_background(self, level: int, positions: Sequence[Tuple[int, int]]) -> None:
+        if level not in self.__decoding:
+            self.__decoding[level] = _background_decoder().submit(self.__decode_tiles, level, positions)
+
+    def poll(self) -> bool:
+        """
+        Cache the tiles of finished background decodes. Errors raised by a decode are raised here
+
+        :return: whether any finished
+        """
+        done = [level for level, f in self.__decoding.items() if f.done()]
+        for level in done:
+            for pos, tile in self.__decoding.pop(level).result():
+                self.cache.put((self.__key, level) + pos, tile)
+
+        return bool(done)
+
+    @property
+    def pending(self) -> bool:
+        """Whether levels are still being decoded in the background"""
+        return bool(self.__decoding)
+
+    def get_tiles(self, level: int, positions: Sequence[Tuple[int, int]]) -> List[Tile]:
+        """
+        Tiles at (tx, ty) positions of a level. Tiles not in the cache are cut from the level in the tile store
+        if it's there. Otherwise they are cut from a single decode of the level, and neighbouring tiles are cached
+        from the same decode while they fit in half the cache budget.
+
+        A missing level is decoded on the calling thread, which for level 0 is the whole image. See view for a way
+        to draw without waiting on that
+        """
+        images = {}
+        missing = []
+        for pos in positions:
+            image = self.cache.get((self.__key, level) + pos)
+            if image is None:
+                missing.append(pos)
+            else:
+                images[pos] = image
+
+        if missing:
+            stored = self.__load_stored(level)
+            if stored is not None:
+                self.loads += 1
+                for pos in missing:
+                    images[pos] = self.__cut_stored(level, stored, *pos)
+            else:
+                level_image = self.__decode_stored(level)
+
+                for pos in missing:
+                    images[pos] = self.__cut(level_image, *pos)
+
+                for pos in self.__neighbours(level, level_image, missing, images):
+                    self.cache.put((self.__key, level) + pos, self.__cut(level_image, *pos))
+
+            # Requested tiles go in last, so they are the last to be evicted
+            for pos in missing:
+                self.cache.put((self.__key, level) + pos, images[pos])
+
+        return [self.__tile(level, tx, ty, images[(tx, ty)]) for tx, ty in positions]
+
+    def __neighbours(self, level: int, level_image: 'npt.NDArray[numpy.uint8]',
+                     missing: Sequence[Tuple[int, int]],
+                     requested: 'Dict[Tuple[int, int], npt.NDArray[numpy.uint8]]') -> List[Tuple[int, int]]:
+        """
+        Positions of the tiles around the missing ones to cache from the same decode, while they fit in half the
+        cache budget. Farthest first, so the nearest are evicted last
+        """
+        rows, cols = self.tile_grid(level)
+        cx = sum(tx for tx, _ in missing) / len(missing)
+        cy = sum(ty for _, ty in missing) / len(missing)
+
+        others = [(tx, ty) for ty in range(rows) for tx in range(cols)
+                  if (tx, ty) not in requested and (self.__key, level, tx, ty) not in self.cache]
+        others.sort(key=lambda p: (p[0] - cx) ** 2 + (p[1] - cy) ** 2)
+
+        budget = self.cache.budget // 2 - sum(requested[pos].nbytes for pos in missing)
+        tile_bytes = self.tile_size * self.tile_size * level_image.itemsize * \
+            (level_image.shape[2] if level_image.ndim == 3 else 1)
+        count = max(budget // tile_bytes, 0)
+
+        return others[:count][::-1]
+
+    @property
+    def pixel_to_normalized(self) -> 'npt.NDArray[numpy.float64]':
+        m = float(max(self.width, self.height))
+        return numpy.array([
+            [2 / m, 0, -self.width / m],
+            [0, 2 / m, -self.height / m],
+            [0, 0, 1]], dtype=numpy.float64)
+
+    def view(self, normalized_to_world: 'npt.NDArray[numpy.float64]', view_rect: Rect, scale: float,
+             background: bool = False) -> Tuple[int, List[Tile]]:
+        """
+        Level and tiles needed to draw the part of the image that falls in a world-space rect
+
+        :param normalized_to_world: the image's transform, eg: ImageLayer.transform_matrix
+        :param view_rect: visible world rect
+        :param scale: world units per screen pixel
+        :param background: if the level would have to be decoded, decode it in the background and return the
+                           finest coarser level that is ready instead, or no tiles if none is. Call again once
+                           pending is False for the level asked for
+        """
+        # Before the visibility test, so pending clears for an image that has scrolled out of view
+        if background:
+            self.poll()
+
+        world_to_pixel = numpy.linalg.inv(normalized_to_world.dot(self.pixel_to_normalized))
+
+        corners = [project_point(world_to_pixel, pt)
+                   for pt in (view_rect.bl, view_rect.br, view_rect.tl, view_rect.tr)]
+        x0 = min(p.x for p in corners)
+        x1 = max(p.x for p in corners)
+        y0 = min(p.y for p in corners)
+        y1 = max(p.y for p in corners)
+
+        if x1 < 0 or y1 < 0 or x0 >= self.width or y0 >= self.height:
+            return 0, []
+
+        # Image pixels per screen pixel, measured at the center of the view
+        c = view_rect.center
+        pc = project_point(world_to_pixel, c)
+        px = project_point(world_to_pixel, Point2(c.x + scale, c.y))
+        py = project_point(world_to_pixel, Point2(c.x, c.y + scale))
+        density = math.sqrt((px - pc).mag() * (py - pc).mag())
+
+        level = self.level_for_scale(density)
+
+        if background:
+            wanted = level
+            while level < self.levels and not self.__ready(level, self.tiles_in_rect(level, x0, y0, x1, y1)):
+                level += 1
+
+            if level != wanted:
+                # The coarsest level is the quickest to decode, so it goes first when there's nothing to draw
+                if level == self.levels:
+                    coarsest = self.levels - 1
+                    self.__decode_in_background(coarsest, self.tiles_in_rect(coarsest, x0, y0, x1, y1))
+                self.__decode_in_background(wanted, self.tiles_in_rect(wanted, x0, y0, x1, y1))
+
+                if level == self.levels:
+                    return wanted, []
+
+        return level, self.get_tiles(level, self.tiles_in_rect(level, x0, y0, x1, y1))
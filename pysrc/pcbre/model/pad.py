@@ -123,8 +123,14 @@ class Pad(Geom):
 
     @net.setter
     def net(self, value: 'Net') -> None:
+        old = self.net
         self.parent.set_net_for_pad_no(self.pad_no, value)
 
+        # Pads are owned by the component, so the project comes from the parent
+        project = self.parent._project
+        if project is not None and old is not value:
+            project.artwork._net_changed(self, old, value)
+
     @property
     def pad_name(self) -> str:
         return self.parent.pin_name_for_no("%s" % self.pad_no)
@@ -1,6 +1,6 @@
 import os
 from enum import Enum
-from typing import List, Tuple, Sequence, Optional
+from typing import Dict, List, Tuple, Sequence, Optional, Iterable
 
 import pcbre.model.serialization_capnp as ser_capnp
 import pcbre.model.serialization_dirtext as ser_dirtext
@@ -47,6 +47,11 @@ class Stackup:
 
         self.changed = TinySignal()
 
+        # Layer order and via pair spans. Rebuilt on first use after the stackup changes
+        self.__layer_order: Optional[Dict[Layer, int]] = None
+        self.__via_spans: Dict[ViaPair, Tuple[Tuple[Layer, Layer], Tuple[Layer, ...], int]] = {}
+        self.changed.connect(self._invalidate_layer_cache)
+
     def add_via_pair(self, start_layer: Layer, end_layer: Layer):
         vp = ViaPair(self._project,
                      self._project.unique_id_registry.generate(PersistentIDClass.ViaPair),
@@ -89,6 +94,18 @@ class Stackup:
         for n, i in enumerate(self._layers):
             i.number = n
 
+        # The deserializers fill _layers directly and then renumber, without emitting changed
+        self._invalidate_layer_cache()
+
+    def _invalidate_layer_cache(self) -> None:
+        self.__layer_order = None
+        self.__via_spans.clear()
+
+    def __get_layer_order(self) -> Dict[Layer, int]:
+        if self.__layer_order is None:
+            self.__layer_order = {layer: n for n, layer in enumerate(self._layers)}
+        return self.__layer_order
+
     def add_layer(self, name: str, color: Tuple[float, float, float]) -> Layer:
         layer = Layer(self._project, self._project.unique_id_registry.generate(PersistentIDClass.Layer), name, color)
         self._add_layer_existing(layer)
@@ -112,7 +129,34 @@ class Stackup:
         return False
 
     def _order_for_layer(self, layer: Layer) -> int:
-        return self._layers.index(layer)
+        try:
+            return self.__get_layer_order()[layer]
+        except KeyError:
+            raise ValueError("%r is not in the stackup" % layer) from None
+
+    def _layer_mask(self, layer: Layer) -> int:
+        """Single bit for the layer, by stackup order. 0 for layers not in the stackup"""
+        order = self.__get_layer_order().get(layer)
+        return 0 if order is None else 1 << order
+
+    def _via_span(self, via_pair: ViaPair) -> Tuple[Tuple[Layer, Layer], Tuple[Layer, ...], int]:
+        """
+        :return: (end layers in stackup order, all spanned layers in stackup order, bitmask of all spanned layers)
+        """
+        try:
+            return self.__via_spans[via_pair]
+        except KeyError:
+            pass
+
+        first, second = sorted(via_pair._end_layers, key=self._order_for_layer)
+        order = self.__get_layer_order()
+        all_layers = tuple(self._layers[order[first]:order[second] + 1])
+        mask = 0
+        for layer in all_layers:
+            mask |= 1 << order[layer]
+
+        span = self.__via_spans[via_pair] = ((first, second), all_layers, mask)
+        return span
 
     def set_layer_order(self, layer: Layer, n: int) -> None:
         self._layers.remove(layer)
@@ -236,6 +280,19 @@ class Nets:
         # TODO, strip net from all artwork that has it / verify
         self._nets.remove(net)
 
+    def remove_nets(self, nets: Iterable[Net]) -> None:
+        """
+        Remove many nets from the project in a single pass over the net list
+        :param nets: nets to be removed
+        :return:
+        """
+        to_remove = set(nets)
+        for net in to_remove:
+            assert net._project == self._project
+
+        # Modify in place, the net list is shared with the proxy
+        self._nets[:] = [i for i in self._nets if i not in to_remove]
+
 
 class Project:
 
@@ -254,17 +311,23 @@ class Project:
         return Project()
 
     @staticmethod
-    def open(path: os.PathLike, filetype: StorageType) -> 'Project':
+    def open(path: os.PathLike, filetype: StorageType, use_mmap: bool = False,
+             workers: Optional[int] = None) -> 'Project':
+        """
+        :param use_mmap: memory-map packed files rather than reading them into memory. See CapnpIO.open_mmap
+        :param workers: parallel load of directory projects. See DirTextIO.open_path
+        """
         if filetype == StorageType.Packed:
-            self = ser_capnp.CapnpIO.open_path(path)
+            self = ser_capnp.CapnpIO.open_path(path, use_mmap=use_mmap)
         elif filetype == StorageType.Dir:
-            self = ser_dirtext.DirTextIO.open_path(path)
+            self = ser_dirtext.DirTextIO.open_path(path, workers=workers)
         else:
             raise ValueError("Unknown serialization file type %s" % repr(filetype))
         return self
 
     @staticmethod
-    def open_detect(path: os.PathLike) -> 'Tuple[Project, StorageType]':
+    def open_detect(path: os.PathLike, use_mmap: bool = False,
+                    workers: Optional[int] = None) -> 'Tuple[Project, StorageType]':
         if not os.path.exists(path):
             raise IOError("Path not found")
 
@@ -273,7 +336,7 @@ class Project:
         else:
             storage_type = StorageType.Packed
 
-        return Project.open(path, storage_type), storage_type
+        return Project.open(path, storage_type, use_mmap=use_mmap, workers=workers), storage_type
 
 
     def save(self, path: str, filetype: StorageType) -> None:
@@ -9,9 +9,10 @@ from .pcbre_capnp import Project, Stackup, ViaPair, Layer, Color3f, Artwork, Ima
     Net, Nets, Image as ImageMsg, ImageTransform as ImageTransformMsg, Matrix3x3, Matrix4x4, Point2, Point2f, \
     Keypoint as KeypointMsg, ImageTransform, Component as ComponentMsg, Handle as HandleMsg
 
-from typing import Tuple, Union, Dict, TYPE_CHECKING, Optional, BinaryIO
+from typing import Any, List, Tuple, Union, Dict, TYPE_CHECKING, Optional, BinaryIO
 
 import pcbre.matrix
+import mmap
 import numpy
 import os
 
@@ -34,6 +35,14 @@ if TYPE_CHECKING:
 MAGIC = b"PCBRE\x00"
 VERSION_MAGIC = SERIALIZATION_VERSION.to_bytes(2, 'little')
 
+# Traversal limit, as a multiple of the message size. Some structs are read more than once while deserializing, the
+# limit only needs to stop pathological amplification. capnp's own default (64MiB) is too small for large projects
+TRAVERSAL_FACTOR = 4
+
+
+def _traversal_limit(message_bytes: int) -> int:
+    return max(TRAVERSAL_FACTOR * (message_bytes // 8), 8 * 1024 * 1024)
+
 class CapnpIO:
     project: 'pcbre.model.project.Project'
     net_ref: 'Dict[PersistentID, pcbre.model.net.Net]'
@@ -43,6 +52,10 @@ class CapnpIO:
     keypoint_ref: 'Dict[PersistentID, pcbre.model.imagelayer.KeyPoint]'
     imagelayer_ref: 'Dict[PersistentID, pcbre.model.imagelayer.ImageLayer]'
 
+    # File mapping the message is read from, when loading with open_mmap
+    mapping: Optional[mmap.mmap]
+    mapping_address: int
+
     @staticmethod
     def serialize_color3f(color: Tuple[float, float, float]) -> Color3f:
         msg = Color3f.new_message()
@@ -308,13 +321,33 @@ class CapnpIO:
 
         return msg
 
+    def deserialize_data(self, msg: 'ImageMsg.Reader') -> Union[bytes, memoryview]:
+        """
+        Image payload. When loading from a mapping this is a view into the mapping rather than a copy
+        """
+        if self.mapping is None:
+            return msg.data
+
+        view = msg.get_data_as_view("data")
+        if not len(view):
+            return b""
+
+        # pycapnp's view is a bare pointer, it doesn't keep the mapping alive. Slice the mapping itself instead,
+        # so the image layer holds a reference to it
+        offset = numpy.frombuffer(view, dtype=numpy.uint8).ctypes.data - self.mapping_address
+        if offset < 0 or offset + len(view) > len(self.mapping):
+            return bytes(view)
+
+        return memoryview(self.mapping)[offset:offset + len(view)]
+
     def deserialize_imagelayer(self, msg: 'ImageMsg.Reader') -> \
             'pcbre.model.imagelayer.ImageLayer':
         import pcbre.model.imagelayer
         transform = self.deserialize_matrix(msg.transform.matrix)
 
         unique_id = self.project.unique_id_registry.decode_add_from_uint32(msg.sid)
-        obj = pcbre.model.imagelayer.ImageLayer(self.project, unique_id, msg.name, msg.data, transform)
+        obj = pcbre.model.imagelayer.ImageLayer(self.project, unique_id, msg.name, self.deserialize_data(msg),
+                                                transform)
         self.imagelayer_ref[unique_id] = obj
 
         obj._project = self.project
@@ -392,8 +425,12 @@ class CapnpIO:
         return project_msg
 
     @staticmethod
-    def deserialize_project(msg: Project) -> 'pcbre.model.project.Project':
+    def deserialize_project(msg: Project, mapping: Optional[mmap.mmap] = None) -> 'pcbre.model.project.Project':
         self = CapnpIO()
+        self.mapping = mapping
+        if mapping is not None:
+            self.mapping_address = numpy.frombuffer(mapping, dtype=numpy.uint8).ctypes.data
+
         self.net_ref = dict()
         self.layer_ref = dict()
         self.viapair_ref = dict()
@@ -657,6 +694,11 @@ class CapnpIO:
 
     def deserialize_artwork(self, msg: Artwork) -> None:
         import pcbre.model.artwork
+
+        # Everything is collected first, then handed to the artwork in one bulk load
+        geoms: List[Any] = []
+        components = []
+
         for i_via in msg.vias:
             viapair_oid = self.project.unique_id_registry.decode_check_from_uint32(i_via.viapairSid)
             net_oid = self.project.unique_id_registry.decode_check_from_uint32(i_via.netSid)
@@ -666,7 +708,7 @@ class CapnpIO:
                                         self.__lookup_net_helper(net_oid)
                                         )
 
-            self.project.artwork.add_artwork(v)
+            geoms.append(v)
 
         for i_trace in msg.traces:
             layer_oid = self.project.unique_id_registry.decode_check_from_uint32(i_trace.layerSid)
@@ -678,7 +720,7 @@ class CapnpIO:
                 self.layer_ref.get(layer_oid),
                 self.__lookup_net_helper(net_oid)
             )
-            self.project.artwork.add_artwork(t)
+            geoms.append(t)
 
         for i_poly in msg.polygons:
             exterior = [self.deserialize_point2(j) for j in i_poly.exterior]
@@ -694,7 +736,7 @@ class CapnpIO:
                 self.__lookup_net_helper(net_oid),
             )
 
-            self.project.artwork.add_artwork(p)
+            geoms.append(p)
 
         for i_airwire in msg.airwires:
             p0_oid = self.project.unique_id_registry.decode_check_from_uint32(i_airwire.p0LayerSid)
@@ -707,7 +749,7 @@ class CapnpIO:
                 self.layer_ref.get(p1_oid),
                 self.net_ref.get(net_oid)
             )
-            self.project.artwork.add_artwork(aw)
+            geoms.append(aw)
 
         for i_cmp in msg.components:
             if i_cmp.which() == "dip":
@@ -721,14 +763,43 @@ class CapnpIO:
             else:
                 raise NotImplementedError()
 
-            self.project.artwork.add_component(cmp)
+            components.append(cmp)
+
+        self.project.artwork.bulk_load(geoms, components)
 
 
     @staticmethod
-    def open_path(path: os.PathLike) -> 'pcbre.model.project.Project':
+    def open_path(path: os.PathLike, use_mmap: bool = False) -> 'pcbre.model.project.Project':
+        if use_mmap:
+            return CapnpIO.open_mmap(path)
+
         with open(path, "rb", buffering=0) as f:
             return CapnpIO.open_fd(f)
 
+    @staticmethod
+    def open_mmap(path: os.PathLike) -> 'pcbre.model.project.Project':
+        """
+        Load a project by memory-mapping the file and reading the message in place. Image payloads stay views into
+        the mapping, so they are only paged in when decoded. The mapping lives as long as any image layer using it.
+
+        The file must not be modified while the project is open. On POSIX saving over it is fine, save_path moves
+        the old file aside rather than rewriting it. Windows won't rename or delete a mapped file, so there save_path
+        raises IOError for this path; save elsewhere, or open without mmap if the project is to be saved in place
+        """
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = mapping[:8]
+        if magic[:6] != MAGIC:
+            raise ValueError("Unknown File Type")
+
+        if magic[6:8] != VERSION_MAGIC:
+            raise ValueError("Unknown File Version")
+
+        with Project.from_bytes(memoryview(mapping)[8:],
+                                traversal_limit_in_words=_traversal_limit(len(mapping) - 8)) as msg:
+            return CapnpIO.deserialize_project(msg, mapping)
+
     @staticmethod
     def open_fd(fd: BinaryIO) -> 'pcbre.model.project.Project':
         magic = fd.read(8)
@@ -739,7 +810,12 @@ class CapnpIO:
         if vers != VERSION_MAGIC:
             raise ValueError("Unknown File Version")
 
-        _project = Project.read(fd)
+        try:
+            message_bytes = os.fstat(fd.fileno()).st_size - 8
+        except (AttributeError, OSError, ValueError):
+            message_bytes = 0
+
+        _project = Project.read(fd, traversal_limit_in_words=_traversal_limit(message_bytes))
         self = CapnpIO.deserialize_project(_project)
         return self
 
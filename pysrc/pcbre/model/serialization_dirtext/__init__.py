@@ -4,7 +4,11 @@ import re
 import typing
 import hashlib
 import binascii
-from typing import Dict, Tuple, Any, Iterable, BinaryIO, Optional, Generator, List, Callable, Any
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Dict, Tuple, Any, Iterable, BinaryIO, Optional, Generator, List, Callable, Any, Union
 import numpy
 
 from pcbre.matrix import Point2
@@ -160,6 +164,12 @@ def parse_recursive(tokenizer, line_no):
         raise ParseError("Got unexpected equals")
 
     if first == b'(':
+        # Empty tuple, eg: a polygon without interiors
+        start = tokenizer.pos
+        if tokenizer.get_token() == b')':
+            return ()
+        tokenizer.pos = start
+
         l = []
         while 1:
             l.append(parse_recursive(tokenizer, line_no))
@@ -199,19 +209,277 @@ def parse_line_dict(line, line_no):
 
     return top_level
 
+
+class StoredFileHash(typing.NamedTuple):
+    digest: bytes
+    size: int
+    mtime_ns: int
+
+
+class StoredChecksum(typing.NamedTuple):
+    digest: bytes
+    files: Dict[Tuple[str, ...], StoredFileHash]
+
+
 def decode_persistent_id_str(v):
     cls, num = v.split(b'_')
     return PersistentID(PersistentIDClass[cls.decode('ascii')], int(num,16)).as_uint32
 
+
+class _Record(SimpleNamespace):
+    """Values of one line, as attributes named after the keys of its parse definition"""
+
+
+class _PersistentIDCache(dict):
+    """Decoded persistent ID strings. Large files repeat the same few layer/net IDs on every line"""
+
+    def __missing__(self, key: bytes) -> int:
+        value = self[key] = decode_persistent_id_str(key)
+        return value
+
+
+ParseDef = Tuple[Tuple[bytes, Callable[[Any], Any]], ...]
+
+
+class RecordFormat(typing.NamedTuple):
+    """
+    A file of single noun records. Lines laid out exactly as DirTextIO writes them are matched by fast_re and built
+    directly from its groups by fast_build(ids, *groups). Any other line is handled by the general parser and defn,
+    so both give the same record, or the same error.
+
+    Formats that can be parsed in worker processes have pack, which splits a record into integer columns and point
+    rings for RecordArrays, and unpack(columns, rings) which reverses it
+    """
+    noun: bytes
+    defn: ParseDef
+    fast_re: 'typing.Pattern[bytes]'
+    fast_build: Callable[..., _Record]
+    pack: Optional[Callable[[_Record], Tuple[Tuple[int, ...], Tuple[Tuple[Point2, ...], ...]]]] = None
+    unpack: Optional[Callable[[List[int], List[Tuple[Point2, ...]]], _Record]] = None
+
+
+class RecordArrays(typing.NamedTuple):
+    """
+    Records of one file packed into arrays, which are far cheaper to pass between processes than record objects
+    """
+    # (records, columns) integer columns of each record
+    values: 'numpy.typing.NDArray[numpy.int64]'
+    # (records,) number of point rings of each record
+    ring_counts: 'numpy.typing.NDArray[numpy.int64]'
+    # (rings,) number of points in each ring, in record order
+    ring_sizes: 'numpy.typing.NDArray[numpy.int64]'
+    # (points, 2) points of all rings
+    points: 'numpy.typing.NDArray[numpy.int64]'
+
+
+# Fragments of the fast record layouts. Everything the general tokenizer would read differently, eg: escaped or
+# quoted strings containing punctuation, keys out of order, words run together, falls outside these and takes the
+# general parser
+_S = rb"[ \t]*"
+_NUM = rb"[-+]?[0-9]+"
+_INT = rb"(" + _NUM + rb")"
+_ID = rb"([A-Za-z]+_0x[0-9A-Fa-f]+)"
+_STRING = rb'("[^"\\(),=]*"|[a-zA-Z0-9_.]+)'
+_POINT = rb"\(" + _S + _INT + _S + rb"," + _S + _INT + _S + rb"\)"
+_LAYER_POINT = rb"\(" + _S + _ID + _S + rb"," + _S + _POINT + _S + rb"\)"
+_POINT_NC = rb"\(" + _S + _NUM + _S + rb"," + _S + _NUM + _S + rb"\)"
+_POINTS_NC = rb"\(" + _S + _POINT_NC + rb"(?:" + _S + rb"," + _S + _POINT_NC + rb")*" + _S + rb"\)"
+_RINGS = rb"(\(" + _S + rb"(?:" + _POINTS_NC + rb"(?:" + _S + rb"," + _S + _POINTS_NC + rb")*)?" + _S + rb"\))"
+
+_NUM_RE = re.compile(_NUM)
+_RING_RE = re.compile(_POINTS_NC)
+
+
+def _fast_layout(*fields: Tuple[bytes, bytes]) -> 'typing.Pattern[bytes]':
+    """Regex for key=value pairs in the given order, separated by whitespace"""
+    return re.compile(_S + rb"[ \t]+".join(key + _S + rb"=" + _S + value for key, value in fields) + _S)
+
+
+def _fast_points(s: bytes) -> Tuple[Point2, ...]:
+    coords = iter([int(i) for i in _NUM_RE.findall(s)])
+    return tuple(Point2(x, y) for x, y in zip(coords, coords))
+
+
+def _fast_string(s: bytes) -> bytes:
+    if s[:1] == b'"':
+        return s[1:-1]
+    return s
+
+
+def _decode_point(x: Any) -> Point2:
+    return Point2(int(x[0]), int(x[1]))
+
+
+VIA_FORMAT = RecordFormat(
+    b"VIA",
+    (
+        (b"center", _decode_point),
+        (b"radius", lambda x: int(x)),
+        (b"viapair", decode_persistent_id_str),
+        (b"net", decode_persistent_id_str),
+    ),
+    _fast_layout((b"center", _POINT), (b"radius", _INT), (b"viapair", _ID), (b"net", _ID)),
+    lambda ids, x, y, radius, viapair, net: _Record(
+        center=Point2(int(x), int(y)), radius=int(radius), viapair=ids[viapair], net=ids[net]),
+    lambda r: ((r.center.x, r.center.y, r.radius, r.viapair, r.net), ()),
+    lambda v, rings: _Record(center=Point2(v[0], v[1]), radius=v[2], viapair=v[3], net=v[4])
+)
+
+TRACE_FORMAT = RecordFormat(
+    b"TRACE",
+    (
+        (b"p0", _decode_point),
+        (b"p1", _decode_point),
+        (b"thickness", lambda x: int(x)),
+        (b"layer", decode_persistent_id_str),
+        (b"net", decode_persistent_id_str),
+    ),
+    _fast_layout((b"p0", _POINT), (b"p1", _POINT), (b"thickness", _INT), (b"layer", _ID), (b"net", _ID)),
+    lambda ids, x0, y0, x1, y1, thickness, layer, net: _Record(
+        p0=Point2(int(x0), int(y0)), p1=Point2(int(x1), int(y1)), thickness=int(thickness),
+        layer=ids[layer], net=ids[net]),
+    lambda r: ((r.p0.x, r.p0.y, r.p1.x, r.p1.y, r.thickness, r.layer, r.net), ()),
+    lambda v, rings: _Record(p0=Point2(v[0], v[1]), p1=Point2(v[2], v[3]), thickness=v[4], layer=v[5], net=v[6])
+)
+
+AIRWIRE_FORMAT = RecordFormat(
+    b"AIRWIRE",
+    (
+        (b"p0", lambda x: (decode_persistent_id_str(x[0]), _decode_point(x[1]))),
+        (b"p1", lambda x: (decode_persistent_id_str(x[0]), _decode_point(x[1]))),
+        (b"net", decode_persistent_id_str),
+    ),
+    _fast_layout((b"p0", _LAYER_POINT), (b"p1", _LAYER_POINT), (b"net", _ID)),
+    lambda ids, l0, x0, y0, l1, x1, y1, net: _Record(
+        p0=(ids[l0], Point2(int(x0), int(y0))), p1=(ids[l1], Point2(int(x1), int(y1))), net=ids[net]),
+    lambda r: ((r.p0[0], r.p0[1].x, r.p0[1].y, r.p1[0], r.p1[1].x, r.p1[1].y, r.net), ()),
+    lambda v, rings: _Record(p0=(v[0], Point2(v[1], v[2])), p1=(v[3], Point2(v[4], v[5])), net=v[6])
+)
+
+POLYGON_FORMAT = RecordFormat(
+    b"POLYGON",
+    (
+        (b"exterior", lambda x: tuple(_decode_point(i) for i in x)),
+        (b"interior", lambda x: tuple(
+            tuple(_decode_point(i) for i in interior) for interior in x
+        )),
+        (b"layer", decode_persistent_id_str),
+        (b"net", decode_persistent_id_str),
+    ),
+    _fast_layout((b"layer", _ID), (b"net", _ID), (b"exterior", b"(" + _POINTS_NC + b")"), (b"interior", _RINGS)),
+    lambda ids, layer, net, exterior, interior: _Record(
+        exterior=_fast_points(exterior),
+        interior=tuple(_fast_points(ring) for ring in _RING_RE.findall(interior)),
+        layer=ids[layer], net=ids[net]),
+    lambda r: ((r.layer, r.net), (r.exterior,) + r.interior),
+    lambda v, rings: _Record(exterior=rings[0], interior=tuple(rings[1:]), layer=v[0], net=v[1])
+)
+
+NET_FORMAT = RecordFormat(
+    b"NET",
+    (
+        (b"unique_id", decode_persistent_id_str),
+        (b"name", lambda x: x.decode("utf8")),
+        (b"net_class", lambda x: x.decode("utf8")),
+    ),
+    _fast_layout((b"unique_id", _ID), (b"name", _STRING), (b"net_class", _STRING)),
+    lambda ids, unique_id, name, net_class: _Record(
+        unique_id=ids[unique_id], name=_fast_string(name).decode("utf8"),
+        net_class=_fast_string(net_class).decode("utf8"))
+)
+
+# Artwork files, in load order
+ARTWORK_FORMATS = (
+    ("vias.txt", VIA_FORMAT),
+    ("traces.txt", TRACE_FORMAT),
+    ("airwires.txt", AIRWIRE_FORMAT),
+    ("polygons.txt", POLYGON_FORMAT),
+)
+
+
+def pack_records(fmt: RecordFormat, records: Iterable[_Record]) -> RecordArrays:
+    assert fmt.pack is not None
+    values = []
+    ring_counts = []
+    ring_sizes = []
+    points: List[Tuple[int, int]] = []
+    for rec in records:
+        row, rings = fmt.pack(rec)
+        values.append(row)
+        ring_counts.append(len(rings))
+        for ring in rings:
+            ring_sizes.append(len(ring))
+            points.extend((p.x, p.y) for p in ring)
+
+    return RecordArrays(numpy.array(values, dtype=numpy.int64),
+                        numpy.array(ring_counts, dtype=numpy.int64),
+                        numpy.array(ring_sizes, dtype=numpy.int64),
+                        numpy.array(points, dtype=numpy.int64).reshape(len(points), 2))
+
+
+def unpack_records(fmt: RecordFormat, arrays: RecordArrays) -> Generator[_Record, None, None]:
+    """Records equal to those pack_records was given"""
+    assert fmt.unpack is not None
+    points = [Point2(x, y) for x, y in arrays.points.tolist()]
+    ring_sizes = arrays.ring_sizes.tolist()
+
+    ring_no = 0
+    start = 0
+    for row, ring_count in zip(arrays.values.tolist(), arrays.ring_counts.tolist()):
+        rings = []
+        for size in ring_sizes[ring_no:ring_no + ring_count]:
+            rings.append(tuple(points[start:start + size]))
+            start += size
+        ring_no += ring_count
+
+        yield fmt.unpack(row, rings)
+
+
+def _parse_record_file(data: bytes, filename: str, fmt_index: int, fast_parse: bool) -> RecordArrays:
+    """Worker entry point. Parse a whole artwork file into arrays"""
+    io = DirTextIO()
+    io.fast_parse = fast_parse
+    fmt = ARTWORK_FORMATS[fmt_index][1]
+    return pack_records(fmt, (rec for _, rec in io._read_records(BytesIO(data), filename, fmt)))
+
+
+def _read_image(path: str) -> Tuple[bytes, str]:
+    """Read an image file and its hex SHA-256. Hashing releases the GIL, so this runs well on a thread pool"""
+    with open(path, "rb") as fd:
+        data = fd.read()
+    return data, binascii.b2a_hex(hashlib.sha256(data).digest()).decode("ascii")
+
+
+class _HashingWriter:
+    """Write-only file wrapper that hashes everything written through it"""
+
+    def __init__(self, fd: BinaryIO) -> None:
+        self.fd = fd
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: Union[bytes, memoryview]) -> int:
+        self.hasher.update(data)
+        self.size += len(data)
+        return self.fd.write(data)
+
+
 class DirTextIO:
     dir_path: os.PathLike[str]
     project: 'pcbre.model.project.Project'
     file_hashes: Dict[Tuple[str, ...], bytes]
+    file_stats: Dict[Tuple[str, ...], Tuple[int, int]]
+    stored_checksum: 'Optional[StoredChecksum]'
+    verify_touched_only: bool
     nets_ref: 'Dict[PersistentID, pcbre.model.net.Net]'
     layers_ref: 'Dict[PersistentID, pcbre.model.stackup.Layer]'
     viapairs_ref: 'Dict[PersistentID, pcbre.model.stackup.ViaPair]'
     keypoints_ref: 'Dict[PersistentID, pcbre.model.imagelayer.KeyPoint]'
     imagelayers_ref: 'Dict[PersistentID, pcbre.model.imagelayer.ImageLayer]'
+    artwork_jobs: 'Dict[str, Future[RecordArrays]]'
+
+    # Match lines in the layout the writer produces directly, instead of through the general tokenizer
+    fast_parse = True
 
     def _object_line_iter(self, fd: BinaryIO) -> Generator[Tuple[int, bytes, bytes], None, None]:
         for line_no, line in enumerate(fd.readlines(), start=1):
@@ -247,16 +515,13 @@ class DirTextIO:
             fd.write(b"SERIALIZATION_VERSION %d\n" % SERIALIZATION_VERSION)
 
 
-    def __unpack_partial(self, filename: str, line_no: int, defn: Tuple[Tuple[bytes, Callable[[Any], Any]], ...], params: Dict[bytes, Any]) -> Tuple[Dict, Any]:
-        class _Record:
-            pass
-
+    def __unpack_partial(self, filename: str, line_no: int, defn: ParseDef, params: Dict[bytes, Any]) -> Tuple[Dict, Any]:
         r = _Record()
         for ent_name, cons in defn:
             setattr(r, ent_name.decode('utf8'), cons(params.pop(ent_name)))
         return params, r
 
-    def __unpack_exact(self, filename: str, line_no: int, defn: Tuple[Tuple[bytes, Callable[[Any], Any]], ...], params: Dict[bytes, Any]) -> Any:
+    def __unpack_exact(self, filename: str, line_no: int, defn: ParseDef, params: Dict[bytes, Any]) -> Any:
         remain, r = self.__unpack_partial(filename, line_no, defn, params)
 
         if len(remain):
@@ -264,6 +529,22 @@ class DirTextIO:
 
         return r
 
+    def _read_records(self, fd: BinaryIO, filename: str, fmt: RecordFormat) -> Generator[Tuple[int, Any], None, None]:
+        """Parse each line of a file of fmt.noun records"""
+        ids = _PersistentIDCache()
+        fast_match = fmt.fast_re.fullmatch if self.fast_parse else None
+
+        for line_no, noun, remainder in self._object_line_iter(fd):
+            if noun != fmt.noun:
+                raise ParseError("Unknown noun %s on line %d of %s" % (noun, line_no, filename))
+
+            m = fast_match(remainder) if fast_match is not None else None
+            if m is not None:
+                yield line_no, fmt.fast_build(ids, *m.groups())
+            else:
+                params = parse_line_dict(remainder, line_no)
+                yield line_no, self.__unpack_exact(filename, line_no, fmt.defn, params)
+
 
     def __load_stackup(self) -> None:
         from pcbre.model.project import Layer, ViaPair
@@ -282,7 +563,7 @@ class DirTextIO:
         to_do_layers : List[Tuple[int, Layer]] = []
         viapairs = []
 
-        with self.__open_read_subfile(("stackup.txt" ,)) as fd:
+        with self.__open_read_subfile_hashed(("stackup.txt",)) as fd:
             for line_no, noun, line in self._object_line_iter(fd):
                 params = parse_line_dict(line, line_no)
                 if noun == b"LAYER":
@@ -344,7 +625,7 @@ class DirTextIO:
                 ))
 
 
-    def __load_imagery(self) -> None:
+    def __load_imagery(self, executor: Optional[Executor] = None) -> None:
         from pcbre.model.imagelayer import ImageLayer, KeyPointAlignment, RectAlignment, KeyPoint
 
         keypoint_def = (
@@ -429,14 +710,19 @@ class DirTextIO:
             self.project.imagery._keypoints.append(kp_o)
             self.keypoints_ref[uid] = kp_o
 
+        # Image files are read, and hashed for the tile store, on the pool if there is one
+        image_paths = [os.path.join(self.dir_path, "imagery", "img_%s" % image_r.hash) for _, image_r, _ in images]
+        if executor is not None:
+            image_files: Iterable[Tuple[bytes, str]] = executor.map(_read_image, image_paths)
+        else:
+            image_files = map(_read_image, image_paths)
+
         # Alignments
-        for uid, image_r, ext_r in images:
+        for (uid, image_r, ext_r), (data, digest) in zip(images, image_files):
             flat_arr = numpy.asarray(image_r.transform, dtype=numpy.float64)
             transform = numpy.reshape(flat_arr, (3, 3))
-            with self.__open_read_subfile(("imagery", "img_%s" % image_r.hash)) as binfd:
-                data = binfd.read()
 
-            il = ImageLayer(self.project, uid, image_r.name, data, transform)
+            il = ImageLayer(self.project, uid, image_r.name, data, transform, content_hash=digest)
 
             if image_r.alignment_mode == "keypoint":
                 alignment = KeyPointAlignment()
@@ -467,13 +753,14 @@ class DirTextIO:
                 ))
 
             for image in self.project.imagery.imagelayers:
-                content_hash = hashlib.sha256()
-                content_hash.update(image.data)
-                img_digest = binascii.b2a_hex(content_hash.digest()).decode("ascii")
+                img_digest = image.content_hash
                 img_filename = "img_%s" % img_digest
 
-                with self.__open_write_subfile(("imagery", img_filename)) as img_fd:
-                    img_fd.write(image.data)
+                # Files are named by content, so one that exists at the right size is already this image
+                img_path = os.path.join(self.dir_path, "imagery", img_filename)
+                if not (os.path.isfile(img_path) and os.path.getsize(img_path) == len(image.data)):
+                    with self.__open_write_subfile(("imagery", img_filename)) as img_fd:
+                        img_fd.write(image.data)
 
                 if isinstance(image.alignment, RectAlignment):
                     align: 'RectAlignment' = image.alignment
@@ -520,24 +807,16 @@ class DirTextIO:
 
     def __load_nets(self):
         from pcbre.model.net import Net
-        # TODO - prune unreferenced nets
         # TODO - generate unconnected nets
         all_nets = []
-        with self.__open_read_subfile(("nets.txt",)) as fd:
-            for line_no, noun, remainder in self._object_line_iter(fd):
-                if noun != b"NET":
-                    raise ParseError("Unknown object %s in nets.txt on line %d" % (noun, line_no))
-
-                params = parse_line_dict(remainder, line_no)
-                unique_id_str = decode_persistent_id_str(params.pop(b"unique_id"))
-                unique_id = self.project.unique_id_registry.decode_add_from_uint32(unique_id_str)
-                name = params.pop(b"name").decode("utf8")
+        with self.__open_read_subfile_hashed(("nets.txt",)) as fd:
+            for line_no, rec in self._read_records(fd, "nets.txt", NET_FORMAT):
+                unique_id = self.project.unique_id_registry.decode_add_from_uint32(rec.unique_id)
+                name = rec.name
                 if name == "":
                     name = None
-                net_class = params.pop(b"net_class").decode("utf8")
 
-                if params != {}:
-                    raise ParseError("Unknown keys %s on line %s of nets.txt" % (params.keys(), line_no))
+                net_class = rec.net_class
 
                 self.nets_ref[unique_id] = net = Net(unique_id, name, net_class)
                 net._project = self.project
@@ -547,7 +826,7 @@ class DirTextIO:
             self.project.nets._add_net(net)
 
     def __save_nets(self) -> None:
-        with self.__open_write_subfile(("nets.txt",)) as fd:
+        with self.__open_write_subfile_hashed(("nets.txt",)) as fd:
             for net in self.project.nets.nets:
                 if net._name is None:
                     name = ""
@@ -566,83 +845,57 @@ class DirTextIO:
     def __save_component_defs(self) -> None:
         pass
 
+    def __start_artwork_parse(self, executor: Executor) -> None:
+        """Read and hash the artwork files, and queue them for parsing on executor"""
+        for n, (name, fmt) in enumerate(ARTWORK_FORMATS):
+            with self.__open_read_subfile_hashed(("artwork", name)) as fd:
+                data = fd.read()
+            self.artwork_jobs[name] = executor.submit(_parse_record_file, data, "artwork/" + name, n,
+                                                      self.fast_parse)
+
+    def __artwork_records(self, name: str, fmt: RecordFormat) -> Generator[Any, None, None]:
+        job = self.artwork_jobs.get(name)
+        if job is not None:
+            yield from unpack_records(fmt, job.result())
+            return
+
+        with self.__open_read_subfile_hashed(("artwork", name)) as fd:
+            for line_no, rec in self._read_records(fd, "artwork/" + name, fmt):
+                yield rec
+
     def __load_artwork(self) -> None:
         from pcbre.model.artwork_geom import Via, Trace, Polygon, Airwire
-        via_def = (
-            (b"center", lambda x: Point2(int(x[0]), int(x[1]))),
-            (b"radius", lambda x: int(x)),
-            (b"viapair", decode_persistent_id_str),
-            (b"net", decode_persistent_id_str),
-        )
-        trace_def = (
-            (b"p0", lambda x: Point2(int(x[0]), int(x[1]))),
-            (b"p1", lambda x: Point2(int(x[0]), int(x[1]))),
-            (b"thickness", lambda x: int(x)),
-            (b"layer", decode_persistent_id_str),
-            (b"net", decode_persistent_id_str),
-        )
-        airwire_def = (
-            (b"p0", lambda x: (decode_persistent_id_str(x[0]), Point2(int(x[1][0]), int(x[1][1])))),
-            (b"p1", lambda x: (decode_persistent_id_str(x[0]), Point2(int(x[1][0]), int(x[1][1])))),
-            (b"net", decode_persistent_id_str),
-        )
 
-        polygon_def = (
-            (b"exterior", lambda x: tuple(Point2(int(i[0]), int(i[1])) for i in x)),
-            (b"interior", lambda x: tuple(
-                tuple(Point2(int(i[0]), int(i[1])) for i in interior) for interior in x
-            )),
-            (b"layer", decode_persistent_id_str),
-            (b"net", decode_persistent_id_str),
-        )
+        # Everything is collected first, then handed to the artwork in one bulk load
+        geoms: List[Any] = []
 
-        with self.__open_read_subfile(("artwork", "vias.txt")) as fd:
-            for line_no, noun, remainder in self._object_line_iter(fd):
-                if noun != b"VIA":
-                    raise ValueError("Unknown noun %s on line %d of artwork/vias.txt" % (noun, line_no))
-                params = parse_line_dict(remainder, line_no)
-                rec = self.__unpack_exact("artwork/vias.txt", line_no, via_def, params)
-                vp = self.viapairs_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.viapair)]
-                net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
-                v = Via(rec.center, vp, rec.radius, net)
-                self.project.artwork.add_artwork(v)
-
-        with self.__open_read_subfile(("artwork", "traces.txt")) as fd:
-            for line_no, noun, remainder in self._object_line_iter(fd):
-                if noun != b"TRACE":
-                    raise ValueError("Unknown noun %s on line %d of artwork/traces.txt" % (noun, line_no))
-                params = parse_line_dict(remainder, line_no)
-                rec = self.__unpack_exact("artwork/traces.txt", line_no, trace_def, params)
-                layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.layer)]
-                net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
-                v = Trace(rec.p0, rec.p1, rec.thickness, layer, net)
-                self.project.artwork.add_artwork(v)
-
-        with self.__open_read_subfile(("artwork", "airwires.txt")) as fd:
-            for line_no, noun, remainder in self._object_line_iter(fd):
-                if noun != b"AIRWIRE":
-                    raise ValueError("Unknown noun %s on line %d of artwork/airwires.txt" % (noun, line_no))
-                params = parse_line_dict(remainder, line_no)
-                rec = self.__unpack_exact("artwork/airwires.txt", line_no, airwire_def, params)
-
-                p0_layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.p0[0])]
-                p1_layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.p1[0])]
-                net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
-                v = Airwire(rec.p0[1], rec.p1[1], p0_layer, p1_layer, net)
-                self.project.artwork.add_artwork(v)
-
-        with self.__open_read_subfile(("artwork", "polygons.txt")) as fd:
-            for line_no, noun, remainder in self._object_line_iter(fd):
-                if noun != b"POLYGON":
-                    raise ValueError("Unknown noun %s on line %d of artwork/polygons.txt" % (noun, line_no))
-                params = parse_line_dict(remainder, line_no)
-                rec = self.__unpack_exact("artwork/polygons.txt", line_no, polygon_def, params)
+        for rec in self.__artwork_records("vias.txt", VIA_FORMAT):
+            vp = self.viapairs_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.viapair)]
+            net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
+            v = Via(rec.center, vp, rec.radius, net)
+            geoms.append(v)
+
+        for rec in self.__artwork_records("traces.txt", TRACE_FORMAT):
+            layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.layer)]
+            net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
+            v = Trace(rec.p0, rec.p1, rec.thickness, layer, net)
+            geoms.append(v)
+
+        for rec in self.__artwork_records("airwires.txt", AIRWIRE_FORMAT):
+            p0_layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.p0[0])]
+            p1_layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.p1[0])]
+            net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
+            v = Airwire(rec.p0[1], rec.p1[1], p0_layer, p1_layer, net)
+            geoms.append(v)
 
-                layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.layer)]
-                net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
+        for rec in self.__artwork_records("polygons.txt", POLYGON_FORMAT):
+            layer = self.layers_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.layer)]
+            net = self.nets_ref[self.project.unique_id_registry.decode_check_from_uint32(rec.net)]
 
-                v = Polygon(layer, rec.exterior, rec.interior, net)
-                self.project.artwork.add_artwork(v)
+            v = Polygon(layer, rec.exterior, rec.interior, net)
+            geoms.append(v)
+
+        self.project.artwork.bulk_load(geoms)
 
     def __save_artwork(self) -> None:
 
@@ -709,11 +962,10 @@ class DirTextIO:
                 ))
 
 
-    def __check_checksum(self) -> bool:
-        pass
-
-    def __write_checksum(self) -> None:
-        ordered_hashes = sorted(self.file_hashes.items(), key=lambda x: x[1])
+    def __combined_digest(self) -> bytes:
+        # Path breaks ties between files with the same content (eg: empty files), so the order doesn't depend on the
+        # order the files were written or read in
+        ordered_hashes = sorted(self.file_hashes.items(), key=lambda x: (x[1], x[0]))
 
         hash_string = b";".join(b"%b:%b" % (
             b"/".join(i.encode("utf8") for i in path_components),
@@ -722,10 +974,48 @@ class DirTextIO:
 
         hasher = hashlib.sha256()
         hasher.update(hash_string)
-        digest = hasher.digest()
+        return hasher.digest()
+
+    def __read_checksum(self) -> 'Optional[StoredChecksum]':
+        """
+        Read checksum.txt, if present. A checksum file that can't be parsed is treated as absent,
+        which forces a connectivity rebuild
+        """
+        if not os.path.exists(os.path.join(self.dir_path, "checksum.txt")):
+            return None
+
+        digest = None
+        files = {}
+        with self.__open_read_subfile(("checksum.txt",)) as fd:
+            for line_no, token, remainder in self._object_line_iter(fd):
+                try:
+                    if token == b"HASH:":
+                        digest = binascii.a2b_hex(remainder.strip())
+                    elif token == b"FILE:":
+                        path, file_digest, size, mtime_ns = remainder.split()
+                        files[tuple(path.decode("utf8").split("/"))] = StoredFileHash(
+                            binascii.a2b_hex(file_digest), int(size), int(mtime_ns))
+                except (ValueError, binascii.Error):
+                    return None
+
+        if digest is None:
+            return None
+
+        return StoredChecksum(digest, files)
+
+    def __check_checksum(self) -> bool:
+        """
+        Recompute the combined digest from the per-file hashes taken during load and compare with checksum.txt
+        """
+        if self.stored_checksum is None:
+            return False
+
+        return self.__combined_digest() == self.stored_checksum.digest
+
+    def __write_checksum(self) -> None:
+        digest = self.__combined_digest()
 
         with self.__open_write_subfile(("checksum.txt",)) as fd:
-            fd: typing.BinaryIO
             fd.write(b"# This checksum is used to validate that the file hasn't been edited/merged\n")
             fd.write(b"# which could invalidate electrical connnectivity. If you edit the files in\n")
             fd.write(b"# this repository outside of PCBRE, do not try to recompute this checksum. \n")
@@ -734,6 +1024,14 @@ class DirTextIO:
 
             fd.write(b"HASH: %s\n" % binascii.b2a_hex(digest))
 
+            # Per file hashes and stat, so a load can skip hashing files that haven't been touched since save
+            for path_components in sorted(self.file_hashes):
+                size, mtime_ns = self.file_stats[path_components]
+                fd.write(b"FILE: %b %b %d %d\n" % (
+                    "/".join(path_components).encode("utf8"),
+                    binascii.b2a_hex(self.file_hashes[path_components]),
+                    size, mtime_ns))
+
 
     def __convert_value(self, object_typestr, key_name, value):
         if isinstance(value, str):
@@ -777,7 +1075,7 @@ class DirTextIO:
                 object_typestr))
         return value_repr
 
-    def __write_record(self, fd: typing.BinaryIO, object_typestr: bytes, record: Iterable[Tuple[bytes, Any]]) -> None:
+    def __write_record(self, fd: '_HashingWriter', object_typestr: bytes, record: Iterable[Tuple[bytes, Any]]) -> None:
         key_strings = [object_typestr]
         for key_name, value in record:
             value_repr = self.__convert_value(object_typestr, key_name, value)
@@ -797,21 +1095,39 @@ class DirTextIO:
         with open(os.path.join(self.dir_path, *sub_path_components), "rb") as fd:
             yield fd
 
-
     @contextlib.contextmanager
-    def __open_write_subfile(self, sub_path_components: Tuple[str, ...]) -> \
+    def __open_read_subfile_hashed(self, sub_path_components: Tuple[str, ...]) -> \
             typing.Generator[typing.BinaryIO, None, None]:
+        """
+        Open a file for reading, and record its hash for the checksum check. In verify_touched_only mode, a file whose
+        size and modification time match checksum.txt isn't hashed, and the recorded hash is used instead
+        """
+        with self.__open_read_subfile(sub_path_components) as fd:
+            stored = None
+            if self.verify_touched_only and self.stored_checksum is not None:
+                stored = self.stored_checksum.files.get(sub_path_components)
+
+            if stored is not None:
+                st = os.fstat(fd.fileno())
+                if (st.st_size, st.st_mtime_ns) == (stored.size, stored.mtime_ns):
+                    self.file_hashes[sub_path_components] = stored.digest
+                    yield fd
+                    return
+
+            data = fd.read()
+
+        self.file_hashes[sub_path_components] = hashlib.sha256(data).digest()
+        yield BytesIO(data)
 
-        for i in range(len(sub_path_components)-1):
-            subdir_path = os.path.join(self.dir_path, *sub_path_components[:i + 1])
-            if not os.path.exists(subdir_path):
-                os.mkdir(subdir_path)
-        with open(os.path.join(self.dir_path, *sub_path_components), "wb") as fd:
-            yield fd
 
     @contextlib.contextmanager
-    def __open_write_subfile_hashed(self, sub_path_components: Tuple[str, ...]) -> \
-            typing.Generator[typing.BinaryIO, None, None]:
+    def __open_write_subfile(self, sub_path_components: Tuple[str, ...]) -> \
+            typing.Generator['_HashingWriter', None, None]:
+        """
+        Write a file through a temporary file, which is hashed as it is written and then renamed over the target.
+        If the content is identical to the existing file, the existing file is left untouched so its modification
+        time doesn't change
+        """
 
         for i in range(len(sub_path_components)-1):
             subdir_path = os.path.join(self.dir_path, *sub_path_components[:i + 1])
@@ -819,34 +1135,70 @@ class DirTextIO:
                 os.mkdir(subdir_path)
 
         path = os.path.join(self.dir_path, *sub_path_components)
-        with open(path, "wb") as fd:
-            yield fd
-            fd.flush()
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as fd:
+                writer = _HashingWriter(fd)
+                yield writer
+
+            if self.__existing_digest(sub_path_components, writer.size) == writer.hasher.digest():
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def __existing_digest(self, sub_path_components: Tuple[str, ...], size: int) -> Optional[bytes]:
+        """SHA-256 of the file currently at the path, or None if there is none of the given size"""
+        path = os.path.join(self.dir_path, *sub_path_components)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
 
-        with open(path, "rb") as fd:
-            fd.seek(0, os.SEEK_END)
-            file_size = fd.tell()
-            fd.seek(0, os.SEEK_SET)
+        if st.st_size != size:
+            return None
 
-            chunk_size = 4096
+        # Files recorded in checksum.txt, and untouched since, needn't be read again
+        if self.stored_checksum is not None:
+            stored = self.stored_checksum.files.get(sub_path_components)
+            if stored is not None and (stored.size, stored.mtime_ns) == (st.st_size, st.st_mtime_ns):
+                return stored.digest
 
-            hasher = hashlib.sha256()
-            for i in range(0, file_size, chunk_size):
-                read_size = chunk_size
-                if file_size - i < chunk_size:
-                    read_size = file_size - i
+        hasher = hashlib.sha256()
+        with open(path, "rb") as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b""):
+                hasher.update(chunk)
+        return hasher.digest()
 
-                data = fd.read(read_size)
-                if len(data) != read_size:
-                    raise IOError("Read came in short")
+    @contextlib.contextmanager
+    def __open_write_subfile_hashed(self, sub_path_components: Tuple[str, ...]) -> \
+            typing.Generator['_HashingWriter', None, None]:
+
+        with self.__open_write_subfile(sub_path_components) as fd:
+            yield fd
 
-                hasher.update(data)
+        self.file_hashes[sub_path_components] = fd.hasher.digest()
 
-        self.file_hashes[sub_path_components] = hasher.digest()
+        st = os.stat(os.path.join(self.dir_path, *sub_path_components))
+        self.file_stats[sub_path_components] = (st.st_size, st.st_mtime_ns)
 
 
     @staticmethod
-    def open_path(dir_path: str) -> 'pcbre.model.project.Project':
+    def open_path(dir_path: str, verify_touched_only: bool = False,
+                  workers: Optional[int] = None) -> 'pcbre.model.project.Project':
+        """
+        Load a directory format project. If the hashes of the files that determine connectivity (stackup, nets and
+        artwork) match checksum.txt, the stored net assignments are used as is, and only unused nets are pruned.
+        Otherwise connectivity is rebuilt
+
+        :param verify_touched_only: only hash files whose size or modification time differ from those recorded at
+                                    save. Faster, but won't notice an edit that preserves both
+        :param workers: if more than one, parse the artwork files in a process pool, and read image files on a
+                        thread pool, while the rest of the project loads. None or 1 loads everything serially
+        """
         import pcbre.model.project
 
         if not os.path.isdir(dir_path):
@@ -861,17 +1213,39 @@ class DirTextIO:
         io.keypoints_ref = {}
         io.imagelayers_ref = {}
         io.images_ref = {}
+        io.file_hashes = {}
+        io.artwork_jobs = {}
+        io.verify_touched_only = verify_touched_only
+        io.stored_checksum = io.__read_checksum()
 
         io.__load_metadata()
-        io.__load_stackup()
-        io.__load_imagery()
-        io.__load_nets()
-        io.__load_component_defs()
-        io.__load_artwork()
+
+        with contextlib.ExitStack() as stack:
+            image_executor = None
+            if workers is not None and workers > 1:
+                # Spawned rather than forked, so this is safe to call from the GUI process
+                executor = ProcessPoolExecutor(max_workers=min(workers, len(ARTWORK_FORMATS)),
+                                               mp_context=multiprocessing.get_context("spawn"))
+                stack.callback(executor.shutdown, wait=True, cancel_futures=True)
+                io.__start_artwork_parse(executor)
+
+                image_executor = ThreadPoolExecutor(max_workers=workers)
+                stack.callback(image_executor.shutdown, wait=True, cancel_futures=True)
+
+            io.__load_stackup()
+            io.__load_imagery(image_executor)
+            io.__load_nets()
+            io.__load_component_defs()
+            io.__load_artwork()
+
         checksum_ok = io.__check_checksum()
 
         if not checksum_ok:
             io.project.artwork.rebuild_connectivity()
+        else:
+            # As the rebuild would, drop nets that no geometry is on
+            artwork = io.project.artwork
+            io.project.nets.remove_nets([net for net in io.project.nets.nets if not artwork.get_geom_for_net(net)])
 
         return io.project
 
@@ -897,8 +1271,10 @@ class DirTextIO:
         io.project = project
 
         io.file_hashes = {}
+        io.file_stats = {}
 
         io.dir_path = dir_path
+        io.stored_checksum = io.__read_checksum()
         io.__save_metadata()
         io.__save_stackup()
         io.__save_imagery()
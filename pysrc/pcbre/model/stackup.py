@@ -33,6 +33,11 @@ class Layer:
     def order(self) -> int:
         return self.project.stackup._order_for_layer(self)
 
+    @property
+    def mask(self) -> int:
+        """Bit for this layer, for comparison against ViaPair.layer_mask"""
+        return self.project.stackup._layer_mask(self)
+
     @property
     def side(self) -> SIDE:
         return SIDE.Bottom if self.order > 0 else SIDE.Top
@@ -54,25 +59,30 @@ class ViaPair:
     def unique_id(self) -> PersistentID:
         return self.__unique_id
 
+    @property
+    def _end_layers(self) -> Tuple[Layer, Layer]:
+        return self.__layers
+
     @property
     def layers(self) -> Sequence[Layer]:
-        return tuple(sorted(self.__layers, key=lambda x: x.order))
+        return self.project.stackup._via_span(self)[0]
 
     @layers.setter
     def layers(self, val: Sequence[Layer]) -> None:
         if len(val) != 2:
             raise ValueError
         self.__layers = (val[0], val[1])
+        self.project.stackup.changed.emit()
 
     @property
     def all_layers(self) -> Sequence[Layer]:
-        out = []
-        _first_layer, _second_layer = self.layers
-        for layer in self.project.stackup.layers:
-            if _first_layer.order <= layer.order <= _second_layer.order:
-                out.append(layer)
+        """All layers the via pair passes through, in stackup order. Use layer_mask for membership tests"""
+        return list(self.project.stackup._via_span(self)[1])
 
-        return sorted(out, key=lambda x: x.order)
+    @property
+    def layer_mask(self) -> int:
+        """Bitmask of all_layers. A layer is spanned if layer.mask & layer_mask is nonzero"""
+        return self.project.stackup._via_span(self)[2]
 
     def __repr__(self) -> str:
         return "<ViaPair Top:%s Bot:%s>" % (self.layers[0], self.layers[1])
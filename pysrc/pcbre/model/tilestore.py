@@ -0,0 +1,156 @@
+"""On-disk cache of decoded image pyramid levels.
+
+Decoding a large scan takes seconds, and happens again every time a project is opened. A TileStore keeps decoded
+pyramid levels in a per-user cache directory, keyed by the SHA-256 of the compressed image, so later opens memory-map
+them instead.
+
+Each level is one .npy file in tile-major layout, shape (rows, cols, tile_size, tile_size, channels), with edge
+tiles zero padded. A tile is then one contiguous block of the file, and only the pages of tiles actually drawn are
+read. The directory of an image is touched whenever it is used, and the least recently used images are deleted
+once the store grows past its size limit."""
+
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import numpy
+import numpy.lib.format
+
+from pcbre.util import user_cache_dir
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+__author__ = 'davidc'
+
+# Default size limit of the store
+DEFAULT_STORE_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def tiled_shape(shape: Tuple[int, ...], tile_size: int) -> Tuple[int, ...]:
+    """Shape of the tile-major layout of an image of the given shape"""
+    h, w = shape[:2]
+    return (-(-h // tile_size), -(-w // tile_size), tile_size, tile_size) + tuple(shape[2:])
+
+
+class TileStore:
+    # Bumped when the on-disk layout changes. Entries from other versions are ignored
+    VERSION = 1
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_STORE_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.__dir = os.path.join(root, "v%d" % self.VERSION)
+
+    def __entry(self, key: str) -> str:
+        return os.path.join(self.__dir, key)
+
+    def __path(self, key: str, level: int, tile_size: int, shape: Tuple[int, ...]) -> str:
+        # The padded layout doesn't record the exact level size, so it goes in the name
+        return os.path.join(self.__entry(key), "L%d_%d_%dx%d.npy" % (level, tile_size, shape[1], shape[0]))
+
+    def load(self, key: str, level: int, tile_size: int, shape: Tuple[int, ...]) \
+            -> 'Optional[npt.NDArray[numpy.uint8]]':
+        """
+        Memory-map a stored level, or None if it isn't stored
+
+        :param shape: (height, width) of the level image. A stored level that doesn't match is ignored
+        """
+        try:
+            tiles = numpy.load(self.__path(key, level, tile_size, shape), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        if tiles.shape[:4] != tiled_shape(shape[:2], tile_size) or tiles.dtype != numpy.uint8:
+            return None
+
+        self.__touch(key)
+        return tiles
+
+    def save(self, key: str, level: int, tile_size: int, image: 'npt.NDArray[numpy.uint8]') -> None:
+        """
+        Store a level image. The file is written under a temporary name and renamed into place, so concurrent
+        readers never see a partial file. Failures to write are ignored, the store is only a cache
+        """
+        entry = self.__entry(key)
+        try:
+            os.makedirs(entry, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry, suffix=".tmp")
+            os.close(fd)
+        except OSError:
+            return
+
+        try:
+            tiles = numpy.lib.format.open_memmap(tmp_path, mode="w+", dtype=numpy.uint8,
+                                                 shape=tiled_shape(image.shape, tile_size))
+            for ty in range(tiles.shape[0]):
+                for tx in range(tiles.shape[1]):
+                    block = image[ty * tile_size:(ty + 1) * tile_size, tx * tile_size:(tx + 1) * tile_size]
+                    tiles[ty, tx, :block.shape[0], :block.shape[1]] = block
+            tiles.flush()
+            del tiles
+
+            os.replace(tmp_path, self.__path(key, level, tile_size, image.shape))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self.collect(keep=key)
+
+    def __touch(self, key: str) -> None:
+        try:
+            os.utime(self.__entry(key))
+        except OSError:
+            pass
+
+    def __entries(self) -> List[Tuple[float, int, str]]:
+        """(last used, size in bytes, key) of each stored image"""
+        entries = []
+        try:
+            keys = os.listdir(self.__dir)
+        except OSError:
+            return []
+
+        for key in keys:
+            entry = self.__entry(key)
+            try:
+                mtime = os.stat(entry).st_mtime
+                size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            except OSError:
+                continue
+            entries.append((mtime, size, key))
+
+        return entries
+
+    def nbytes(self) -> int:
+        return sum(size for _, size, _ in self.__entries())
+
+    def collect(self, keep: Optional[str] = None) -> None:
+        """Delete the least recently used images until the store is within max_bytes"""
+        entries = sorted(self.__entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+
+            if key == keep:
+                continue
+
+            shutil.rmtree(self.__entry(key), ignore_errors=True)
+            total -= size
+
+
+_default_store: Optional[TileStore] = None
+
+
+def default_tile_store() -> TileStore:
+    """Tile store in the user cache directory, shared by all image layers"""
+    global _default_store
+    if _default_store is None:
+        _default_store = TileStore(user_cache_dir("tiles"))
+    return _default_store
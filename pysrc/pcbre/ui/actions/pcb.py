@@ -1,3 +1,4 @@
+import os
 import time
 
 from pcbre.ui.dialogs.layerviewsetup import LayerViewSetupDialog
@@ -35,7 +36,7 @@ class RebuildConnectivityAction(QtWidgets.QAction):
         self.__pd : Optional[QtWidgets.QProgressDialog]= None
 
         try:
-            self.__window.project.artwork.rebuild_connectivity(progress_cb=self.__progress)
+            self.__window.project.artwork.rebuild_connectivity(progress_cb=self.__progress, workers=os.cpu_count())
         except RebuildConnectivityAction.CancelException:
             pass
 
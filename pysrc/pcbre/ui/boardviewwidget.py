@@ -10,14 +10,15 @@ from qtpy import QtOpenGL, QtCore, QtWidgets, QtGui
 
 import pcbre.matrix as M
 from pcbre.matrix import scale, translate, Point2, project_point, Vec2
-from pcbre.model.artwork_geom import Trace, Geom
+from pcbre.model.artwork_geom import Trace, Geom, Via, Polygon, Airwire
+from pcbre.model.component import Component
 from pcbre.model.const import SIDE
 from pcbre.model.stackup import Layer, ViaPair
 from pcbre.ui.gl.glshared import GLShared
 from pcbre.ui.tool_action import MoveEvent, ToolActionEvent, EventID, Modifier
 from pcbre.util import Timer
 from pcbre.view.cachedpolygonrenderer import PolygonRenderer
-from pcbre.view.cad_cache import CADCache, StackupRenderCommands, SelectionHighlightCache
+from pcbre.view.cad_cache import CADCache, SelectionHighlightCache
 from pcbre.view.debugrender import DebugRender
 from pcbre.view.hairlinerenderer import HairlineRenderer
 from pcbre.view.imageview import ImageView
@@ -419,7 +420,6 @@ class BoardViewWidget(BaseViewWidget):
 
         self.debug_renderer = DebugRender(self)
 
-        self.render_commands = StackupRenderCommands()
         self.__cad_cache = CADCache(self.project)
         self.__sel_cache = SelectionHighlightCache(self.project)
 
@@ -593,49 +593,62 @@ class BoardViewWidget(BaseViewWidget):
     def layer_visible_m(self, l: Layer) -> bool:
         return self.boardViewState.current_layer in l
 
-    def query_point(self, pt: Point2) -> Optional[Geom]:
-        # todo: don't use this function anywhere, or introduce some picking heuristic
-        all_aw = self.query_point_multiple(pt)
-        if not all_aw:
-            return None
+    def is_visible(self, aw: Any) -> bool:
+        """
+        Single-object form of getVisible(), used to filter point query results
+        without enumerating all visible artwork
+        """
+        if self.boardViewState.render_mode == MODE_CAD and not self.boardViewState.show_trace_mode_geom:
+            return False
 
-        # Return an arbitrary element
-        return all_aw.pop()
+        if isinstance(aw, Via):
+            return self.vp_is_visible(aw.viapair)
 
-    def query_point_multiple(self, pt: Point2) -> Sequence[Geom]:
-        all_aw = set(self.project.artwork.query_point_multiple(pt))
+        elif isinstance(aw, (Trace, Polygon)):
+            return self.layer_visible(aw.layer)
 
-        l_vis_aw = self.getVisible()
-        if l_vis_aw is None:
-            return
+        # TODO: Airwires are always visible
+        elif isinstance(aw, Airwire):
+            return True
+
+        if self.boardViewState.render_mode == MODE_CAD:
+            return True
+        elif self.boardViewState.current_layer is None:
+            return False
+
+        cur_side = self.current_side()
+        if isinstance(aw, Component):
+            return aw.side == cur_side
+
+        # Pads
+        return aw.is_through() or aw.side == cur_side
+
+    def query_point(self, pt: Point2) -> Optional[Geom]:
+        # Artwork results are in pick-priority order, return the first visible one
+        for aw in self.project.artwork.query_point_multiple(pt):
+            if self.is_visible(aw):
+                return aw
 
-        vis_aw = set(self.getVisible())
-        return vis_aw.intersection(all_aw)
+        return None
+
+    def query_point_multiple(self, pt: Point2) -> Set[Geom]:
+        return set(aw for aw in self.project.artwork.query_point_multiple(pt) if self.is_visible(aw))
 
     def __render_top_half(self) -> None:
         """
         :return:
         """
 
-        # Forcibly init all layers
-        for l in self.project.stackup.layers:
-            self.render_commands.layers[l]
-
-        for v in self.project.stackup.via_pairs:
-            self.render_commands.vias[v]
-
-        self.render_commands.clear()
-
-        # Update CAD cache
+        # Update CAD cache. Its arrays persist between frames, and are only uploaded again when they change
         self.__cad_cache.update_if_necessary()
-        self.__cad_cache.extendTo(self.render_commands)
+        render_commands = self.__cad_cache.commands
 
         # Update Selection cache
         self.__sel_cache.update_if_necessary(self.selectionList)
 
         # Render all artwork that renders to an individual layer
         # Component pads are rendered into either traces or polygons
-        for k, v in self.render_commands.layers.items():
+        for k, v in render_commands.layers.items():
             GL.glPushDebugGroup(GL.GL_DEBUG_SOURCE_APPLICATION, 0, -1, "Layer %r" % k)
             with self.compositor.get(k):
                 self.trace_renderer.render_va(v.va_traces, self.viewState.glMatrix, COL_LAYER_MAIN)
@@ -646,7 +659,7 @@ class BoardViewWidget(BaseViewWidget):
                 # TODO: Render Text
 
         # Render all viapairs into via layers
-        for k, v in self.render_commands.vias.items():
+        for k, v in render_commands.vias.items():
             GL.glPushDebugGroup(GL.GL_DEBUG_SOURCE_APPLICATION, 0, -1, "ViaPair %r" % k)
             with self.compositor.get(k):
                 self.via_renderer.render_filled(self.viewState.glMatrix, v.va_vias)
@@ -655,12 +668,12 @@ class BoardViewWidget(BaseViewWidget):
         # Render multilayer components onto the MULTI layer
         GL.glPushDebugGroup(GL.GL_DEBUG_SOURCE_APPLICATION, 0, -1, "Multi Cmp")
         with self.compositor.get("MULTI"):
-            self.via_renderer.render_filled(self.viewState.glMatrix, self.render_commands.multi.va_vias)
+            self.via_renderer.render_filled(self.viewState.glMatrix, render_commands.multi.va_vias)
             # TODO: Render text
         GL.glPopDebugGroup()
 
         # Draw the front and back sides to the side art
-        for k, v in self.render_commands.sides.items():
+        for k, v in render_commands.sides.items():
             GL.glPushDebugGroup(GL.GL_DEBUG_SOURCE_APPLICATION, 0, -1, "Cmp %r" % k)
             with self.compositor.get(("LINEART", k)):
                 self.hairline_renderer.render_va(self.viewState.glMatrix, v.va_outlines, COL_CMP_LINE)
@@ -760,8 +773,15 @@ class BoardViewWidget(BaseViewWidget):
             images = list(stackup_layer.imagelayers)
             i = self.boardViewState.per_layer_permute[self.boardViewState.current_layer] % len(images)
             images_cycled = images[i:] + images[:i]
+            pending = False
             for l in images_cycled:
-                self.image_view_cache_load(l).render(self.viewState.glMatrix)
+                iv = self.image_view_cache_load(l)
+                iv.render(self.viewState.glMatrix)
+                pending |= iv.pending
+
+            # Redraw once the finer imagery has been decoded
+            if pending:
+                QtCore.QTimer.singleShot(50, self.update)
 
         if not self.boardViewState.show_trace_mode_geom:
             return
@@ -182,13 +182,20 @@ class AlignmentViewWidget(BaseViewWidget):
         # Render the base image
         if self.model.view_mode == ViewMode.UnAligned:
             self.iv.render(self.viewState.glMatrix)
+            pending = self.iv.pending
         else:
             # Draw all visible layers bottom to top
             all_ils = list(reversed(self.get_flattened()))
 
+            pending = False
             for il in all_ils:
                 iv = self.get_imageview(il)
                 iv.render(self.viewState.glMatrix)
+                pending |= iv.pending
+
+        # Redraw once the finer imagery has been decoded
+        if pending:
+            QtCore.QTimer.singleShot(50, self.update)
 
         for ovl in self.active_overlays:
             ovl.render(self.viewState)
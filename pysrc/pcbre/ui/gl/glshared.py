@@ -4,10 +4,14 @@ from pcbre.ui.gl.textatlas import SDFTextAtlas
 import OpenGL.GL as GL  # type: ignore
 __author__ = 'davidc'
 
+import os
+
 import pkg_resources
 
 
-sans_serif_atlas = SDFTextAtlas(pkg_resources.resource_filename('pcbre.resources', 'Vera.ttf'))
+# Only generated when the atlas isn't cached yet. The workers are spawned, not forked from the GUI process
+sans_serif_atlas = SDFTextAtlas(pkg_resources.resource_filename('pcbre.resources', 'Vera.ttf'),
+                                workers=os.cpu_count() or 1)
 
 
 class GLShared(object):
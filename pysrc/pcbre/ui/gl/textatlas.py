@@ -2,87 +2,111 @@ __author__ = 'davidc'
 
 from collections import namedtuple, defaultdict
 from pcbre.algo.skyline import SkyLine
+from pcbre.util import user_cache_dir
 import scipy.ndimage.morphology  # type: ignore
 import scipy.ndimage.interpolation  # type: ignore
 import freetype  # type: ignore
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+import glob
+import hashlib
 import numpy
-import qtpy
-from qtpy import QtCore, QtGui
-from pcbre.ui.misc import QImage_from_numpy
 import json
-
-# TODO - OS-specific caching
-SHADER_JSON_PATH = "/tmp/pcbre_shader.json"
-SHADER_PNG_PATH = "/tmp/pcbre_shader.png"
+import multiprocessing
+import os
+import tempfile
 
 BASE_FONT = 32.
 # Constant used to determine how large to expand bitmaps
 PRESCALE = 4
 
+# Bumped whenever the glyph generation changes, so that cached atlases made by older code aren't used
+ATLAS_CACHE_VERSION = 3
+
 
 # Use compiled C implementation of EDTAA3
 # At some point, we'll want to rewrite this to do glyph-curve-distance based rendering
 # but that point isn't now.
 from pcbre.accel.edtaa3 import edtaa3, compute_gradient, c_double_p, c_short_p
 
-from typing import Dict, Optional, Tuple, Any, TYPE_CHECKING
+from typing import Dict, List, Optional, Tuple, Any, TYPE_CHECKING
 
 if TYPE_CHECKING:
     import numpy.typing as npt
 
-def saveCached(image: 'npt.NDArray[numpy.uint8]', atlas: Dict[str, 'AtlasEntry']) -> None:
-    img = QImage_from_numpy(image)
-    # TODO - make this better
-    img.save(SHADER_PNG_PATH, "PNG")
-
-    ser = dict()
-    for k, v in list(atlas.items()):
-        d = {
-            "sx": v.sx,
-            "sy": v.sy,
-            "tx": v.tx,
-            "ty": v.ty,
-            "w":  v.w,
-            "h":  v.h,
-            "l": v.l,
-            "t": v.t,
-            "hb": v.hb,
-            }
-        ser[k] = d
-    json.dump(ser, open(SHADER_JSON_PATH, "w"))
-
-def loadCached() -> Optional[Tuple[Dict[str, 'AtlasEntry'], 'npt.NDArray[numpy.uint8]']]:
-    # don't bother
-    return None
-    try:
-        # TODO, rework to use app cache directory
-        img = QtGui.QImage()
-        if img.load(SHADER_PNG_PATH):
-            newimg = img.convertToFormat(QtGui.QImage.Format.Format_ARGB32)
+_ATLAS_FIELDS = ("w", "h", "sx", "sy", "tx", "ty", "l", "t", "hb")
+
+
+def atlasCachePath(fontname: str, margin: int, dim: int) -> str:
+    """
+    Path of the cached atlas for a font. Keyed by the font file contents and everything else that changes the
+    generated glyphs, so a stale entry is never found rather than needing to be detected
+    """
+    h = hashlib.sha256()
+    with open(fontname, "rb") as fd:
+        h.update(fd.read())
+    h.update(json.dumps([ATLAS_CACHE_VERSION, BASE_FONT, PRESCALE, margin, dim]).encode())
+
+    return user_cache_dir("glyphs", "sdf-%s.npz" % h.hexdigest())
+
 
-            shape = newimg.height(), newimg.width()
-            ptr = newimg.constBits()
+def saveCached(path: str, image: 'npt.NDArray[numpy.uint8]', atlas: Dict[str, 'AtlasEntry'],
+               batches: List[str]) -> None:
+    """
+    Store an atlas image and its metrics in one file. Written under a temporary name and renamed into place, so a
+    concurrent reader never sees a partial file. Other atlases in the directory are deleted, as their keys come
+    from older code or fonts and settings no longer in use. Failures are ignored, this is only a cache
 
-            # PySide2 and PyQt represent a void pointer slightly differently
-            if qtpy.PYQT4 or qtpy.PYQT5:
-                import ctypes
-                ptr = ctypes.cast(ptr.__int__(), ctypes.POINTER(ctypes.c_uint8))
+    :param batches: the glyphs in the groups they were packed in, so the packing can be repeated on load
+    """
+    ser = {
+        "glyphs": {k: [getattr(v, f) for f in _ATLAS_FIELDS] for k, v in atlas.items()},
+        "batches": batches,
+    }
+    metrics = numpy.frombuffer(json.dumps(ser).encode("utf8"), dtype=numpy.uint8)
 
-            # Extract the first channel
-            data = numpy.ctypeslib.as_array(ptr, (newimg.height(), newimg.width(), 4))[:,:,0].copy()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    except OSError:
+        return
 
-            st = json.load(open(SHADER_JSON_PATH,"r"))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            numpy.savez_compressed(f, image=image, metrics=metrics)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return
+
+    for stale in glob.glob(os.path.join(os.path.dirname(path), "sdf-*.npz")):
+        if os.path.basename(stale) != os.path.basename(path):
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+
+
+def loadCached(path: str, dim: int) \
+        -> Optional[Tuple[Dict[str, 'AtlasEntry'], 'npt.NDArray[numpy.uint8]', List[str]]]:
+    """Atlas, image and packing batches stored by saveCached, or None if there is no usable one"""
+    try:
+        with numpy.load(path, allow_pickle=False) as f:
+            image = f["image"]
+            st = json.loads(f["metrics"].tobytes().decode("utf8"))
 
-            atlas = {}
-            for k, v in list(st.items()):
-                atlas[k] = AtlasEntry(v['w'], v['h'], v['sx'], v['sy'], v['tx'], v['ty'], v['l'], v['t'], v['hb'])
+        if image.shape != (dim, dim) or image.dtype != numpy.uint8:
+            return None
 
-            return atlas, data
+        atlas = {k: AtlasEntry(*v) for k, v in st["glyphs"].items()}
+        batches = [str(b) for b in st["batches"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
-    except IOError:
-        pass
+    return atlas, image, batches
 
-    return None
 
 def distance_transform_bitmap(input: Any, margin: int) -> 'npt.NDArray[numpy.uint8]':
     # Calculate the size of the surface we're drawing on
@@ -177,6 +201,10 @@ def distance_transform_bitmap(input: Any, margin: int) -> 'npt.NDArray[numpy.uin
     return rv
 
 class AtlasEntry:
+    # Set on the stand-ins returned while a glyph is generated in the background. Their texture rect is the empty
+    # corner of the atlas, so they draw nothing
+    placeholder = False
+
     def __init__(self, w: int, h: int, 
             sx: float, sy: float, tx: float, ty: float,
             l: int, t: int, hb: int):
@@ -215,11 +243,42 @@ class AtlasEntry:
         self.tx = x1/fw
         self.ty = y1/fw
 
+# Faces opened by _renderGlyphs, by font file. Each worker process opens its own
+_faces: Dict[str, Any] = {}
+
+
+def _renderGlyphs(fontname: str, chars: str, margin: int) -> List[Tuple[str, AtlasEntry, 'npt.NDArray[numpy.uint8]']]:
+    """
+    Rasterize and distance transform glyphs, without placing them. Run in worker processes, so only takes and returns
+    picklable values
+
+    :return: (char, entry, bitmap) for each char, entries not yet given a texture position
+    """
+    face = _faces.get(fontname)
+    if face is None:
+        face = _faces[fontname] = freetype.Face(fontname)
+        face.set_char_size(height=PRESCALE * int(BASE_FONT) * 64)
+
+    glyphs = []
+    for char in chars:
+        face.load_char(char)
+        ae = AtlasEntry.fromGlyph(face.glyph)
+        glyphs.append((char, ae, distance_transform_bitmap(face.glyph.bitmap, margin)))
+
+    return glyphs
+
+
 class SDFTextAtlas:
     atlas: Dict[str, AtlasEntry]
     image: 'npt.NDArray[numpy.uint8]'
 
-    def __init__(self, fontname: str) -> None:
+    def __init__(self, fontname: str, workers: int = 1) -> None:
+        """
+        :param workers: processes used to generate the initial glyphs. They are spawned rather than forked, so this is
+                        safe from a GUI process. With more than one, glyphs requested later are generated on a
+                        background thread; with 1 everything is generated serially, as it's asked for
+        """
+        self.fontname = fontname
         self.face = freetype.Face(fontname)
 
         height_base = int(BASE_FONT)
@@ -228,61 +287,115 @@ class SDFTextAtlas:
         dim = 1024
         self.margin = 3
 
+        self.workers = workers
+        self.__executor: Optional[ProcessPoolExecutor] = None
+
+        # Single thread for glyphs asked for after startup. Stopped whenever nothing is pending
+        self.__glyph_thread: Optional[ThreadPoolExecutor] = None
+
+        # Glyphs being generated in the background, and what's drawn for them in the meantime
+        self.__pending: Dict[str, Tuple['Future[List[Any]]', AtlasEntry]] = {}
+
+        # Glyphs in the groups they were packed in
+        self.__batches: List[str] = []
+
+        # Bumped each time glyphs are placed, so text laid out with placeholders knows to lay itself out again
+        self.generation = 0
+
         self.packer = SkyLine(dim, dim)
 
-        load_results = loadCached()
+        cache_path = atlasCachePath(fontname, self.margin, dim)
+        load_results = loadCached(cache_path, dim)
 
-        if load_results is not None:
-            self.atlas, self.image = load_results
+        if load_results is not None and self.__replayPacking(load_results[0], load_results[2]):
+            self.atlas, self.image, self.__batches = load_results
         else:
+            self.packer = SkyLine(dim, dim)
             self.atlas = {}
             self.image = numpy.zeros((dim, dim), dtype=numpy.uint8)
+            self.__batches = []
 
         old_set = frozenset(list(self.atlas.keys()))
 
         import string
         chars = string.digits + string.ascii_letters + string.punctuation + ' '
 
-        #self.addGlyphs(string.digits + string.letters + string.punctuation)
-
-        for i in chars:
-            self.getGlyph(i)
+        self.addGlyphs(chars)
 
         new_set = frozenset(list(self.atlas.keys()))
         if old_set != new_set:
-            saveCached(self.image, self.atlas)
+            saveCached(cache_path, self.image, self.atlas, self.__batches)
 
+        # Later glyphs are rare, don't keep the workers around for them
+        self.close()
 
-    def addGlyphs(self, multi: str) -> None:
-        """
-        Add multiple glyphs at a time, packing by best-packing-score first
-        Execution time is poor, and gains don't seem to be worth increased execution time
-        The packer algorithm could almost certainly made smarter (specifically, the "find" algo)
+    def close(self) -> None:
+        """Stop the worker processes and the glyph thread. They are started again if more glyphs are needed"""
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True, cancel_futures=True)
+            self.__executor = None
 
-        :param multi:
-        :return:
-        """
-        # Tuples of (char, ae, bitmap)
-
-        glyphs = []
-
-        # Pre-build the bitmap info
-        for char in multi:
-            self.face.load_char(char)
-            #bitmap = self.face.glyph.bitmap
-            #w,h = bitmap.width, bitmap.rows
-            #bl, bt = self.face.glyph.metrics.horiBearingX/64.0, self.face.glyph.metrics.horiBearingY/64.0
-            #bm = numpy.array(bitmap.buffer, dtype=numpy.ubyte).reshape(h,w)
-            #ha = self.face.glyph.metrics.horiAdvance/64.0
+        if self.__glyph_thread is not None:
+            self.__glyph_thread.shutdown(wait=True, cancel_futures=True)
+            self.__glyph_thread = None
 
-            ae = AtlasEntry.fromGlyph(self.face.glyph)
-            #bm = numpy.array(self.face.glyph.bitmap.buffer, dtype=numpy.ubyte).reshape(ae.h, ae.w)
-            w, h = self.face.glyph.bitmap.width, self.face.glyph.bitmap.rows
-            bm = distance_transform_bitmap(self.face.glyph.bitmap, self.margin)
+        # Keep what finished. Cancelled glyphs are asked for again by getGlyph
+        self.poll()
 
-            #print char, bl, bt, self.face.glyph.metrics.horiBearingX/64.0, self.face.glyph.metrics.horiBearingY/64.0, ha/64.0, w
-            #glyphs.append((char, w, h, bl, bt, ha, bm))
-            glyphs.append((char, ae, bm))
+    def __replayPacking(self, atlas: Dict[str, AtlasEntry], batches: List[str]) -> bool:
+        """
+        Pack the rects of a cached atlas again, in the groups they were packed in, so glyphs added later don't overlap
+        them. The packer is deterministic, so each should land where it was stored; if not the cache is not usable
+        """
+        if sorted("".join(batches)) != sorted(atlas):
+            return False
+
+        for batch in batches:
+            try:
+                positions = self.packer.pack_multiple(
+                    [(atlas[c].w + 2 * self.margin, atlas[c].h + 2 * self.margin) for c in batch])
+            except ValueError:
+                # Nothing fits
+                return False
+
+            for c, pos in zip(batch, positions):
+                if pos != (round(atlas[c].sx * self.packer.width), round(atlas[c].sy * self.packer.height)):
+                    return False
+
+        return True
+
+    def __getExecutor(self) -> ProcessPoolExecutor:
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+        return self.__executor
+
+    def __getGlyphThread(self) -> Executor:
+        if self.__glyph_thread is None:
+            self.__glyph_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sdf-glyph")
+        return self.__glyph_thread
+
+    def __render(self, chars: str) -> List[Tuple[str, AtlasEntry, 'npt.NDArray[numpy.uint8]']]:
+        """Generate glyphs, spread over the worker processes. Results are in the order of chars"""
+        if self.workers <= 1 or len(chars) <= 1:
+            return _renderGlyphs(self.fontname, chars, self.margin)
+
+        # Interleaved, so the wide glyphs that sort together are spread out
+        n = min(self.workers, len(chars))
+        executor = self.__getExecutor()
+        futures = [executor.submit(_renderGlyphs, self.fontname, chars[i::n], self.margin) for i in range(n)]
+
+        by_char = {}
+        for f in futures:
+            for glyph in f.result():
+                by_char[glyph[0]] = glyph
+
+        return [by_char[c] for c in chars]
+
+    def __place(self, glyphs: List[Tuple[str, AtlasEntry, 'npt.NDArray[numpy.uint8]']]) -> None:
+        """Pack generated glyphs into the atlas, best-packing-score first"""
+        if not glyphs:
+            return
 
         # Submit a list of rects to pack to the packer
         packlist = [(x[1].w + 2 * self.margin, x[1].h + 2 * self.margin) for x in glyphs]
@@ -296,38 +409,72 @@ class SDFTextAtlas:
             self.atlas[char] = ae
             self.image[y0:y1, x0:x1] = bm
 
-    def addGlyph(self, char: str) -> None:
-        self.face.load_char(char)
-
-        bitmap = self.face.glyph.bitmap
-
-        w,h = bitmap.width, bitmap.rows
+        self.__batches.append("".join(g[0] for g in glyphs))
+        self.generation += 1
 
+    def addGlyphs(self, multi: str) -> None:
+        """
+        Add multiple glyphs at a time. The glyphs are generated in parallel, then packed together once all are done
 
-        ae = AtlasEntry.fromGlyph(self.face.glyph)
+        :param multi:
+        :return:
+        """
+        chars = "".join(dict.fromkeys(c for c in multi if c not in self.atlas))
+        self.__place(self.__render(chars))
 
-        pos = self.packer.pack(ae.w + 2 * self.margin, ae.h + 2 * self.margin)
-        if pos is not None:
+    def addGlyph(self, char: str) -> None:
+        self.addGlyphs(char)
 
-            x0, y0 = pos
-            x1, y1 = x0 + ae.w, y0 + ae.h
-            x1 += 2 * self.margin
-            y1 += 2 * self.margin
+    def poll(self) -> bool:
+        """
+        Add any glyphs finished in the background to the atlas. The glyph thread is stopped once none are pending
 
-            self.image[y0:y1, x0:x1] = distance_transform_bitmap(bitmap, self.margin)
+        :return: whether any were added
+        """
+        done = [c for c, (f, _) in self.__pending.items() if f.done()]
 
+        glyphs = []
+        for c in done:
+            f, _ = self.__pending.pop(c)
+            if not f.cancelled():
+                glyphs.extend(f.result())
 
-            ae.updatePos(self.packer.width, self.packer.height, x0 , y0, x1, y1)
+        if not self.__pending and self.__glyph_thread is not None:
+            self.__glyph_thread.shutdown(wait=False)
+            self.__glyph_thread = None
 
-            self.atlas[char] = ae
+        self.__place(glyphs)
+        return bool(glyphs)
 
+    @property
+    def pending(self) -> bool:
+        """Whether glyphs are still being generated in the background"""
+        return bool(self.__pending)
 
     def getGlyph(self, char: str) -> AtlasEntry:
+        """
+        Atlas entry of a glyph. A glyph not yet in the atlas is generated on the glyph thread when there is more than
+        one worker, and a placeholder with the glyph's metrics but no visible texture is returned until it is ready
+        """
         v = self.atlas.get(char)
         if v is not None:
             return v
 
-        self.addGlyph(char)
+        if self.workers <= 1:
+            self.addGlyph(char)
+            return self.atlas[char]
+
+        if char not in self.__pending:
+            self.poll()
+            v = self.atlas.get(char)
+            if v is not None:
+                return v
+
+            self.face.load_char(char)
+            placeholder = AtlasEntry.fromGlyph(self.face.glyph)
+            placeholder.placeholder = True
 
-        return self.atlas[char]
+            f = self.__getGlyphThread().submit(_renderGlyphs, self.fontname, char, self.margin)
+            self.__pending[char] = f, placeholder
 
+        return self.__pending[char][1]
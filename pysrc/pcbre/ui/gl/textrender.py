@@ -277,9 +277,13 @@ class TextRender:
 
         left, right, top, bottom = 0.0, 0.0, 0.0, 0.0
 
+        # Strings drawn with placeholders for glyphs still being generated aren't kept
+        complete = True
+
         for ch in text:
             # Fetch the glyph from the atlas
             gp = self.sdf_atlas.getGlyph(ch)
+            complete = complete and not gp.placeholder
 
             # width and height of the rendered quad is proportional to the glpyh size
             margin = self.sdf_atlas.margin
@@ -317,11 +321,15 @@ class TextRender:
 
         cm = _StringMetrics(va, (left, right, bottom, top))
 
-        self.__cached_metrics[text] = cm
+        if complete:
+            self.__cached_metrics[text] = cm
         return cm
 
 
     def updateTexture(self) -> None:
+        # Pick up glyphs generated in the background
+        self.sdf_atlas.poll()
+
         # Don't update the texture if its up-to-date
         if len(self.sdf_atlas.atlas) == self.last_glyph_count:
             return
@@ -240,7 +240,7 @@ def main() -> None:
     else:
         filepath = args.project
         if os.path.exists(args.project):
-            p, storage_type = P.Project.open_detect(args.project)
+            p, storage_type = P.Project.open_detect(args.project, workers=os.cpu_count())
         elif args.create_if_not_exists:
             p = P.Project.create()
             storage_type = P.StorageType.Packed
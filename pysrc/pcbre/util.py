@@ -1,4 +1,5 @@
 from typing import TYPE_CHECKING, Optional, Any
+import os
 import time
 
 if TYPE_CHECKING:
@@ -33,3 +34,19 @@ class Timer:
     def __exit__(self, *args: Any) -> None:
         self.end = time.time()
         self.interval = self.end - self.start
+
+
+def user_cache_dir(*components: str) -> str:
+    """
+    Path of a subdirectory of the per-user PCBRE cache directory. Not created. The PCBRE_CACHE_DIR environment
+    variable overrides the platform default
+    """
+    root = os.environ.get("PCBRE_CACHE_DIR")
+    if not root:
+        if os.name == "nt":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "pcbre")
+
+    return os.path.join(root, *components)
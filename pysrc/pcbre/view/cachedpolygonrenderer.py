@@ -1,94 +1,146 @@
+import weakref
 from collections import defaultdict
 from OpenGL import GL  # type: ignore
 from OpenGL.arrays.vbo import VBO  # type: ignore
 from pcbre.ui.gl import VAO, VBOBind, glimports as GLI
 import ctypes
 import numpy
+import shapely  # type: ignore
 from pcbre.matrix import Point2
 from pcbre.view.rendersettings import RENDER_STANDARD, RENDER_OUTLINES, RENDER_SELECTED, RENDER_HINT_NORMAL
 from pcbre.view.util import get_consolidated_draws
 
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, AbstractSet, Dict, List, NamedTuple, Optional, Tuple
 
 if TYPE_CHECKING:
+    from pcbre.model.artwork_geom import Polygon
     from pcbre.ui.boardviewwidget import BoardViewWidget
     from pcbre.ui.gl.glshared import GLShared
 
 __author__ = 'davidc'
 
+class PolygonArrays(NamedTuple):
+    # float32 (n, 2) vertex positions, each distinct point once
+    vertices: 'numpy.ndarray'
+
+    # uint32 triangle indices, followed by the outline line strips separated by RESTART_INDEX
+    indices: 'numpy.ndarray'
+
+    # Number of indices that are triangles
+    tri_count: int
+
+
+def _triangulate(polygons: 'List[Polygon]') -> 'List[numpy.ndarray]':
+    """(n, 3, 2) triangle corners of each polygon"""
+    if not hasattr(shapely, "constrained_delaunay_triangles"):
+        # Shapely < 2.1, fall back to the polygons' own triangulation
+        return [numpy.array([[(p.x, p.y) for p in (t.a, t.b, t.c)] for t in poly.get_tris_repr()],
+                            dtype=numpy.float64).reshape(-1, 3, 2)
+                for poly in polygons]
+
+    # One GEOS call for the whole batch
+    collections = shapely.constrained_delaunay_triangles(
+        numpy.array([poly.get_poly_repr() for poly in polygons], dtype=object))
+    tris, owner = shapely.get_parts(collections, return_index=True)
+    corners = shapely.get_coordinates(tris).reshape(-1, 4, 2)[:, :3]
+
+    splits = numpy.searchsorted(owner, numpy.arange(1, len(polygons)))
+    return numpy.split(corners, splits)
+
+
+def _outline(polygon: 'Polygon') -> 'Tuple[numpy.ndarray, List[int]]':
+    """Points of each closed ring of a polygon, and the length of each ring"""
+    poly_repr = polygon.get_poly_repr()
+    rings = [numpy.asarray(edge.coords) for edge in [poly_repr.exterior] + list(poly_repr.interiors)]
+    return numpy.concatenate(rings).reshape(-1, 2), [len(r) for r in rings]
+
+
 class PolygonLayerCache:
-    """Per-layer VA that stores polygon geometry"""
+    """
+    Polygon geometry of a layer, as the vertex and index arrays PolygonRenderer draws. The arrays are built on
+    first use after a change, see arrays(), and version tells renderers when to upload them again
+    """
 
     # Sentinel value for the Index used to indicate a new primitive
     RESTART_INDEX = 2 ** 32 - 1
 
     def __init__(self) -> None:
-        # Ordered sequence of polygon points
-        self.__position_list : List[Point2] = []
+        # Polygon -> (triangles, outline points, ring lengths), and polygons added since the last build. Pending is
+        # a dict for its order, so the arrays come out the same each time
+        self.__parts: 'Dict[Polygon, Tuple[numpy.ndarray, numpy.ndarray, List[int]]]' = {}
+        self.__pending: 'Dict[Polygon, None]' = {}
 
-        # Lookup (point->index) for deduping points
-        self.__position_lookup : dict[Point2, int] = {}
+        self.__arrays: Optional[PolygonArrays] = None
 
-        # Mapping from polygon -> tuple (start, count) for drawing a polygon's triangles
-        # or outlines
-        self.__tri_draw_ranges = {}
-        self.__outline_draw_ranges = {}
-
-        self.__tri_index_list = []
-        self.__outline_index_list = []
+        # Bumped on each change
+        self.version = 0
 
     @property
-    def position_list(self):
-        return self.__position_list
+    def polygons(self) -> 'AbstractSet[Polygon]':
+        return self.__parts.keys() | self.__pending.keys()
 
-    @property
-    def tri_index_list(self):
-        return self.__tri_index_list
+    def add(self, polygon) -> None:
+        self.__pending[polygon] = None
+        self.__changed()
 
-    @property
-    def outline_index_list(self):
-        return self.__outline_index_list
-
-    def __get_position_index(self, point: Point2) -> int:
-        """
-        Get the index in the point VBO for a given Point2 coordinate
-        :type point: pcbre.matrix.Point2
-        :param point:
-        :return:
-        """
-        norm_pos = point.to_int_tuple()
+    def remove(self, polygon) -> None:
+        if polygon in self.__pending:
+            del self.__pending[polygon]
+        else:
+            del self.__parts[polygon]
+        self.__changed()
 
-        try:
-            return self.__position_lookup[norm_pos]
-        except KeyError:
-            self.__position_lookup[norm_pos] = len(self.__position_list)
-            self.__position_list.append(norm_pos)
+    def __changed(self) -> None:
+        self.__arrays = None
+        self.version += 1
 
-        return self.__position_lookup[norm_pos]
+    def arrays(self) -> PolygonArrays:
+        if self.__arrays is None:
+            self.__arrays = self.__build()
+        return self.__arrays
 
-    def add(self, polygon):
-        tris = polygon.get_tris_repr()
-        tri_index_first = len(self.__tri_index_list)
+    def __build(self) -> PolygonArrays:
+        if self.__pending:
+            pending = list(self.__pending)
+            for poly, tris in zip(pending, _triangulate(pending)):
+                self.__parts[poly] = (tris,) + _outline(poly)
+            self.__pending.clear()
 
-        for t in tris:
-            for p in t.a, t.b, t.c:
-                self.__tri_index_list.append(self.__get_position_index(Point2(p.x, p.y)))
+        parts = list(self.__parts.values())
+        if not parts:
+            return PolygonArrays(numpy.zeros((0, 2), dtype=numpy.float32), numpy.zeros(0, dtype=numpy.uint32), 0)
 
-        tr = (tri_index_first, len(self.__tri_index_list))
-        self.__tri_draw_ranges[polygon] = tr
+        tri_points = numpy.concatenate([p[0] for p in parts]).reshape(-1, 2)
+        outline_points = numpy.concatenate([p[1] for p in parts])
+        ring_lengths = numpy.array([n for p in parts for n in p[2]], dtype=numpy.intp)
 
-        outline_index_first = len(self.__outline_index_list)
-        poly_repr = polygon.get_poly_repr()
-        for edge in [poly_repr.exterior] + list(poly_repr.interiors):
-            for pt in edge.coords:
-                self.__outline_index_list.append(self.__get_position_index(Point2(pt[0], pt[1])))
-            self.__outline_index_list.append(self.RESTART_INDEX)
+        # Each distinct point is stored once
+        vertices, inverse = numpy.unique(numpy.concatenate([tri_points, outline_points]), axis=0,
+                                         return_inverse=True)
+        inverse = inverse.reshape(-1).astype(numpy.uint32)
 
-        lr = (outline_index_first, len(self.__outline_index_list))
-        self.__outline_draw_ranges[polygon] = lr
+        # Ring i's points are shifted along by i, leaving a restart index after each ring
+        outline = numpy.full(len(outline_points) + len(ring_lengths), self.RESTART_INDEX, dtype=numpy.uint32)
+        shift = numpy.repeat(numpy.arange(len(ring_lengths)), ring_lengths)
+        outline[numpy.arange(len(outline_points)) + shift] = inverse[len(tri_points):]
 
+        return PolygonArrays(vertices.astype(numpy.float32),
+                             numpy.concatenate([inverse[:len(tri_points)], outline]),
+                             len(tri_points))
+
+
+class _ResidentPolygons:
+    """GPU copy of a PolygonLayerCache"""
+
+    def __init__(self, vert_dtype: 'numpy.dtype') -> None:
+        self.vert_vbo = VBO(numpy.zeros((0,), dtype=vert_dtype), GL.GL_DYNAMIC_DRAW)
+        self.index_vbo = VBO(numpy.zeros((0,), dtype=numpy.uint32), GL.GL_DYNAMIC_DRAW, GL.GL_ELEMENT_ARRAY_BUFFER)
+        GL.glObjectLabel(GL.GL_BUFFER, int(self.index_vbo), -1, "Polygon Index VBO")
+
+        self.version: Optional[int] = None
+        self.tri_count = 0
+        self.outline_count = 0
 
-        return tr, lr
 
 class PolygonRenderer:
     def __init__(self, view):
@@ -99,67 +151,73 @@ class PolygonRenderer:
 
         # Lookup for vertex positions
         self.__vert_vbo_dtype = numpy.dtype([("vertex", numpy.float32, 2)])
-        self.__vert_vbo = VBO(numpy.zeros((0,), dtype=self.__vert_vbo_dtype),
-                              GL.GL_DYNAMIC_DRAW)
-
-        self.__index_vbo_dtype = numpy.uint32
-        self.__index_vbo = VBO(numpy.zeros((0,), dtype=self.__index_vbo_dtype), GL.GL_DYNAMIC_DRAW, GL.GL_ELEMENT_ARRAY_BUFFER)
-        GL.glObjectLabel(GL.GL_BUFFER, int(self.__index_vbo), -1, "Polygon Index VBO")
 
         self.__shader = self.__gls.shader_cache.get("basic_fill_vert", "basic_fill_frag")
+        self.__vertex_bind = VBOBind(self.__shader.program, self.__vert_vbo_dtype, "vertex")
 
-        with self.__vao, self.__vert_vbo:
-            VBOBind(self.__shader.program, self.__vert_vbo_dtype, "vertex").assign()
-            self.__index_vbo.bind()
+        # Buffers of each cache drawn, uploaded again only when the cache version changes
+        self.__resident: 'weakref.WeakKeyDictionary[PolygonLayerCache, _ResidentPolygons]' = \
+            weakref.WeakKeyDictionary()
+        self.uploads = 0
 
-        self.__data_to_render = False
+        self.__current: Optional[_ResidentPolygons] = None
+        self.__restart_index = PolygonLayerCache.RESTART_INDEX
 
     def render_prepare(self, cache):
-        self.__data_to_render = False
+        self.__current = None
 
-        if len(cache.position_list) == 0:
-            return
+        try:
+            resident = self.__resident[cache]
+        except KeyError:
+            resident = self.__resident[cache] = _ResidentPolygons(self.__vert_vbo_dtype)
 
-        if len(cache.tri_index_list) == 0:
-            return
+        if resident.version != cache.version:
+            arrays = cache.arrays()
 
-        # Update VBOs
-        ar = numpy.zeros(len(cache.position_list), dtype=self.__vert_vbo_dtype)
-        ar["vertex"] = cache.position_list
-        self.__vert_vbo.set_array(ar)
+            ar = numpy.zeros(len(arrays.vertices), dtype=self.__vert_vbo_dtype)
+            ar["vertex"] = arrays.vertices
+            resident.vert_vbo.set_array(ar)
+            resident.index_vbo.set_array(arrays.indices)
 
-        self.__tri_count = self.__outline_index_offset = len(cache.tri_index_list)
-        self.__outline_count = len(cache.outline_index_list)
+            resident.tri_count = arrays.tri_count
+            resident.outline_count = len(arrays.indices) - arrays.tri_count
+            resident.version = cache.version
+            self.uploads += 1
 
-        data = numpy.array(cache.tri_index_list + cache.outline_index_list, dtype=self.__index_vbo_dtype)
-        self.__index_vbo.set_array(data)
+        if resident.tri_count == 0:
+            return
 
-        self.__data_to_render = True
-        self.__restart_index = cache.RESTART_INDEX
+        self.__current = resident
 
     def render_solid(self, matrix, col):
-        if not self.__data_to_render:
+        resident = self.__current
+        if resident is None:
             return
 
-        with self.__shader.program, self.__vao, self.__index_vbo, self.__vert_vbo:
+        # Binding the buffers with the VAO bound points it at this cache
+        with self.__shader.program, self.__vao, resident.index_vbo, resident.vert_vbo:
+            self.__vertex_bind.assign()
+
             # Draw the polygons
             GL.glUniformMatrix3fv(self.__shader.uniforms.mat, 1, True, matrix.astype(numpy.float32))
             GL.glUniform4ui(self.__shader.uniforms.layer_info, 255, col, 0, 0)
-            GL.glDrawElements(GL.GL_TRIANGLES, self.__tri_count, GL.GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            GL.glDrawElements(GL.GL_TRIANGLES, resident.tri_count, GL.GL_UNSIGNED_INT, ctypes.c_void_p(0))
 
     def render_outline(self, matrix, col):
-        if not self.__data_to_render:
+        resident = self.__current
+        if resident is None:
             return
 
-        with self.__shader.program, self.__vao, self.__index_vbo, self.__vert_vbo:
+        # Binding the buffers with the VAO bound points it at this cache
+        with self.__shader.program, self.__vao, resident.index_vbo, resident.vert_vbo:
+            self.__vertex_bind.assign()
+
             GL.glEnable(GL.GL_PRIMITIVE_RESTART)
             GL.glPrimitiveRestartIndex(self.__restart_index)
             GL.glDrawElements(
                 GL.GL_LINE_STRIP,
-                self.__outline_count,
+                resident.outline_count,
                 GL.GL_UNSIGNED_INT,
-                ctypes.c_void_p((self.__outline_index_offset) * 4))
+                ctypes.c_void_p(resident.tri_count * 4))
             
             GL.glDisable(GL.GL_PRIMITIVE_RESTART)
-
-
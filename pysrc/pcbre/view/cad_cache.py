@@ -1,5 +1,7 @@
+import itertools
 from collections import defaultdict
-from pcbre.accel.vert_array import VA_xy, VA_via, VA_tex, VA_thickline
+from pcbre.accel.vert_array import VA, VA_xy, VA_via, VA_tex, VA_thickline
+from pcbre.model.artwork import ArtworkListener
 from pcbre.model.artwork_geom import Trace, Via, Polygon
 from pcbre.model.component import Component
 from pcbre.model.const import SIDE
@@ -8,7 +10,7 @@ from pcbre.model.pad import Pad
 from pcbre.view.componentview import cmp_border_va
 from pcbre.view.cachedpolygonrenderer import PolygonLayerCache
 
-from typing import TYPE_CHECKING, List, Optional, Any, Set
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any, Sequence, Set, Tuple
 if TYPE_CHECKING:
     from pcbre.model.project import Project
     from pcbre.model.stackup import Layer, ViaPair
@@ -94,7 +96,155 @@ class StackupRenderCommands:
         self.multi.extend(other.multi)
 
 
-class CADCache:
+class VASlotMap:
+    """
+    Tracks which records of a VA belong to which object, so that single objects can be added and removed without
+    rebuilding the array.
+
+    Objects are appended. A removed single record object (trace, via) has its place taken by the last record if that
+    is one too. Anything else is zeroed, leaving degenerate records that draw nothing, and the array is compacted once
+    these outnumber the live records. Each change bumps the version of the array, see VA.version
+    """
+
+    # Arrays with fewer dead records than this are never compacted
+    COMPACT_MIN = 1024
+
+    def __init__(self, va: 'VA') -> None:
+        self.va = va
+
+        # object -> (first record, record count)
+        self.__slots: Dict[Any, Tuple[int, int]] = {}
+
+        # Owning object of each record, None for zeroed records
+        self.__owners: List[Any] = []
+        self.__dead = 0
+
+        self.__version = 0
+        self.__touch()
+
+    def __len__(self) -> int:
+        return len(self.__slots)
+
+    @property
+    def dead(self) -> int:
+        """Number of zeroed records"""
+        return self.__dead
+
+    def __touch(self) -> None:
+        self.__version += 1
+        self.va.version = self.__version
+
+    def add(self, key: Any, emit: Callable[..., None], *args: Any) -> None:
+        """Append the records emit(va, *args) writes, owned by key"""
+        assert key not in self.__slots
+
+        first = self.va.count()
+        emit(self.va, *args)
+        n = self.va.count() - first
+
+        self.__slots[key] = (first, n)
+        self.__owners.extend(itertools.repeat(key, n))
+        self.__touch()
+
+    def add_rows(self, keys: Sequence[Any], emit: Callable[..., None], rows: Any) -> None:
+        """
+        Append the records emit(va, rows) writes for many objects at once. Each row must write the same number of
+        records, which are owned by the key of that row
+        """
+        if not len(keys):
+            return
+
+        first = self.va.count()
+        emit(self.va, rows)
+        n = (self.va.count() - first) // len(keys)
+
+        for i, key in enumerate(keys):
+            assert key not in self.__slots
+            self.__slots[key] = (first + i * n, n)
+            self.__owners.extend(itertools.repeat(key, n))
+        self.__touch()
+
+    def remove(self, key: Any) -> None:
+        first, n = self.__slots.pop(key)
+        self.__touch()
+
+        if n == 0:
+            return
+
+        end = first + n
+        count = len(self.__owners)
+        last = count - 1
+        stride = self.va.stride
+        buf = self.va.buffer()
+
+        if end == count:
+            self.__truncate(first)
+
+        elif n == 1 and self.__slots.get(self.__owners[last]) == (last, 1):
+            moved = self.__owners[last]
+            buf[first * stride:end * stride] = buf[last * stride:count * stride]
+            self.__owners[first] = moved
+            self.__slots[moved] = (first, 1)
+            self.__truncate(last)
+
+        else:
+            buf[first * stride:end * stride] = bytes(n * stride)
+            self.__owners[first:end] = itertools.repeat(None, n)
+            self.__dead += n
+
+            if self.__dead >= self.COMPACT_MIN and self.__dead > count - self.__dead:
+                self.compact()
+
+    def __truncate(self, n: int) -> None:
+        del self.__owners[n:]
+
+        # Zeroed records that are now at the end can go too
+        while self.__owners and self.__owners[-1] is None:
+            self.__owners.pop()
+            self.__dead -= 1
+
+        self.va.clear()
+        if self.__owners:
+            self.va.seek(len(self.__owners))
+
+    def compact(self) -> None:
+        """Close up the gaps left by zeroed records"""
+        stride = self.va.stride
+        buf = self.va.buffer()
+        data = bytes(buf)
+
+        pos = 0
+        owners: List[Any] = []
+        for key, (first, n) in sorted(self.__slots.items(), key=lambda i: i[1][0]):
+            buf[pos * stride:(pos + n) * stride] = data[first * stride:(first + n) * stride]
+            self.__slots[key] = (pos, n)
+            owners.extend(itertools.repeat(key, n))
+            pos += n
+
+        self.__owners = owners
+        self.__dead = 0
+        self.__truncate(pos)
+        self.__touch()
+
+    def clear(self) -> None:
+        self.__slots.clear()
+        self.__owners.clear()
+        self.__dead = 0
+        self.va.clear()
+        self.__touch()
+
+
+def _add_th_pads(va: VA_via, pads: List[Pad]) -> None:
+    for pad in pads:
+        va.add_th_pad(pad)
+
+
+def _add_pad_traces(va: VA_thickline, pads: List[Pad]) -> None:
+    for pad in pads:
+        va.add_trace(pad.trace_repr)
+
+
+class CADCache(ArtworkListener):
     def __init__(self, project: 'Project') -> None:
         """
         :type project: pcbre.model.project.Project
@@ -103,81 +253,145 @@ class CADCache:
         """
         self.__project = project
 
-        self.__traces_cache = StackupRenderCommands()
-        self.__vias_cache = StackupRenderCommands()
-        self.__cmp_cache = StackupRenderCommands()
+        # Arrays of all traces, vias and components, drawn each frame. Patched as objects are added and removed
+        self.__commands = StackupRenderCommands()
+        self.__slot_maps: Dict[VA, VASlotMap] = {}
+
+        # Slot maps holding each object's records
+        self.__placed: Dict[Any, Tuple[VASlotMap, ...]] = {}
+
+        # Bumped whenever any of the arrays change
+        self.version = 0
+        self.__changed = True
 
-        # Map of polygon layer -> cached triangulation lists
+        # Map of polygon layer -> cached vertex and index arrays
         self.__polygon_cache = defaultdict(PolygonLayerCache)
 
-        self.__trace_generation : 'Optional[int]' = None
-        self.__vias_generation : 'Optional[int]' = None
-        self.__cmp_generation : 'Optional[int]' = None
         self.__airwires_generation : 'Optional[int]' = None
-        self.__polygon_generation: 'Optional[int]' = None
 
         self.airwire_va = VA_xy(1024)
 
+        for side in self.__commands.sides.values():
+            self.__slots(side.va_outlines)
+        self.__slots(self.__commands.multi.va_vias)
+
+        artwork = project.artwork
+        self.artwork_added([*artwork.traces, *artwork.vias, *artwork.polygons, *artwork.components])
+        artwork.add_listener(self)
+
+    @property
+    def commands(self) -> StackupRenderCommands:
+        """Render arrays of all traces, vias and components. Persistent, and each array is versioned"""
+        return self.__commands
+
     def polygon_cache_for_layer(self, ly):
         return self.__polygon_cache[ly]
 
-    def update_if_necessary(self) -> None:
-
-        # Update traces as necessary
-        if self.__trace_generation != self.__project.artwork.traces_generation:
+    def __slots(self, va: VA) -> VASlotMap:
+        try:
+            return self.__slot_maps[va]
+        except KeyError:
+            sm = self.__slot_maps[va] = VASlotMap(va)
+            return sm
 
-            self.__trace_generation = self.__project.artwork.traces_generation
-            self.__traces_cache.clear()
-            for t in self.__project.artwork.traces:
-                self.__traces_cache.layers[t.layer].va_traces.add_trace(t)
+    def artwork_added(self, objs: 'Sequence[Any]') -> None:
+        commands = self.__commands
 
-        if self.__vias_generation != self.__project.artwork.vias_generation:
-            self.__vias_generation = self.__project.artwork.vias_generation
+        # Traces and vias are appended an array at a time
+        traces: Dict[VA, List[Trace]] = defaultdict(list)
+        vias: Dict[VA, List[Via]] = defaultdict(list)
 
-            self.__vias_cache.clear()
-            for v in self.__project.artwork.vias:
-                self.__vias_cache.vias[v.viapair].va_vias.add_via(v)
+        for obj in objs:
+            if isinstance(obj, Trace):
+                traces[commands.layers[obj.layer].va_traces].append(obj)
 
-        if self.__cmp_generation != self.__project.artwork.components_generation:
-            self.__cmp_generation = self.__project.artwork.components_generation
+            elif isinstance(obj, Via):
+                vias[commands.vias[obj.viapair].va_vias].append(obj)
 
-            self.__cmp_cache.clear()
+            elif isinstance(obj, Polygon):
+                self.__polygon_cache[obj.layer].add(obj)
 
-            for cmp in self.__project.artwork.components:
-                cmp_border_va(self.__cmp_cache.sides[cmp.side].va_outlines, cmp)
+            elif isinstance(obj, Component):
+                sm = self.__slots(commands.sides[obj.side].va_outlines)
+                sm.add(obj, cmp_border_va, obj)
+                placed = [sm]
 
-                for pad in cmp.get_pads():
+                th_pads = []
+                smd_pads: Dict['Layer', List[Pad]] = defaultdict(list)
+                for pad in obj.get_pads():
                     if pad.is_through():
-                        self.__cmp_cache.multi.va_vias.add_th_pad(pad)
+                        th_pads.append(pad)
                         # TODO, add text
                     else:
-                        self.__cmp_cache.layers[self.__project.stackup.layer_for_side(pad.side)].va_traces.add_trace(pad.trace_repr)
+                        smd_pads[self.__project.stackup.layer_for_side(pad.side)].append(pad)
+
+                if th_pads:
+                    sm = self.__slots(commands.multi.va_vias)
+                    sm.add(obj, _add_th_pads, th_pads)
+                    placed.append(sm)
+
+                for layer, pads in smd_pads.items():
+                    sm = self.__slots(commands.layers[layer].va_traces)
+                    sm.add(obj, _add_pad_traces, pads)
+                    placed.append(sm)
+
+                self.__placed[obj] = tuple(placed)
+
+            else:
+                continue
 
-        if self.__polygon_generation != self.__project.artwork.polygons_generation:
-            self.__polygon_generation = self.__project.artwork.polygons_generation
+            self.__changed = True
 
-            # Reinit the cache. TODO, can we only update only different polys?
-            self.__polygon_cache = defaultdict(PolygonLayerCache)
+        for va, va_traces in traces.items():
+            self.__add_rows(va, va_traces, VA_thickline.add_thickline_array,
+                            [(t.p0.x, t.p0.y, t.p1.x, t.p1.y, t.thickness / 2) for t in va_traces])
 
-            for p in self.__project.artwork.polygons:
-                self.__polygon_cache[p.layer].add(p)
+        for va, va_vias in vias.items():
+            self.__add_rows(va, va_vias, VA_via.add_donut_array, [(v.pt.x, v.pt.y, v.r, 0) for v in va_vias])
 
+    def __add_rows(self, va: VA, objs: 'Sequence[Any]', emit: Callable[..., None],
+                   rows: List[Tuple[float, ...]]) -> None:
+        sm = self.__slots(va)
+        sm.add_rows(objs, emit, rows)
+
+        placed = (sm,)
+        for obj in objs:
+            self.__placed[obj] = placed
+        self.__changed = True
+
+    def artwork_removed(self, objs: 'Sequence[Any]') -> None:
+        for obj in objs:
+            if isinstance(obj, Polygon):
+                self.__polygon_cache[obj.layer].remove(obj)
+
+            elif obj in self.__placed:
+                for sm in self.__placed.pop(obj):
+                    sm.remove(obj)
+
+            else:
+                continue
+
+            self.__changed = True
+
+    def update_if_necessary(self) -> None:
+        # Every layer and via pair has arrays, even if empty
+        for layer in self.__project.stackup.layers:
+            self.__slots(self.__commands.layers[layer].va_traces)
+
+        for vp in self.__project.stackup.via_pairs:
+            self.__slots(self.__commands.vias[vp].va_vias)
 
         if self.__airwires_generation != self.__project.artwork.airwires_generation:
+            self.__airwires_generation = self.__project.artwork.airwires_generation
+
             self.airwire_va.clear()
             for aw in self.__project.artwork.airwires:
                 self.airwire_va.add_line(aw.p0.x, aw.p0.y, aw.p1.x, aw.p1.y)
+            self.airwire_va.version = self.__airwires_generation
 
-    def extendTo(self, target: 'StackupRenderCommands') -> None:
-        """
-        :type target: StackupRenderCommands
-        :param target:
-        :return:
-        """
-
-        target.extend(self.__traces_cache)
-        target.extend(self.__vias_cache)
-        target.extend(self.__cmp_cache)
+        if self.__changed:
+            self.__changed = False
+            self.version += 1
 
 
 class SelectionHighlightCache:
@@ -195,6 +409,9 @@ class SelectionHighlightCache:
         self.thinline_va = VA_xy(1024)
         self.via_va = VA_via(1024)
 
+        # Bumped each time the arrays are rebuilt, see VA.version
+        self.version = 0
+
     @property
     def polygon_cache(self):
         return self.__polygon_cache
@@ -214,9 +431,11 @@ class SelectionHighlightCache:
 
         self.__last_selection = selection_list
 
+        self.version += 1
         self.thickline_va.clear()
         self.thinline_va.clear()
         self.via_va.clear()
+        self.thickline_va.version = self.thinline_va.version = self.via_va.version = self.version
         self.__polygon_cache = PolygonLayerCache()
 
         for i in selection_list:
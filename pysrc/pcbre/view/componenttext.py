@@ -2,6 +2,7 @@ import math
 from pcbre.matrix import Rect, Point2, Vec2
 from pcbre.model.const import SIDE
 from pcbre.ui.gl.textrender import TextBatch
+from qtpy import QtCore
 
 from typing import TYPE_CHECKING, Optional
 
@@ -28,6 +29,7 @@ class ComponentTextBatcher:
         self.__bottom_side_pads = TextBatch(text_renderer)
 
         self.__last_generation : Optional[int] = None
+        self.__last_atlas_generation : Optional[int] = None
 
         self.__up_vector = Vec2(0, 1)
         self.__ltor_vector = Vec2(1, 0)
@@ -44,6 +46,12 @@ class ComponentTextBatcher:
         if self.__project.artwork.components_generation != self.__last_generation:
             needs_rebuild = True
 
+        # Glyphs generated in the background replace the placeholders the text was laid out with
+        atlas = self.__text.sdf_atlas
+        atlas.poll()
+        if atlas.generation != self.__last_atlas_generation:
+            needs_rebuild = True
+
         up_unit_vector = Point2.from_mat(self.__view.viewState.revMatrix.dot((0, 1, 0))[:2]).norm()
         ltor_unit_vector = Point2.from_mat(self.__view.viewState.revMatrix.dot((1, 0, 0))[:2]).norm()
 
@@ -57,13 +65,19 @@ class ComponentTextBatcher:
             self.__up_vector = up_unit_vector
             self.__ltor_vector = ltor_unit_vector
             self.__last_generation = self.__project.artwork.components_generation
+            self.__last_atlas_generation = atlas.generation
 
         return needs_rebuild
 
     def update_if_necessary(self) -> None:
-        if not self.needs_rebuild(update=True):
-            return
+        if self.needs_rebuild(update=True):
+            self.__rebuild()
+
+        # Redraw once the glyphs still being generated are ready
+        if self.__text.sdf_atlas.pending:
+            QtCore.QTimer.singleShot(50, self.__view.update)
 
+    def __rebuild(self) -> None:
         components = self.__project.artwork.components
 
         self.__top_side_pads.restart()
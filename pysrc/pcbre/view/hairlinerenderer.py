@@ -7,6 +7,7 @@ from OpenGL import GL  # type: ignore
 from OpenGL.arrays.vbo import VBO  # type: ignore
 
 from pcbre.ui.gl import VAO, VBOBind
+from pcbre.view.util import VersionedBuffers
 
 if TYPE_CHECKING:
     from pcbre.ui.boardviewwidget import BoardViewWidget
@@ -24,19 +25,24 @@ class HairlineRenderer:
         self.__shader = self.__view.gls.shader_cache.get("basic_fill_vert", "basic_fill_frag")
 
         self._va_vao = VAO()
-        self._va_batch_vbo = VBO(numpy.array([], dtype=self.__dtype), GL.GL_STREAM_DRAW)
-        GL.glObjectLabel(GL.GL_BUFFER, int(self._va_batch_vbo), -1, "Hairline VA batch VBO")
+        self.__vertex_bind = VBOBind(self.__shader.program, self.__dtype, "vertex")
 
-        with self._va_vao, self._va_batch_vbo:
-            VBOBind(self.__shader.program, self.__dtype, "vertex").assign()
+        # Vertices of each drawn VA, see VersionedBuffers
+        self.buffers = VersionedBuffers(self.__new_vbo)
+
+    def __new_vbo(self) -> VBO:
+        vbo = VBO(numpy.array([], dtype=self.__dtype), GL.GL_STREAM_DRAW)
+        GL.glObjectLabel(GL.GL_BUFFER, int(vbo), -1, "Hairline VA batch VBO")
+        return vbo
 
     def render_va(self, mat: 'npt.NDArray[numpy.float64]', va: 'VA_xy', col: int) -> None:
         if va.count() == 0:
             return
 
-        self._va_batch_vbo.set_array(va.buffer()[:])
+        vbo = self.buffers.get(va)
 
-        with self.__shader.program, self._va_vao, self._va_batch_vbo:
+        with self.__shader.program, self._va_vao, vbo:
+            self.__vertex_bind.assign()
             GL.glUniformMatrix3fv(self.__shader.uniforms.mat, 1, True, mat.astype(numpy.float32))
             GL.glUniform4ui(self.__shader.uniforms.layer_info, 255, col, 0, 0)
             GL.glDrawArrays(GL.GL_LINES, 0, va.count())
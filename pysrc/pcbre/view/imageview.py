@@ -2,16 +2,22 @@ from OpenGL.arrays.vbo import VBO  # type: ignore
 import OpenGL.GL as GL  # type: ignore
 import numpy
 import ctypes
+from collections import OrderedDict
+from pcbre.matrix import Point2, Rect, project_point
 from pcbre.ui.gl import VBOBind, Texture, VAO
 
-from typing import TYPE_CHECKING
+from typing import Tuple, TYPE_CHECKING, cast
 
 if TYPE_CHECKING:
     from pcbre.model.imagelayer import ImageLayer
+    from pcbre.model.imagepyramid import Tile
     from pcbre.ui.gl.glshared import GLShared
     import numpy.typing as npt
 
 class ImageView:
+    # Tile textures kept on the GPU. The least recently drawn are deleted first
+    MAX_TEXTURES = 96
+
     def __init__(self, il: 'ImageLayer') -> None:
         """
 
@@ -21,35 +27,14 @@ class ImageView:
         """
 
         self.il = il
-        self.im = il.decoded_image
+        self.pyramid = il.pyramid
         self.mat = None
 
-    def initGL(self, gls: 'GLShared') -> None:
-        self._tex = Texture()
-
-        # Setup the basic texture parameters
-        with self._tex.on(GL.GL_TEXTURE_2D):
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_NEAREST)
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
-
-            # numpy packs data tightly, whereas the openGL default is 4-byte-aligned
-            # fix line alignment to 1 byte so odd-sized textures load right
-            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        self.__textures: 'OrderedDict[Tuple[int, int, int], Texture]' = OrderedDict()
 
-            # Download the data to the buffer. cv2 stores data in BGR format
-            GL.glTexImage2D(
-                GL.GL_TEXTURE_2D,
-                0,
-                GL.GL_RGB,
-                self.im.shape[1],
-                self.im.shape[0],
-                0,
-                GL.GL_BGR,
-                GL.GL_UNSIGNED_BYTE,
-                self.im.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
-                )
+    def initGL(self, gls: 'GLShared') -> None:
+        # Textures from a previous context are gone
+        self.__textures.clear()
 
         self.prog = gls.shader_cache.get("image_vert", "image_frag")
 
@@ -58,10 +43,8 @@ class ImageView:
             ("texpos", numpy.float32, 2)
         ]) # type: ignore
 
-        sca = max(self.im.shape[0], self.im.shape[1])
-        x = self.im.shape[1] / float(sca)
-        y = self.im.shape[0] / float(sca)
-        ar["vertex"] = [(-x, -y), (-x, y), (x, -y), (x, y)]
+        # Unit square, placed over each tile by the tile matrix
+        ar["vertex"] = [(0, 0), (0, 1), (1, 0), (1, 1)]
         ar["texpos"] = [(0, 0), (0, 1), (1, 0), (1, 1)]
 
         self.b1 = VBOBind(self.prog.program, ar.dtype, "vertex")
@@ -77,18 +60,92 @@ class ImageView:
             self.b1.assign()
             self.b2.assign()
 
+    def __texture(self, tile: 'Tile') -> Texture:
+        key = (tile.level, tile.tx, tile.ty)
+        tex = self.__textures.get(key)
+        if tex is not None:
+            self.__textures.move_to_end(key)
+            return tex
+
+        tex = Texture()
+        im = tile.image
+
+        with tex.on(GL.GL_TEXTURE_2D):
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_NEAREST)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+
+            # numpy packs data tightly, whereas the openGL default is 4-byte-aligned
+            # fix line alignment to 1 byte so odd-sized textures load right
+            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+
+            # Download the data to the buffer. cv2 stores data in BGR format
+            GL.glTexImage2D(
+                GL.GL_TEXTURE_2D,
+                0,
+                GL.GL_RGB,
+                im.shape[1],
+                im.shape[0],
+                0,
+                GL.GL_BGR,
+                GL.GL_UNSIGNED_BYTE,
+                im.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
+                )
+
+        self.__textures[key] = tex
+        return tex
+
+    def __trim_textures(self, in_use: int) -> None:
+        # Never delete textures drawn this frame, which are the most recently used
+        while len(self.__textures) > max(self.MAX_TEXTURES, in_use):
+            _, tex = self.__textures.popitem(last=False)
+            GL.glDeleteTextures([tex.v])
+
+    def __tile_matrix(self, tile: 'Tile') -> 'npt.NDArray[numpy.float64]':
+        """Maps the unit square onto the tile, in normalized image coordinates"""
+        p2n = self.pyramid.pixel_to_normalized
+        x0, y0, _ = p2n.dot((tile.x0, tile.y0, 1))
+        x1, y1, _ = p2n.dot((tile.x1, tile.y1, 1))
+        return numpy.array([
+            [x1 - x0, 0, x0],
+            [0, y1 - y0, y0],
+            [0, 0, 1]], dtype=numpy.float64)
+
     def render(self, viewPort: 'npt.NDArray[numpy.float64]') -> None:
         m_pre = self.mat
         if self.mat is None:
             m_pre = self.il.transform_matrix
         mat = viewPort.dot(m_pre)
 
+        # Visible world rect, and world units per screen pixel
+        _, _, vp_width, vp_height = GL.glGetIntegerv(GL.GL_VIEWPORT)
+        n2w = cast('npt.NDArray[numpy.float64]', numpy.linalg.inv(viewPort))
+        corners = [project_point(n2w, Point2(x, y)) for x, y in ((-1, -1), (-1, 1), (1, -1), (1, 1))]
+        view_rect = Rect.from_points(corners[0], corners[1])
+        for pt in corners[2:]:
+            view_rect.point_merge(pt)
+        scale = (project_point(n2w, Point2(2 / max(vp_width, 1), 0)) - project_point(n2w, Point2(0, 0))).mag()
+
+        # Levels that need decoding are decoded off the render thread, a coarser level is drawn meanwhile
+        _, tiles = self.pyramid.view(m_pre, view_rect, scale, background=True)
+
         GL.glActiveTexture(GL.GL_TEXTURE0)
-        with self.prog.program, self._tex.on(GL.GL_TEXTURE_2D), self.vao:
-            GL.glUniformMatrix3fv(self.mat_loc, 1, True, mat.astype(numpy.float32))
+        with self.prog.program, self.vao:
             GL.glUniform1i(self.tex1_loc, 0)
 
-            GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
+            for tile in tiles:
+                with self.__texture(tile).on(GL.GL_TEXTURE_2D):
+                    tile_mat = mat.dot(self.__tile_matrix(tile))
+                    GL.glUniformMatrix3fv(self.mat_loc, 1, True, tile_mat.astype(numpy.float32))
+                    GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
+
+        self.__trim_textures(len(tiles))
+
+    @property
+    def pending(self) -> bool:
+        """Whether a finer level is still being decoded, and the view should be drawn again once it's done"""
+        return self.pyramid.pending
 
     #def tfI2W(self, pt) -> Tuple[float, float]:
     #    x_, y_, t_ = self.il.transform_matrix.dot([pt[0], pt[1], 1.])
@@ -9,6 +9,7 @@ from pcbre.matrix import rotate, Vec2
 from pcbre.ui.gl import VAO, VBOBind, glimports as GLI
 import ctypes
 from pcbre.view.target_const import COL_LAYER_MAIN, COL_SEL
+from pcbre.view.util import VersionedBuffers
 
 from typing import TYPE_CHECKING, Optional, Any
 
@@ -83,10 +84,9 @@ class TraceRender:
         ])
 
 
-        # Use a fake array to get a zero-length VBO for initial binding
-        instance_array : 'npt.NDArray[Any]' = numpy.ndarray(0, dtype=self.instance_dtype)
-        self.instance_vbo = VBO(instance_array)
-        GL.glObjectLabel(GL.GL_BUFFER, int(self.instance_vbo), -1, "Thickline Instance VBO")
+        # Instance data of each drawn VA, see VersionedBuffers
+        self.instances = VersionedBuffers(self.__new_instance_vbo)
+        self.instance_vbo = self.__new_instance_vbo()
 
         with self.__attribute_shader_vao, self.trace_vbo:
             VBOBind(self.__attribute_shader.program, self.trace_vbo.dtype, "vertex").assign()
@@ -101,6 +101,13 @@ class TraceRender:
 
             self.index_vbo.bind()
 
+    def __new_instance_vbo(self) -> VBO:
+        # Use a fake array to get a zero-length VBO for initial binding
+        instance_array : 'npt.NDArray[Any]' = numpy.ndarray(0, dtype=self.instance_dtype)
+        vbo = VBO(instance_array)
+        GL.glObjectLabel(GL.GL_BUFFER, int(vbo), -1, "Thickline Instance VBO")
+        return vbo
+
     def __base_rebind(self, base: int) -> None:
         self.__bind_pos_a.assign(base)
         self.__bind_pos_b.assign(base)
@@ -129,7 +136,7 @@ class TraceRender:
         self.trace_vbo.bind()
         self.trace_vbo.set_array(self.working_array)
 
-    def __render_va_inner(self, col: int, is_outline: bool, first: int, count: int) -> None:
+    def __render_va_inner(self, instance_vbo: VBO, col: int, is_outline: bool, first: int, count: int) -> None:
         GL.glUniform4ui(self.__attribute_shader.uniforms.layer_info, 255, col, 0, 0)
 
         if has_base_instance:
@@ -144,7 +151,7 @@ class TraceRender:
                 GL.glDrawArraysInstancedBaseInstance(GL.GL_LINE_LOOP, 2, NUM_ENDCAP_SEGMENTS * 2,
                                                      count, first)
         else:
-            with self.instance_vbo:
+            with instance_vbo:
                 if not is_outline:
                     # filled traces come first in the array
                     self.__base_rebind(first)
@@ -163,13 +170,15 @@ class TraceRender:
         GL.glPushDebugGroup(GL.GL_DEBUG_SOURCE_APPLICATION, 0, -1, "Thickline Draw")
         assert self.instance_dtype.itemsize == va.stride
 
-        self.instance_vbo.set_array(va.buffer()[:])
+        instance_vbo = self.instances.get(va)
 
         if count is None:
             count = va.count() - first
 
-        with self.__attribute_shader.program, self.__attribute_shader_vao, self.instance_vbo:
+        with self.__attribute_shader.program, self.__attribute_shader_vao, instance_vbo:
+            # Point the instance attributes at this VA's buffer
+            self.__base_rebind(0)
             GL.glUniformMatrix3fv(self.__attribute_shader.uniforms.mat, 1, True, mat.astype(numpy.float32))
 
-            self.__render_va_inner(col, is_outline, first, count)
+            self.__render_va_inner(instance_vbo, col, is_outline, first, count)
         GL.glPopDebugGroup()
@@ -1,6 +1,10 @@
 __author__ = 'davidc'
 
-from typing import Sequence, Tuple, List
+import weakref
+from typing import Any, Callable, Sequence, Tuple, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pcbre.accel.vert_array import VA
 
 
 def get_consolidated_draws(dr: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
@@ -62,3 +66,42 @@ def get_consolidated_draws_1(dl: Sequence[int]) -> List[Tuple[int, int]]:
     consolidated.append((current_first, current_last))
 
     return consolidated
+
+
+class VersionedBuffers:
+    """
+    GPU copies of the vertex arrays drawn by a renderer. An array with a version gets a buffer of its own, uploaded
+    again only when the version changes, so redrawing unchanged geometry costs nothing. Arrays without a version share
+    one scratch buffer and are uploaded on every draw
+
+    :param new_buffer: creates an empty buffer. Buffers need only a set_array(data) method, eg: a PyOpenGL VBO
+    """
+
+    def __init__(self, new_buffer: Callable[[], Any]) -> None:
+        self.__new_buffer = new_buffer
+        self.__scratch: Optional[Any] = None
+        self.__buffers: 'weakref.WeakKeyDictionary[VA, Tuple[Any, int]]' = weakref.WeakKeyDictionary()
+
+        # Number of arrays copied to buffers
+        self.uploads = 0
+
+    def get(self, va: 'VA') -> Any:
+        """Buffer holding the current contents of va"""
+        if va.version is None:
+            if self.__scratch is None:
+                self.__scratch = self.__new_buffer()
+            self.__upload(self.__scratch, va)
+            return self.__scratch
+
+        entry = self.__buffers.get(va)
+        if entry is not None and entry[1] == va.version:
+            return entry[0]
+
+        buf = entry[0] if entry is not None else self.__new_buffer()
+        self.__upload(buf, va)
+        self.__buffers[va] = (buf, va.version)
+        return buf
+
+    def __upload(self, buf: Any, va: 'VA') -> None:
+        buf.set_array(va.buffer()[:])
+        self.uploads += 1
@@ -7,6 +7,7 @@ from OpenGL import GL
 from OpenGL.arrays.vbo import VBO  # type: ignore
 import numpy
 from pcbre.ui.gl import VAO, VBOBind, glimports as GLI
+from pcbre.view.util import VersionedBuffers
 
 N_OUTLINE_SEGMENTS = 100
 
@@ -68,15 +69,15 @@ class THRenderer:
         with self.__filled_vao, self._sq_vbo:
             VBOBind(self._filled_shader.program, self._sq_vbo.data.dtype, "vertex").assign()
 
-        # Use a fake array to get a zero-length VBO for initial binding
-        filled_instance_array = numpy.ndarray(0, dtype=self.__dtype)
-        self.filled_instance_vbo = VBO(filled_instance_array)
-        GL.glObjectLabel(GL.GL_BUFFER, int(self._sq_vbo), -1, "Via Filled Instance VBO")
+        # Instance data of each drawn VA, see VersionedBuffers
+        self.filled_instances = VersionedBuffers(lambda: self.__new_instance_vbo("Via Filled Instance VBO"))
+        self.outline_instances = VersionedBuffers(lambda: self.__new_instance_vbo("Via Outline Instance VBO"))
 
-        with self.__filled_vao, self.filled_instance_vbo:
-            VBOBind(self._filled_shader.program, self.__dtype, "pos", div=1).assign()
-            VBOBind(self._filled_shader.program, self.__dtype, "r", div=1).assign()
-            VBOBind(self._filled_shader.program, self.__dtype, "r_inside_frac_sq", div=1).assign()
+        self.__filled_binds = [
+            VBOBind(self._filled_shader.program, self.__dtype, "pos", div=1),
+            VBOBind(self._filled_shader.program, self.__dtype, "r", div=1),
+            VBOBind(self._filled_shader.program, self.__dtype, "r_inside_frac_sq", div=1),
+        ]
 
         with self.__outline_vao, self._outline_vbo:
             VBOBind(self._outline_shader.program, self._outline_vbo.data.dtype, "vertex").assign()
@@ -84,25 +85,29 @@ class THRenderer:
         # Build instance for outline rendering
         # We don't have an inner 'r' for this because we just do two instances per vertex
 
-        # Use a fake array to get a zero-length VBO for initial binding
-        outline_instance_array = numpy.ndarray(0, dtype=self.__dtype)
-        self.outline_instance_vbo = VBO(outline_instance_array)
-        GL.glObjectLabel(GL.GL_BUFFER, int(self.outline_instance_vbo), -1, "Via Outline Instance VBO")
+        self.__outline_binds = [
+            VBOBind(self._outline_shader.program, self.__dtype, "pos", div=1),
+            VBOBind(self._outline_shader.program, self.__dtype, "r", div=1),
+        ]
 
-        with self.__outline_vao, self.outline_instance_vbo:
-            VBOBind(self._outline_shader.program, self.__dtype, "pos", div=1).assign()
-            VBOBind(self._outline_shader.program, self.__dtype, "r", div=1).assign()
+    def __new_instance_vbo(self, label: str) -> VBO:
+        # Use a fake array to get a zero-length VBO for initial binding
+        vbo = VBO(numpy.ndarray(0, dtype=self.__dtype))
+        GL.glObjectLabel(GL.GL_BUFFER, int(vbo), -1, label)
+        return vbo
 
     def render_filled(self, mat: 'npt.NDArray[numpy.float64]' , va: 'VA_xy', color: Tuple[float, float, float]=COL_VIA) -> None:
         if not va.count():
             return
 
-        self.filled_instance_vbo.set_array(va.buffer()[:])
+        instance_vbo = self.filled_instances.get(va)
 
         try:
             with self._filled_shader.program:
                 with self.__filled_vao:
-                    with self.filled_instance_vbo:
+                    with instance_vbo:
+                        for bind in self.__filled_binds:
+                            bind.assign()
                         with self._sq_vbo:
                             GL.glUniformMatrix3fv(self._filled_shader.uniforms.mat, 1, True, mat.astype(numpy.float32))
                             GL.glUniform1ui(self._filled_shader.uniforms.color, color)
@@ -114,10 +119,13 @@ class THRenderer:
         if not va.count():
             return
 
-        self.outline_instance_vbo.set_array(va.buffer()[:])
-        self.outline_instance_vbo.bind()
+        instance_vbo = self.outline_instances.get(va)
+
+        with self._outline_shader.program, self.__outline_vao, instance_vbo:
+            for bind in self.__outline_binds:
+                bind.assign()
 
-        with self._outline_shader.program, self.__outline_vao, self.outline_instance_vbo, self._sq_vbo:
-            GL.glUniformMatrix3fv(self._outline_shader.uniforms.mat, 1, True, mat.astype(numpy.float32))
-            GL.glUniform4ui(self._outline_shader.uniforms.layer_info, 255, COL_SEL, 0, 0)
-            GL.glDrawArraysInstanced(GL.GL_LINE_LOOP, 0, N_OUTLINE_SEGMENTS, va.count())
+            with self._sq_vbo:
+                GL.glUniformMatrix3fv(self._outline_shader.uniforms.mat, 1, True, mat.astype(numpy.float32))
+                GL.glUniform4ui(self._outline_shader.uniforms.layer_info, 255, COL_SEL, 0, 0)
+                GL.glDrawArraysInstanced(GL.GL_LINE_LOOP, 0, N_OUTLINE_SEGMENTS, va.count())
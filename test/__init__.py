@@ -0,0 +1,8 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Glyph atlases and image tiles made by the tests go in a directory of their own, not the user's cache
+os.environ["PCBRE_CACHE_DIR"] = tempfile.mkdtemp(prefix="pcbre-test-cache-")
+atexit.register(shutil.rmtree, os.environ["PCBRE_CACHE_DIR"], ignore_errors=True)
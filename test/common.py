@@ -1,14 +1,62 @@
+import math
+import os
+import random
+import unittest
 from tempfile import TemporaryFile, TemporaryDirectory
 
-from pcbre.model.artwork_geom import Via
+from pcbre.matrix import Point2
+from pcbre.model.artwork_geom import Geom, Via, Trace
 from pcbre.model.project import Project, StorageType
 from pcbre.model.serialization_capnp import CapnpIO
 from pcbre.model.serialization_dirtext import DirTextIO
 from pcbre.model.stackup import Layer, ViaPair
 from functools import wraps
+from typing import List
 
 __author__ = 'davidc'
 
+# Benchmarks build full size boards and assert on wall clock time, so they only run when PCBRE_BENCH=1 is set
+FULL_BENCH = bool(os.environ.get("PCBRE_BENCH"))
+
+benchmark = unittest.skipUnless(FULL_BENCH, "benchmark, set PCBRE_BENCH=1 to run")
+
+
+def bench_report(line: str) -> None:
+    """Print a benchmark result line. Only on a benchmark run, so the normal test output stays clean"""
+    if FULL_BENCH:
+        print(line)
+
+
+def build_random_board(p: Project, n: int, seed: int = 0, add: bool = True) -> List[Geom]:
+    """
+    Fill a project with n random short traces and vias, each on its own net, at integer coordinates as the
+    file formats expect. A two layer stackup is created if the project doesn't have one. The board grows with n so geometry density stays the same
+
+    :param add: add the geometry to the artwork. If False it is only created and returned
+    """
+    if not p.stackup.via_pairs:
+        top = p.stackup.add_layer("top", (1, 0, 0))
+        bottom = p.stackup.add_layer("bottom", (0, 0, 1))
+        p.stackup.add_via_pair(top, bottom)
+
+    layers = list(p.stackup.layers)
+    vp = p.stackup.via_pairs[0]
+
+    rng = random.Random(seed)
+    extent = 100 * math.sqrt(n)
+    geoms: List[Geom] = []
+    for _ in range(n):
+        p0 = Point2(round(rng.uniform(0, extent)), round(rng.uniform(0, extent)))
+        if rng.random() < 0.2:
+            g = Via(p0, vp, 80, p.nets.new())
+        else:
+            p1 = Point2(p0.x + round(rng.uniform(-500, 500)), p0.y + round(rng.uniform(-500, 500)))
+            g = Trace(p0, p1, 40, rng.choice(layers), p.nets.new())
+        if add:
+            p.artwork.add_artwork(g)
+        geoms.append(g)
+
+    return geoms
 
 
 def setup2Layer(obj):
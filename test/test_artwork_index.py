@@ -0,0 +1,93 @@
+import random
+import time
+import unittest
+
+from pcbre.matrix import Point2, Rect
+from pcbre.model.project import Project
+from pcbre.model.artwork import ArtworkIndex
+from pcbre.model.artwork_geom import Trace
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _rect(x0, y0, x1, y1):
+    return Rect.from_points(Point2(x0, y0), Point2(x1, y1))
+
+
+class test_artwork_index(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.top = self.p.stackup.add_layer("top", (1, 0, 0))
+
+    def __trace(self, x):
+        return Trace(Point2(x, 0), Point2(x + 100, 0), 10, self.top)
+
+    def test_handle_reuse(self):
+        idx = ArtworkIndex()
+        a, b, c = self.__trace(0), self.__trace(50), self.__trace(1000)
+        for g in (a, b, c):
+            idx.insert(g)
+        self.assertEqual([g._index_handle for g in (a, b, c)], [0, 1, 2])
+        self.assertEqual(len(idx), 3)
+
+        idx.remove(a)
+        self.assertEqual(a._index_handle, -1)
+        self.assertEqual(len(idx), 2)
+
+        d = self.__trace(60)
+        idx.insert(d)
+        self.assertEqual(d._index_handle, 0)
+
+        # Hits are still in insertion order, though d took a's handle
+        self.assertEqual(idx.intersect_point(Point2(75, 0)), [b, d])
+
+        # Re-inserting an indexed object keeps its handle
+        idx.remove(d)
+        idx.insert(b)
+        self.assertEqual(b._index_handle, 1)
+
+    def test_intersect_many(self):
+        build_random_board(self.p, 500)
+        rng = random.Random(2)
+
+        bboxes = []
+        for _ in range(100):
+            x, y = rng.uniform(0, 2000), rng.uniform(0, 2000)
+            bboxes.append(_rect(x, y, x + rng.uniform(0, 500), y + rng.uniform(0, 500)))
+
+        index = self.p.artwork._Artwork__index
+        got = index.intersect_many(bboxes)
+        self.assertEqual(len(got), len(bboxes))
+        for hits, bbox in zip(got, bboxes):
+            self.assertEqual(set(hits), set(index.intersect(bbox)))
+
+        self.assertEqual(index.intersect_many([]), [])
+        self.assertEqual(ArtworkIndex().intersect_many(bboxes[:2]), [[], []])
+
+
+@benchmark
+class test_artwork_index_benchmark(unittest.TestCase):
+    def test_queries(self):
+        p = Project()
+        build_random_board(p, 200000)
+        index = p.artwork._Artwork__index
+
+        bboxes = [g.bbox for g in p.artwork.get_all_artwork()]
+
+        start = time.perf_counter()
+        single = [len(index.intersect(b)) for b in bboxes]
+        t_single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        many = [len(hits) for hits in index.intersect_many(bboxes)]
+        t_many = time.perf_counter() - start
+
+        start = time.perf_counter()
+        p.artwork.rebuild_connectivity()
+        t_rebuild = time.perf_counter() - start
+
+        bench_report("artwork index, %d bbox queries: intersect %.3fs, intersect_many %.3fs. rebuild %.2fs" % (
+            len(bboxes), t_single, t_many, t_rebuild))
+
+        self.assertEqual(single, many)
@@ -0,0 +1,129 @@
+import random
+import time
+import unittest
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Trace, Via, Airwire
+from pcbre.model.const import SIDE
+from pcbre.model.dipcomponent import DIPComponent
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _key(g):
+    return g.bbox.left, g.bbox.bottom, g.bbox.right, g.bbox.top
+
+
+class test_bulk_load(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.top = self.p.stackup.add_layer("top", (1, 0, 0))
+        self.bottom = self.p.stackup.add_layer("bottom", (0, 0, 1))
+        self.vp = self.p.stackup.add_via_pair(self.top, self.bottom)
+
+    def __objects(self):
+        n = self.p.nets.new()
+        t = Trace(Point2(0, 0), Point2(1000, 0), 100, self.top, n)
+        v = Via(Point2(0, 0), self.vp, 100, n)
+        aw = Airwire(Point2(1000, 0), Point2(2000, 0), self.top, self.top, n)
+        cmp = DIPComponent(self.p, Point2(5000, 5000), 0, SIDE.Top, self.p, 8, 1000, 3000, 600)
+        return [t, v, aw], [cmp]
+
+    def test_registers_everything(self):
+        geoms, components = self.__objects()
+        t, v, aw = geoms
+        cmp = components[0]
+
+        self.p.artwork.bulk_load(geoms, components)
+
+        self.assertEqual(set(self.p.artwork.traces), {t})
+        self.assertEqual(set(self.p.artwork.vias), {v})
+        self.assertEqual(set(self.p.artwork.airwires), {aw})
+        self.assertEqual(set(self.p.artwork.components), {cmp})
+        for g in geoms:
+            self.assertIs(g._project, self.p)
+        self.assertIs(cmp._project, self.p)
+
+        self.assertEqual(set(self.p.artwork.get_geom_for_net(t.net)), {t, v, aw})
+        pad = cmp.get_pads()[0]
+        self.assertIn(pad, self.p.artwork.get_geom_for_net(pad.net))
+
+        self.assertEqual(self.p.artwork.query_point_multiple(Point2(0, 0)), [v, t])
+        self.assertIs(self.p.artwork.query_point(pad.center), pad)
+
+        # Removal works on a stream loaded tree
+        self.p.artwork.remove_artwork(v)
+        self.assertEqual(self.p.artwork.query_point_multiple(Point2(0, 0)), [t])
+
+    def test_generations_bumped_once(self):
+        geoms, components = self.__objects()
+        aw = self.p.artwork
+        before = (aw.traces_generation, aw.vias_generation, aw.airwires_generation,
+                  aw.polygons_generation, aw.components_generation)
+
+        aw.bulk_load(geoms, components)
+        after = (aw.traces_generation, aw.vias_generation, aw.airwires_generation,
+                 aw.polygons_generation, aw.components_generation)
+
+        self.assertEqual([b - a for a, b in zip(before, after)], [1, 1, 1, 0, 1])
+
+    def test_into_nonempty(self):
+        first = Trace(Point2(0, 10), Point2(1000, 10), 100, self.top, self.p.nets.new())
+        self.p.artwork.add_artwork(first)
+
+        geoms, components = self.__objects()
+        self.p.artwork.bulk_load(geoms, components)
+
+        self.assertEqual(self.p.artwork.query_point_multiple(Point2(0, 0)), [geoms[1], first, geoms[0]])
+
+    def test_matches_incremental(self):
+        incremental = Project()
+        build_random_board(incremental, 2000)
+
+        bulk = Project()
+        bulk.artwork.bulk_load(build_random_board(bulk, 2000, add=False))
+
+        for p in (incremental, bulk):
+            self.assertEqual(len(p.artwork.traces) + len(p.artwork.vias), 2000)
+
+        rng = random.Random(1)
+        pts = [Point2(rng.uniform(0, 4500), rng.uniform(0, 4500)) for _ in range(500)]
+        for pt in pts:
+            self.assertEqual([_key(g) for g in bulk.artwork.query_point_multiple(pt)],
+                             [_key(g) for g in incremental.artwork.query_point_multiple(pt)])
+
+
+@benchmark
+class test_bulk_load_benchmark(unittest.TestCase):
+    def test_load_and_query(self):
+        n = 200000
+        rng = random.Random(0)
+        extent = 100 * n ** 0.5
+        pts = [Point2(rng.uniform(0, extent), rng.uniform(0, extent)) for _ in range(5000)]
+
+        def run(bulk):
+            p = Project()
+            geoms = build_random_board(p, n, add=False)
+
+            start = time.perf_counter()
+            if bulk:
+                p.artwork.bulk_load(geoms)
+            else:
+                for g in geoms:
+                    p.artwork.add_artwork(g)
+            t_load = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for pt in pts:
+                p.artwork.query_point_multiple(pt)
+            return t_load, time.perf_counter() - start
+
+        t_inc, q_inc = run(False)
+        t_bulk, q_bulk = run(True)
+
+        bench_report("artwork load, %d objects: add_artwork %.2fs, bulk_load %.2fs. %d point queries %.3fs, %.3fs" % (
+            n, t_inc, t_bulk, len(pts), q_inc, q_bulk))
+
+        self.assertLess(t_bulk, t_inc)
@@ -0,0 +1,232 @@
+import gc
+import random
+import time
+import unittest
+import weakref
+from collections import Counter
+from unittest import mock
+
+from pcbre.accel.vert_array import VA_xy, VA_thickline
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Polygon
+from pcbre.model.const import SIDE
+from pcbre.model.dipcomponent import DIPComponent
+from pcbre.model.passivecomponent import Passive2Component, Passive2BodyType, PassiveSymType
+from pcbre.view.cad_cache import CADCache, VASlotMap
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _records(va):
+    """Multiset of the live records of a VA. Zeroed records draw nothing, so are left out"""
+    data = bytes(va.buffer())
+    stride = va.stride
+    zero = bytes(stride)
+    return Counter(r for r in (data[i:i + stride] for i in range(0, len(data), stride)) if r != zero)
+
+
+def _arrays(cache):
+    commands = cache.commands
+    arrays = {("layer", k): v.va_traces for k, v in commands.layers.items()}
+    arrays.update({("vias", k): v.va_vias for k, v in commands.vias.items()})
+    arrays.update({("side", k): v.va_outlines for k, v in commands.sides.items()})
+    arrays["multi"] = commands.multi.va_vias
+    return arrays
+
+
+def _polygons(cache, p):
+    return {layer: sorted(id(poly) for poly in cache.polygon_cache_for_layer(layer).polygons)
+            for layer in p.stackup.layers}
+
+
+class test_cad_cache_incremental(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        build_random_board(self.p, 300)
+        self.top, self.bottom = self.p.stackup.layers
+
+    def __component(self, rng):
+        pos = Point2(rng.randrange(0, 100000), rng.randrange(0, 100000))
+        if rng.random() < 0.5:
+            return DIPComponent(self.p, pos, 0, SIDE.Top, self.p, 8, 1000, 3000, 600)
+        return Passive2Component(self.p, pos, 0, rng.choice([SIDE.Top, SIDE.Bottom]), PassiveSymType.TYPE_RES,
+                                 Passive2BodyType.CHIP, 1000, Point2(200, 200), Point2(300, 300), self.p)
+
+    def __polygon(self, rng):
+        x, y = rng.randrange(0, 100000), rng.randrange(0, 100000)
+        return Polygon(rng.choice([self.top, self.bottom]),
+                       [Point2(x, y), Point2(x + 500, y), Point2(x + 500, y + 500), Point2(x, y + 500)], [],
+                       self.p.nets.new())
+
+    def test_matches_rebuild(self):
+        rng = random.Random(1)
+        cache = CADCache(self.p)
+        artwork = self.p.artwork
+        spare = build_random_board(self.p, 300, seed=1, add=False)
+
+        for step in range(600):
+            r = rng.random()
+            if r < 0.3 and spare:
+                artwork.add_artwork(spare.pop())
+            elif r < 0.4:
+                artwork.merge_component(self.__component(rng))
+            elif r < 0.5:
+                artwork.add_artwork(self.__polygon(rng))
+            else:
+                objs = list(artwork.traces) + list(artwork.vias) + list(artwork.components) + list(artwork.polygons)
+                if objs:
+                    artwork.remove(rng.choice(objs))
+
+            if step % 50 == 0:
+                cache.update_if_necessary()
+
+        cache.update_if_necessary()
+        fresh = CADCache(self.p)
+        fresh.update_if_necessary()
+
+        incremental, rebuilt = _arrays(cache), _arrays(fresh)
+        self.assertEqual(set(incremental), set(rebuilt))
+        for k in rebuilt:
+            self.assertEqual(_records(incremental[k]), _records(rebuilt[k]), k)
+
+        self.assertEqual(_polygons(cache, self.p), _polygons(fresh, self.p))
+
+    def test_single_edit(self):
+        cache = CADCache(self.p)
+        cache.update_if_necessary()
+        version = cache.version
+
+        trace = next(iter(self.p.artwork.traces))
+        va = cache.commands.layers[trace.layer].va_traces
+        count, va_version = va.count(), va.version
+
+        # Neither the removal nor the frame after it re-emits anything
+        with mock.patch.object(VA_thickline, "add_trace", side_effect=AssertionError):
+            self.p.artwork.remove_artwork(trace)
+            cache.update_if_necessary()
+
+        # The hole was filled from the end of the array
+        self.assertEqual(va.count(), count - 1)
+        self.assertEqual(sum(_records(va).values()), va.count())
+        self.assertNotEqual(va.version, va_version)
+        self.assertGreater(cache.version, version)
+
+        # Unrelated arrays are untouched
+        vias = next(iter(cache.commands.vias.values())).va_vias
+        via_version = vias.version
+        self.p.artwork.merge_artwork(trace)
+        self.assertEqual(va.count(), count)
+        self.assertEqual(vias.version, via_version)
+
+    def test_listener_is_weak(self):
+        cache = weakref.ref(CADCache(self.p))
+        gc.collect()
+        self.assertIsNone(cache())
+
+        # No cache left to notify
+        build_random_board(self.p, 10, seed=2)
+
+
+class test_va_slot_map(unittest.TestCase):
+    @staticmethod
+    def emit(va, n, v):
+        for i in range(n):
+            va.add_vertex(v, i)
+
+    def test_tombstone_and_compact(self):
+        sm = VASlotMap(VA_xy(16))
+        for k in range(10):
+            sm.add(k, self.emit, 3, k + 1)
+
+        # Multi record objects in the middle are zeroed, at the end are dropped
+        sm.remove(4)
+        self.assertEqual((sm.va.count(), sm.dead), (30, 3))
+        sm.remove(9)
+        self.assertEqual((sm.va.count(), sm.dead), (27, 3))
+
+        # Which exposes the zeroed records of 8, which also go
+        sm.remove(8)
+        self.assertEqual((sm.va.count(), sm.dead), (24, 3))
+
+        live = _records(sm.va)
+        sm.compact()
+        self.assertEqual((sm.va.count(), sm.dead), (21, 0))
+        self.assertEqual(_records(sm.va), live)
+
+        # Slots still line up after compacting
+        sm.remove(5)
+        self.assertEqual(sm.dead, 3)
+        self.assertEqual(_records(sm.va), live - _records(self.__va(3, 6)))
+        self.assertEqual(len(sm), 6)
+
+    def test_auto_compact(self):
+        sm = VASlotMap(VA_xy(16))
+        with mock.patch.object(VASlotMap, "COMPACT_MIN", 4):
+            for k in range(10):
+                sm.add(k, self.emit, 2, k + 1)
+            for k in range(6):
+                sm.remove(k)
+
+        self.assertEqual(sm.dead, 0)
+        self.assertEqual(sm.va.count(), 8)
+
+    def test_swap(self):
+        sm = VASlotMap(VA_xy(16))
+        for k in range(5):
+            sm.add(k, self.emit, 1, k + 1)
+
+        version = sm.va.version
+        sm.remove(1)
+        self.assertEqual((sm.va.count(), sm.dead), (4, 0))
+        self.assertNotEqual(sm.va.version, version)
+
+        # 4 now lives where 1 was
+        sm.remove(4)
+        self.assertEqual(_records(sm.va), _records(self.__va(1, 1)) + _records(self.__va(1, 3)) +
+                         _records(self.__va(1, 4)))
+
+    def __va(self, n, v):
+        va = VA_xy(16)
+        self.emit(va, n, v)
+        return va
+
+
+@benchmark
+class test_cad_cache_incremental_benchmark(unittest.TestCase):
+    def test_place_trace(self):
+        p = Project()
+        build_random_board(p, 200000)
+        extra = build_random_board(p, 100, seed=1, add=False)
+
+        start = time.perf_counter()
+        cache = CADCache(p)
+        cache.update_if_necessary()
+        t_build = time.perf_counter() - start
+
+        # Artwork's own index and net bookkeeping, with the cache's share
+        start = time.perf_counter()
+        for g in extra:
+            p.artwork.add_artwork(g)
+            cache.update_if_necessary()
+        for g in extra:
+            p.artwork.remove_artwork(g)
+            cache.update_if_necessary()
+        t_artwork = (time.perf_counter() - start) / (2 * len(extra))
+
+        # Just the cache's share
+        geoms = list(p.artwork.traces)[:100]
+        start = time.perf_counter()
+        for g in geoms:
+            cache.artwork_removed((g,))
+            cache.update_if_necessary()
+        for g in geoms:
+            cache.artwork_added((g,))
+            cache.update_if_necessary()
+        t_edit = (time.perf_counter() - start) / (2 * len(geoms))
+
+        bench_report("cad cache, %d objects: full build %.1fms, one add or remove %.3fms (%.3fms with Artwork)" % (
+            len(list(p.artwork.get_all_artwork())), t_build * 1000, t_edit * 1000, t_artwork * 1000))
+
+        self.assertLess(t_edit * 100, t_build)
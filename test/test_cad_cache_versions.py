@@ -0,0 +1,126 @@
+import time
+import unittest
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Airwire, Trace
+from pcbre.accel.vert_array import VA_xy
+from pcbre.view.cad_cache import CADCache
+from pcbre.view.util import VersionedBuffers
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+class FakeBuffer:
+    def __init__(self):
+        self.data = None
+
+    def set_array(self, data):
+        self.data = bytes(data)
+
+
+def _frame(cache, buffers):
+    """Draw a frame the way BoardViewWidget does, without GL"""
+    cache.update_if_necessary()
+    commands = cache.commands
+
+    drawn = [v.va_traces for v in commands.layers.values()]
+    drawn += [v.va_vias for v in commands.vias.values()]
+    drawn += [commands.multi.va_vias]
+    drawn += [v.va_outlines for v in commands.sides.values()]
+    drawn += [cache.airwire_va]
+
+    for va in drawn:
+        if va.count():
+            buffers.get(va)
+
+    return drawn
+
+
+class test_cad_cache_versions(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        build_random_board(self.p, 200)
+        top, bottom = self.p.stackup.layers
+        self.p.artwork.add_artwork(Airwire(Point2(0, 0), Point2(10, 10), top, bottom, self.p.nets.new()))
+
+        self.cache = CADCache(self.p)
+        self.buffers = VersionedBuffers(FakeBuffer)
+
+    def test_unchanged_frames(self):
+        drawn = _frame(self.cache, self.buffers)
+        first = self.buffers.uploads
+        version = self.cache.version
+
+        self.assertGreater(first, 0)
+        self.assertEqual(first, len([va for va in drawn if va.count()]))
+        for va in drawn:
+            self.assertIsNotNone(va.version)
+
+        for _ in range(5):
+            _frame(self.cache, self.buffers)
+
+        self.assertEqual(self.buffers.uploads, first)
+        self.assertEqual(self.cache.version, version)
+
+    def test_edit_uploads(self):
+        _frame(self.cache, self.buffers)
+        version = self.cache.version
+
+        trace = next(iter(self.p.artwork.traces))
+        self.p.artwork.add_artwork(Trace(trace.p0, Point2(trace.p0.x + 5, trace.p0.y), 3, trace.layer, trace.net))
+
+        uploads = self.buffers.uploads
+        drawn = _frame(self.cache, self.buffers)
+        self.assertGreater(self.cache.version, version)
+        self.assertGreater(self.buffers.uploads, uploads)
+
+        # The uploaded copy is current
+        va = self.cache.commands.layers[trace.layer].va_traces
+        self.assertEqual(self.buffers.get(va).data, bytes(va.buffer()[:]))
+
+        uploads = self.buffers.uploads
+        _frame(self.cache, self.buffers)
+        self.assertEqual(self.buffers.uploads, uploads)
+
+    def test_unversioned(self):
+        va = VA_xy(16)
+        va.add_line(0, 0, 1, 1)
+
+        a = self.buffers.get(va)
+        va.add_line(2, 2, 3, 3)
+        b = self.buffers.get(va)
+
+        self.assertIs(a, b)
+        self.assertEqual(self.buffers.uploads, 2)
+        self.assertEqual(b.data, bytes(va.buffer()[:]))
+
+
+@benchmark
+class test_cad_cache_versions_benchmark(unittest.TestCase):
+    def test_frame(self):
+        p = Project()
+        build_random_board(p, 200000)
+        cache = CADCache(p)
+        buffers = VersionedBuffers(FakeBuffer)
+        n_frames = 20
+
+        _frame(cache, buffers)
+        start = time.perf_counter()
+        for _ in range(n_frames):
+            _frame(cache, buffers)
+        t_cached = (time.perf_counter() - start) / n_frames
+
+        # Without versions every array is uploaded on every frame, as before
+        for va in _frame(cache, buffers):
+            va.version = None
+        start = time.perf_counter()
+        for _ in range(n_frames):
+            _frame(cache, buffers)
+        t_upload = (time.perf_counter() - start) / n_frames
+
+        bench_report("cad cache frame, %d objects: upload every frame %.2fms, versioned %.3fms" % (
+            len(list(p.artwork.get_all_artwork())), t_upload * 1000, t_cached * 1000))
+
+        self.assertLess(t_cached, t_upload)
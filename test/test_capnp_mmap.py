@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+import cv2
+import numpy
+
+from pcbre.model.project import Project, StorageType
+from pcbre.model.imagelayer import ImageLayer
+from pcbre.model.serialization import PersistentIDClass
+from pcbre.model.serialization_capnp import CapnpIO
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _add_image(p, data):
+    il = ImageLayer(p, p.unique_id_registry.generate(PersistentIDClass.ImageLayer), "scan", data)
+    p.imagery.add_imagelayer(il)
+    return il
+
+
+def _artwork_keys(p):
+    return sorted((type(g).__name__, g.bbox.left, g.bbox.bottom, g.bbox.right, g.bbox.top)
+                  for g in p.artwork.get_all_artwork())
+
+
+class test_capnp_mmap(unittest.TestCase):
+    def setUp(self):
+        self.__tmp = TemporaryDirectory()
+        self.path = os.path.join(self.__tmp.name, "board.pcbre")
+
+        self.p = Project()
+        build_random_board(self.p, 200)
+
+        ok, buf = cv2.imencode(".png", numpy.arange(64 * 48 * 3, dtype=numpy.uint8).reshape(48, 64, 3))
+        self.png = buf.tobytes()
+        _add_image(self.p, self.png)
+        _add_image(self.p, b"")
+
+        self.p.save(self.path, StorageType.Packed)
+
+    def tearDown(self):
+        self.__tmp.cleanup()
+
+    def test_matches_read(self):
+        mapped = Project.open(self.path, StorageType.Packed, use_mmap=True)
+        read = Project.open(self.path, StorageType.Packed)
+
+        self.assertEqual(_artwork_keys(mapped), _artwork_keys(read))
+        self.assertEqual(len(mapped.nets.nets), len(read.nets.nets))
+
+        il, empty = mapped.imagery.imagelayers
+        self.assertIsInstance(il.data, memoryview)
+        self.assertEqual(bytes(il.data), self.png)
+        self.assertEqual(bytes(empty.data), b"")
+        self.assertEqual(il.content_hash, read.imagery.imagelayers[0].content_hash)
+        self.assertEqual(il.shape, (48, 64))
+        self.assertEqual(il.decoded_image.shape, (48, 64, 3))
+
+    def test_save_over_mapped_file(self):
+        mapped = Project.open(self.path, StorageType.Packed, use_mmap=True)
+        mapped.save(self.path, StorageType.Packed)
+
+        # The old file was moved aside, so the views are still valid
+        self.assertEqual(bytes(mapped.imagery.imagelayers[0].data), self.png)
+
+        again = Project.open(self.path, StorageType.Packed, use_mmap=True)
+        self.assertEqual(bytes(again.imagery.imagelayers[0].data), self.png)
+        self.assertEqual(_artwork_keys(again), _artwork_keys(self.p))
+
+    def test_bad_magic(self):
+        with open(self.path, "r+b") as f:
+            f.write(b"X")
+        with self.assertRaises(ValueError):
+            CapnpIO.open_mmap(self.path)
+
+
+_PEAK_RSS_SCRIPT = """
+import sys
+from pcbre.model.project import Project, StorageType
+
+def peak_rss():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+before = peak_rss()
+p = Project.open(sys.argv[1], StorageType.Packed, use_mmap=sys.argv[2] == "1")
+print(peak_rss() - before)
+"""
+
+
+@unittest.skipUnless(os.path.exists("/proc/self/status"), "Needs /proc to measure peak resident memory")
+@benchmark
+class test_capnp_mmap_benchmark(unittest.TestCase):
+    def test_peak_rss(self):
+        image_bytes = 400 * 1024 * 1024
+        n_images = 3
+
+        p = Project()
+        build_random_board(p, 100000)
+        rng = numpy.random.default_rng(0)
+        for _ in range(n_images):
+            # Opening doesn't decode, so the payload needn't be a real image
+            _add_image(p, rng.integers(0, 255, image_bytes, dtype=numpy.uint8).tobytes())
+
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "board.pcbre")
+            p.save(path, StorageType.Packed)
+            del p
+
+            def measure(use_mmap):
+                out = subprocess.run([sys.executable, "-c", _PEAK_RSS_SCRIPT, path, "1" if use_mmap else "0"],
+                                     check=True, capture_output=True, text=True).stdout
+                return int(out.split()[-1])
+
+            rss_read = measure(False)
+            rss_mmap = measure(True)
+            file_size = os.path.getsize(path)
+
+        bench_report("packed open, %d MB file: peak RSS growth read %d MB, mmap %d MB" % (
+            file_size >> 20, rss_read >> 20, rss_mmap >> 20))
+
+        self.assertLess(rss_mmap, rss_read)
+        self.assertLess(rss_mmap, n_images * image_bytes)
@@ -0,0 +1,118 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from pcbre.model.project import Project
+from pcbre.model.artwork import Artwork
+from pcbre.model.serialization_dirtext import DirTextIO
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _groups(p):
+    return sorted(sorted((g.bbox.left, g.bbox.bottom) for g in p.artwork.get_geom_for_net(n))
+                  for n in p.nets.nets)
+
+
+class test_dirtext_checksum(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        build_random_board(self.p, 300)
+        self.p.artwork.rebuild_connectivity()
+
+        self.__tmp = TemporaryDirectory()
+        self.path = self.__tmp.name
+        DirTextIO.save_path(self.path, self.p)
+
+    def tearDown(self):
+        self.__tmp.cleanup()
+
+    def __open(self, **kwargs):
+        with mock.patch.object(Artwork, "rebuild_connectivity", autospec=True,
+                               side_effect=Artwork.rebuild_connectivity) as rebuild:
+            p = DirTextIO.open_path(self.path, **kwargs)
+        return p, rebuild.called
+
+    def test_pristine_skips_rebuild(self):
+        p, rebuilt = self.__open()
+        self.assertFalse(rebuilt)
+        self.assertEqual(_groups(p), _groups(self.p))
+
+    def test_edit_rebuilds(self):
+        with open(os.path.join(self.path, "artwork", "traces.txt"), "ab") as fd:
+            fd.write(b"# merged\n")
+
+        p, rebuilt = self.__open()
+        self.assertTrue(rebuilt)
+        self.assertEqual(_groups(p), _groups(self.p))
+
+    def test_nets_edit_rebuilds(self):
+        with open(os.path.join(self.path, "nets.txt"), "ab") as fd:
+            fd.write(b"# merged\n")
+
+        self.assertTrue(self.__open()[1])
+
+    def test_pristine_prunes_unused_nets(self):
+        self.p.nets.new()
+        DirTextIO.save_path(self.path, self.p)
+
+        p, rebuilt = self.__open()
+        self.assertFalse(rebuilt)
+        self.assertEqual(len(p.nets.nets), len(self.p.nets.nets) - 1)
+        self.assertEqual(_groups(p), [g for g in _groups(self.p) if g])
+
+    def test_missing_or_bad_checksum_rebuilds(self):
+        checksum_path = os.path.join(self.path, "checksum.txt")
+        with open(checksum_path, "wb") as fd:
+            fd.write(b"HASH: not_hex\n")
+        self.assertTrue(self.__open()[1])
+
+        os.unlink(checksum_path)
+        self.assertTrue(self.__open()[1])
+
+    def test_verify_touched_only(self):
+        path = os.path.join(self.path, "artwork", "traces.txt")
+        st = os.stat(path)
+
+        # Same size and mtime, different content. Only a full verify notices
+        with open(path, "rb") as fd:
+            lines = fd.readlines()
+        lines[0], lines[1] = lines[1], lines[0]
+        with open(path, "wb") as fd:
+            fd.writelines(lines)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        self.assertFalse(self.__open(verify_touched_only=True)[1])
+        self.assertTrue(self.__open()[1])
+
+        # A touched file is always hashed
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        self.assertTrue(self.__open(verify_touched_only=True)[1])
+
+
+@benchmark
+class test_dirtext_checksum_benchmark(unittest.TestCase):
+    def test_open(self):
+        p = Project()
+        build_random_board(p, 100000)
+        p.artwork.rebuild_connectivity()
+
+        with TemporaryDirectory() as path:
+            DirTextIO.save_path(path, p)
+
+            start = time.perf_counter()
+            DirTextIO.open_path(path)
+            t_verified = time.perf_counter() - start
+
+            os.unlink(os.path.join(path, "checksum.txt"))
+            start = time.perf_counter()
+            DirTextIO.open_path(path)
+            t_rebuild = time.perf_counter() - start
+
+        bench_report("dir format open, %d objects: checksum ok %.2fs, rebuild %.2fs" % (
+            len(p.artwork.traces) + len(p.artwork.vias), t_verified, t_rebuild))
+
+        self.assertLess(t_verified, t_rebuild)
@@ -0,0 +1,188 @@
+import os
+import time
+import unittest
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Airwire, Polygon
+import pcbre.model.serialization_dirtext as dirtext
+from pcbre.model.serialization_dirtext import DirTextIO, ParseError
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+FORMATS = {
+    "vias.txt": dirtext.VIA_FORMAT,
+    "traces.txt": dirtext.TRACE_FORMAT,
+    "airwires.txt": dirtext.AIRWIRE_FORMAT,
+    "polygons.txt": dirtext.POLYGON_FORMAT,
+}
+
+
+def _plain(v):
+    """Record values in a comparable form. Point2 has no equality"""
+    if isinstance(v, Point2):
+        return "pt", v.x, v.y
+    if isinstance(v, tuple):
+        return tuple(_plain(i) for i in v)
+    if isinstance(v, dirtext._Record):
+        return {k: _plain(i) for k, i in vars(v).items()}
+    return v
+
+
+def _parse(data, fmt, fast):
+    io = DirTextIO()
+    io.fast_parse = fast
+    try:
+        return [(line_no, _plain(rec)) for line_no, rec in io._read_records(BytesIO(data), "test", fmt)]
+    except Exception as e:
+        return type(e), str(e)
+
+
+def _build_board(p):
+    build_random_board(p, 300)
+    top, bottom = p.stackup.layers
+
+    square = [Point2(0, 0), Point2(1000, 0), Point2(1000, 1000), Point2(0, 1000)]
+    hole = [Point2(200, 200), Point2(400, 200), Point2(400, 400), Point2(200, 400)]
+    p.artwork.add_artwork(Polygon(top, square, [], p.nets.new()))
+    p.artwork.add_artwork(Polygon(bottom, [Point2(x + 5000, y) for x, y in square], [[Point2(x + 5000, y) for x, y in hole]], p.nets.new()))
+    p.artwork.add_artwork(Airwire(Point2(0, 0), Point2(-5, 7), top, bottom, p.nets.new()))
+
+    for n, name in enumerate(["plain", "with space", "q\"uote", "a,b", "⬡", "GND.1"]):
+        p.nets.nets[n].name = name
+    p.nets.nets[0].net_class = "power"
+
+
+class test_dirtext_fastparse(unittest.TestCase):
+    def test_saved_files(self):
+        p = Project()
+        _build_board(p)
+
+        with TemporaryDirectory() as path:
+            DirTextIO.save_path(path, p)
+
+            files = dict((name, os.path.join(path, "artwork", name)) for name in FORMATS)
+            for name, fmt in list(FORMATS.items()) + [("nets.txt", dirtext.NET_FORMAT)]:
+                with open(files.get(name, os.path.join(path, name)), "rb") as fd:
+                    data = fd.read()
+
+                fast = _parse(data, fmt, True)
+                self.assertIsInstance(fast, list, name)
+                self.assertGreater(len(fast), 0, name)
+                self.assertEqual(fast, _parse(data, fmt, False), name)
+
+            # Every artwork line matches the writer layout, and the general parser isn't needed
+            with mock.patch.object(dirtext, "parse_line_dict", side_effect=AssertionError) as general:
+                for name, fmt in FORMATS.items():
+                    with open(files[name], "rb") as fd:
+                        list(DirTextIO()._read_records(fd, name, fmt))
+                self.assertFalse(general.called)
+
+            p_new = DirTextIO.open_path(path)
+
+        self.assertEqual(len(p_new.artwork.polygons), 2)
+        self.assertEqual(sorted(len(poly.get_poly_repr().interiors) for poly in p_new.artwork.polygons), [0, 1])
+        self.assertEqual(len(p_new.artwork.airwires), 1)
+        self.assertEqual([n.name for n in p_new.nets.nets], [n.name for n in p.nets.nets])
+        self.assertEqual(p_new.nets.nets[0].net_class, "power")
+
+    def test_edge_lines(self):
+        lines = {
+            "traces.txt": [
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=5 layer=Layer_0x1 net=Net_0x2",
+                b"TRACE  p0 = ( -1 ,+2 )\tp1=(3,4)   thickness=05 layer=Layer_0x1 net=Net_0x2   # comment",
+                b"TRACE p1=(3, 4) p0=(1, 2) thickness=5 layer=Layer_0x1 net=Net_0x2",
+                b"TRACE p0=(1, 2)p1=(3, 4) thickness=5 layer=Layer_0x1 net=Net_0x2",
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=1_000 layer=Layer_0x1 net=Net_0x2",
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=5 layer=Layer_0x1 net=Net_0x2 extra=1",
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=5layer=Layer_0x1 net=Net_0x2",
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=5 layer=Layer_0x1 net=Net_0x2 net=Net_0x2",
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=5.5 layer=Layer_0x1 net=Net_0x2",
+                b"TRACE p0=(1, 2) p1=(3, 4) thickness=5 layer=Bogus_0x1 net=Net_0x2",
+                b"TRACE p0=(1, 2,) p1=(3, 4) thickness=5 layer=Layer_0x1 net=Net_0x2",
+                b"VIA center=(1, 2) radius=5 viapair=ViaPair_0x1 net=Net_0x2",
+            ],
+            "vias.txt": [
+                b"VIA center=(1, 2) radius=5 viapair=ViaPair_0x1 net=Net_0x2",
+                b"VIA center=(1, 2) radius=-5 viapair=ViaPair_0xAbC net=Net_0x2",
+                b"VIA center=(1, 2) radius=5 viapair=ViaPair_0x1 net=Net_0x2.1",
+            ],
+            "airwires.txt": [
+                b"AIRWIRE p0=(Layer_0x1, (0, 0)) p1=(Layer_0x2, (5, -5)) net=Net_0x3",
+                b"AIRWIRE p0=(Layer_0x1,(0,0)) p1=( Layer_0x2 , ( 5 , -5 ) ) net=Net_0x3",
+                b"AIRWIRE p0=(Layer_0x1, 0, 0) p1=(Layer_0x2, (5, -5)) net=Net_0x3",
+            ],
+            "polygons.txt": [
+                b"POLYGON layer=Layer_0x1 net=Net_0x2 exterior=((0, 0), (1, 0), (1, 1)) interior=()",
+                b"POLYGON layer=Layer_0x1 net=Net_0x2 exterior=((0, 0), (9, 0), (9, 9)) "
+                b"interior=(((1, 1), (2, 1), (2, 2)), ((3, 3),(4, 3), (4, 4)))",
+                b"POLYGON layer=Layer_0x1 net=Net_0x2 exterior=((0, 0), (1, 0), (1, 1)) interior=( )",
+                b"POLYGON layer=Layer_0x1 net=Net_0x2 exterior=() interior=()",
+                b"POLYGON layer=Layer_0x1 net=Net_0x2 exterior=((0, 0), (1, 0), (1, 1)) interior=(())",
+                b"POLYGON layer=Layer_0x1 net=Net_0x2 exterior=((0, 0), (1, 0), (1, 1)) interior=((1, 2))",
+                b"POLYGON net=Net_0x2 layer=Layer_0x1 exterior=((0, 0), (1, 0), (1, 1)) interior=()",
+            ],
+            "nets.txt": [
+                b"NET unique_id=Net_0x1 name=\"\" net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=GND net_class=power",
+                b"NET unique_id=Net_0x1 name=\"a b\" net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=\"a\\\"b\\n\" net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=\"(\" net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=\"=,\" net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=-5 net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=\"\xe2\xac\xa1\" net_class=\"\"",
+                b"NET unique_id=Net_0x1 name=\"open net_class=\"\"",
+            ],
+        }
+        formats = dict(FORMATS, **{"nets.txt": dirtext.NET_FORMAT})
+
+        for name, file_lines in lines.items():
+            for line in file_lines:
+                fast = _parse(line + b"\n", formats[name], True)
+                self.assertEqual(fast, _parse(line + b"\n", formats[name], False), line)
+
+        # Spot check a few results
+        p = _parse(lines["polygons.txt"][1], dirtext.POLYGON_FORMAT, True)[0][1]
+        self.assertEqual(p["interior"], ((("pt", 1, 1), ("pt", 2, 1), ("pt", 2, 2)),
+                                         (("pt", 3, 3), ("pt", 4, 3), ("pt", 4, 4))))
+        self.assertEqual(_parse(lines["polygons.txt"][2], dirtext.POLYGON_FORMAT, True)[0][1]["interior"], ())
+        self.assertEqual(_parse(lines["traces.txt"][1], dirtext.TRACE_FORMAT, True)[0][1]["p0"], ("pt", -1, 2))
+        self.assertEqual(_parse(lines["traces.txt"][11], dirtext.TRACE_FORMAT, True)[0], ParseError)
+
+    def test_empty_tuple(self):
+        self.assertEqual(dirtext.parse_line_dict(b"a=() b=(1, ()) c=( )", 0),
+                         {b"a": (), b"b": (b"1", ()), b"c": ()})
+
+
+@benchmark
+class test_dirtext_fastparse_benchmark(unittest.TestCase):
+    def test_lines_per_second(self):
+        p = Project()
+        build_random_board(p, 100000)
+
+        with TemporaryDirectory() as path:
+            DirTextIO.save_path(path, p)
+            with open(os.path.join(path, "artwork", "traces.txt"), "rb") as fd:
+                data = fd.read()
+
+        n_lines = data.count(b"\n")
+
+        def rate(fast):
+            io = DirTextIO()
+            io.fast_parse = fast
+            start = time.perf_counter()
+            for _ in io._read_records(BytesIO(data), "traces.txt", dirtext.TRACE_FORMAT):
+                pass
+            return n_lines / (time.perf_counter() - start)
+
+        rate_general = rate(False)
+        rate_fast = rate(True)
+
+        bench_report("traces.txt, %d lines: general parser %.0f lines/s, fast %.0f lines/s" % (
+            n_lines, rate_general, rate_fast))
+
+        self.assertGreater(rate_fast, rate_general)
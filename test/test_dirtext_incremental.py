@@ -0,0 +1,134 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import cv2
+import numpy
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork import Artwork
+from pcbre.model.artwork_geom import Trace
+from pcbre.model.imagelayer import ImageLayer
+from pcbre.model.serialization import PersistentIDClass
+from pcbre.model.serialization_dirtext import DirTextIO
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _snapshot(path):
+    """(inode, mtime) of every file under path, by relative path"""
+    files = {}
+    for dir_path, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(dir_path, name)
+            st = os.stat(full)
+            files[os.path.relpath(full, path)] = (st.st_ino, st.st_mtime_ns)
+    return files
+
+
+def _changed(before, after):
+    return set(k for k in set(before) | set(after) if before.get(k) != after.get(k))
+
+
+class test_dirtext_incremental(unittest.TestCase):
+    def setUp(self):
+        self.__tmp = TemporaryDirectory()
+        self.path = self.__tmp.name
+
+        self.p = Project()
+        build_random_board(self.p, 300)
+        ok, buf = cv2.imencode(".png", numpy.zeros((16, 16, 3), dtype=numpy.uint8))
+        self.p.imagery.add_imagelayer(ImageLayer(
+            self.p, self.p.unique_id_registry.generate(PersistentIDClass.ImageLayer), "scan", buf.tobytes()))
+        self.p.artwork.rebuild_connectivity()
+
+        DirTextIO.save_path(self.path, self.p)
+
+    def tearDown(self):
+        self.__tmp.cleanup()
+
+    def test_unchanged_save(self):
+        before = _snapshot(self.path)
+        DirTextIO.save_path(self.path, self.p)
+        self.assertEqual(_changed(before, _snapshot(self.path)), set())
+
+    def test_one_trace_edit(self):
+        trace = next(iter(self.p.artwork.traces))
+        moved = Trace(trace.p0, Point2(trace.p1.x + 1, trace.p1.y), trace.thickness, trace.layer, trace.net)
+        self.p.artwork.remove_artwork(trace)
+        self.p.artwork.add_artwork(moved)
+
+        before = _snapshot(self.path)
+        DirTextIO.save_path(self.path, self.p)
+        after = _snapshot(self.path)
+
+        self.assertEqual(_changed(before, after), {os.path.join("artwork", "traces.txt"), "checksum.txt"})
+
+        # Nothing left behind, and the stored net assignments are still trusted on open
+        self.assertFalse([k for k in after if k.endswith(".tmp")])
+        with mock.patch.object(Artwork, "rebuild_connectivity", autospec=True) as rebuild:
+            p_new = DirTextIO.open_path(self.path)
+            self.assertFalse(rebuild.called)
+        self.assertEqual(len(list(p_new.artwork.get_all_artwork())), len(list(self.p.artwork.get_all_artwork())))
+
+    def test_external_edit_rewritten(self):
+        nets_path = os.path.join(self.path, "nets.txt")
+        with open(nets_path, "rb") as fd:
+            nets = fd.read()
+        with open(nets_path, "wb") as fd:
+            fd.write(nets.replace(b"NET", b"NTE"))
+
+        DirTextIO.save_path(self.path, self.p)
+        with open(nets_path, "rb") as fd:
+            self.assertEqual(fd.read(), nets)
+
+    def test_failed_write_keeps_file(self):
+        traces_path = os.path.join(self.path, "artwork", "traces.txt")
+        with open(traces_path, "rb") as fd:
+            traces = fd.read()
+
+        write_record = DirTextIO._DirTextIO__write_record
+
+        def failing_write_record(io, fd, object_typestr, record):
+            if object_typestr == b"TRACE":
+                raise IOError("disk full")
+            write_record(io, fd, object_typestr, record)
+
+        with mock.patch.object(DirTextIO, "_DirTextIO__write_record", failing_write_record):
+            with self.assertRaises(IOError):
+                DirTextIO.save_path(self.path, self.p)
+
+        with open(traces_path, "rb") as fd:
+            self.assertEqual(fd.read(), traces)
+        self.assertFalse(os.path.exists(traces_path + ".tmp"))
+
+
+@benchmark
+class test_dirtext_incremental_benchmark(unittest.TestCase):
+    def test_resave(self):
+        p = Project()
+        build_random_board(p, 200000)
+        rng = numpy.random.default_rng(0)
+        for _ in range(2):
+            p.imagery.add_imagelayer(ImageLayer(p, p.unique_id_registry.generate(PersistentIDClass.ImageLayer),
+                                                "scan", rng.integers(0, 255, 200 << 20,
+                                                                     dtype=numpy.uint8).tobytes()))
+
+        with TemporaryDirectory() as path:
+            start = time.perf_counter()
+            DirTextIO.save_path(path, p)
+            t_first = time.perf_counter() - start
+
+            with mock.patch.object(os, "replace", wraps=os.replace) as replace:
+                start = time.perf_counter()
+                DirTextIO.save_path(path, p)
+                t_resave = time.perf_counter() - start
+
+        bench_report("dir save: first %.2fs, unchanged resave %.2fs" % (t_first, t_resave))
+
+        # Timing varies with the machine, the files rewritten don't
+        self.assertEqual(replace.call_count, 0)
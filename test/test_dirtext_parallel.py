@@ -0,0 +1,133 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import cv2
+import numpy
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork import Artwork
+from pcbre.model.artwork_geom import Airwire, Polygon
+from pcbre.model.imagelayer import ImageLayer
+import pcbre.model.serialization_dirtext as dirtext
+from pcbre.model.serialization import PersistentIDClass
+from pcbre.model.serialization_dirtext import DirTextIO, ParseError
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _artwork_keys(p):
+    def key(g):
+        k = (type(g).__name__, g.bbox.left, g.bbox.bottom, g.bbox.right, g.bbox.top, g.net.unique_id)
+        if isinstance(g, Polygon):
+            k += (len(g.get_poly_repr().interiors),)
+        return k
+
+    return sorted(key(g) for g in p.artwork.get_all_artwork())
+
+
+def _build_board(p, n):
+    build_random_board(p, n)
+    top, bottom = p.stackup.layers
+
+    square = [Point2(0, 0), Point2(1000, 0), Point2(1000, 1000), Point2(0, 1000)]
+    hole = [Point2(200, 200), Point2(400, 200), Point2(400, 400), Point2(200, 400)]
+    p.artwork.add_artwork(Polygon(top, square, [], p.nets.new()))
+    p.artwork.add_artwork(Polygon(bottom, square, [hole], p.nets.new()))
+    p.artwork.add_artwork(Airwire(Point2(0, 0), Point2(-5, 7), top, bottom, p.nets.new()))
+
+    for n in range(2):
+        ok, buf = cv2.imencode(".png", numpy.full((16, 16, 3), n, dtype=numpy.uint8))
+        p.imagery.add_imagelayer(ImageLayer(p, p.unique_id_registry.generate(PersistentIDClass.ImageLayer),
+                                            "scan%d" % n, buf.tobytes()))
+
+
+class test_dirtext_parallel(unittest.TestCase):
+    def setUp(self):
+        self.__tmp = TemporaryDirectory()
+        self.path = self.__tmp.name
+
+        self.p = Project()
+        _build_board(self.p, 500)
+        self.p.artwork.rebuild_connectivity()
+        DirTextIO.save_path(self.path, self.p)
+
+    def tearDown(self):
+        self.__tmp.cleanup()
+
+    def test_pack_unpack(self):
+        for name, fmt in dirtext.ARTWORK_FORMATS:
+            with open(os.path.join(self.path, "artwork", name), "rb") as fd:
+                records = [rec for _, rec in DirTextIO()._read_records(fd, name, fmt)]
+
+            arrays = dirtext.pack_records(fmt, records)
+            self.assertEqual(arrays.values.dtype, numpy.int64)
+
+            unpacked = list(dirtext.unpack_records(fmt, arrays))
+            self.assertEqual(len(unpacked), len(records), name)
+            for a, b in zip(records, unpacked):
+                self.assertEqual(repr(a), repr(b), name)
+
+        empty = dirtext.pack_records(dirtext.TRACE_FORMAT, [])
+        self.assertEqual(list(dirtext.unpack_records(dirtext.TRACE_FORMAT, empty)), [])
+
+    def test_matches_serial(self):
+        with mock.patch.object(Artwork, "rebuild_connectivity", autospec=True) as rebuild:
+            serial = DirTextIO.open_path(self.path)
+            parallel = DirTextIO.open_path(self.path, workers=4)
+            self.assertFalse(rebuild.called)
+
+        self.assertEqual(_artwork_keys(parallel), _artwork_keys(serial))
+        self.assertEqual(_artwork_keys(parallel), _artwork_keys(self.p))
+        self.assertEqual([n.unique_id for n in parallel.nets.nets], [n.unique_id for n in serial.nets.nets])
+
+        for a, b in zip(parallel.imagery.imagelayers, self.p.imagery.imagelayers):
+            self.assertEqual(a.data, b.data)
+            self.assertEqual(a.content_hash, b.content_hash)
+            self.assertEqual(a.name, b.name)
+
+    def test_edit_rebuilds(self):
+        with open(os.path.join(self.path, "artwork", "traces.txt"), "ab") as fd:
+            fd.write(b"# edited\n")
+
+        with mock.patch.object(Artwork, "rebuild_connectivity", autospec=True) as rebuild:
+            DirTextIO.open_path(self.path, workers=2)
+            self.assertTrue(rebuild.called)
+
+    def test_worker_error(self):
+        with open(os.path.join(self.path, "artwork", "polygons.txt"), "ab") as fd:
+            fd.write(b"POLYGON layer=(\n")
+
+        with self.assertRaises(ParseError):
+            DirTextIO.open_path(self.path, workers=2)
+
+
+@benchmark
+class test_dirtext_parallel_benchmark(unittest.TestCase):
+    def test_open(self):
+        workers = 4
+        if (os.cpu_count() or 1) < workers:
+            self.skipTest("needs a core per artwork file")
+
+        p = Project()
+        _build_board(p, 400000)
+
+        with TemporaryDirectory() as path:
+            DirTextIO.save_path(path, p)
+
+            def timed(**kwargs):
+                start = time.perf_counter()
+                DirTextIO.open_path(path, **kwargs)
+                return time.perf_counter() - start
+
+            t_serial = timed()
+            t_parallel = timed(workers=workers)
+
+        bench_report("dir open, %d objects: serial %.2fs, %d workers %.2fs" % (
+            len(list(p.artwork.get_all_artwork())), t_serial, workers, t_parallel))
+
+        self.assertLess(t_parallel, t_serial)
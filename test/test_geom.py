@@ -8,6 +8,9 @@ __author__ = 'davidc'
 
 from pcbre.algo.geom import *
 import unittest
+from unittest import mock
+
+import pcbre.algo.geom_batch
 
 
 class test_geom(unittest.TestCase):
@@ -17,6 +20,10 @@ class test_geom(unittest.TestCase):
             def all_layers(self):
                 return [1]
 
+            @property
+            def layer_mask(self):
+                return 1 << 1
+
         vp = FakeVP()
         v = Via(Point2(7,13), vp, 3, None)
         v1 = Via(Point2(-5, 6), vp, 7, None)
@@ -100,6 +107,15 @@ class test_aw_queries(unittest.TestCase):
         self.assertEqual(len(connected), 2)
 
 
+class test_aw_queries_batched(test_aw_queries):
+    """Same queries, with the vectorized distance path forced on"""
+    def setUp(self):
+        super(test_aw_queries_batched, self).setUp()
+        patcher = mock.patch.object(pcbre.algo.geom_batch, "BATCH_MIN", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
 class test_sequence(unittest.TestCase):
     def test_point_insert(self):
         p = Project()
@@ -0,0 +1,139 @@
+import math
+import random
+import sys
+import time
+import unittest
+from unittest import mock
+
+import numpy
+
+import pcbre.algo.geom_batch
+from pcbre.algo.geom import distance
+from pcbre.algo.geom_batch import GeomArrays, distances_to
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Trace, Via, Polygon
+from pcbre.model.const import SIDE
+from pcbre.model.dipcomponent import DIPComponent
+from pcbre.model.pad import Pad
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+class test_geom_batch(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.top = self.p.stackup.add_layer("top", (1, 0, 0))
+        self.mid = self.p.stackup.add_layer("mid", (0, 1, 0))
+        self.bottom = self.p.stackup.add_layer("bottom", (0, 0, 1))
+        self.vp_all = self.p.stackup.add_via_pair(self.top, self.bottom)
+        self.vp_top = self.p.stackup.add_via_pair(self.top, self.mid)
+
+    def __random_geoms(self, n, seed):
+        rng = random.Random(seed)
+        layers = [self.top, self.mid, self.bottom]
+        vps = [self.vp_all, self.vp_top]
+
+        # Parent for free-standing pads
+        cmp = DIPComponent(self.p, Point2(0, 0), 0, SIDE.Top, self.p, 4, 1000, 3000, 600)
+
+        geoms = list(cmp.get_pads())
+        for _ in range(n):
+            p0 = Point2(rng.uniform(0, 3000), rng.uniform(0, 3000))
+            r = rng.random()
+            if r < 0.4:
+                p1 = p0 + Point2(rng.uniform(-800, 800), rng.uniform(-800, 800))
+                geoms.append(Trace(p0, p1, rng.choice([10, 40, 100]), rng.choice(layers)))
+            elif r < 0.6:
+                # Zero length trace
+                geoms.append(Trace(p0, p0, 40, rng.choice(layers)))
+            elif r < 0.8:
+                geoms.append(Via(p0, rng.choice(vps), rng.uniform(20, 200)))
+            else:
+                w = rng.uniform(50, 400)
+                length = w if rng.random() < 0.5 else rng.uniform(50, 400)
+                th = rng.choice([0, 0, 30])
+                side = rng.choice([SIDE.Top, SIDE.Bottom])
+                geoms.append(Pad(cmp, "x", p0, rng.uniform(0, math.pi), w, length, th, side))
+
+        return geoms
+
+    def assertDistancesEqual(self, got, expected):
+        self.assertEqual(len(got), len(expected))
+        for g, e in zip(got, expected):
+            if math.isinf(e):
+                self.assertEqual(g, e)
+            else:
+                self.assertAlmostEqual(g, e, delta=1e-6 * max(1.0, abs(e)))
+
+    def test_all_pairs_match_scalar(self):
+        geoms = self.__random_geoms(150, seed=3)
+        arrays = GeomArrays(geoms)
+
+        ia, ib = numpy.meshgrid(numpy.arange(len(geoms)), numpy.arange(len(geoms)))
+        ia = ia.ravel()
+        ib = ib.ravel()
+
+        got = arrays.distances(ia, ib)
+        expected = [distance(geoms[a], geoms[b]) for a, b in zip(ia, ib)]
+        self.assertDistancesEqual(got.tolist(), expected)
+
+    def test_touching_is_exact(self):
+        # Pairs at exactly zero distance must be reported as touching on both paths
+        a = Trace(Point2(0, 0), Point2(100, 0), 10, self.top)
+        b = Trace(Point2(100, 10), Point2(200, 10), 10, self.top)
+        c = Via(Point2(0, 100), self.vp_all, 50)
+        d = Via(Point2(0, 200), self.vp_all, 50)
+        e = Trace(Point2(0, 0), Point2(100, 100), 10, self.top)
+        f = Trace(Point2(0, 100), Point2(100, 0), 10, self.top)
+
+        arrays = GeomArrays([a, b, c, d, e, f])
+        got = arrays.distances([0, 2, 4], [1, 3, 5]).tolist()
+        self.assertEqual(got, [distance(a, b), distance(c, d), distance(e, f)])
+        self.assertEqual(got, [0, 0, -10])
+
+    def test_scalar_fallback(self):
+        poly = Polygon(self.top, [Point2(0, 0), Point2(100, 0), Point2(100, 100)], [])
+        t = Trace(Point2(50, -50), Point2(50, 200), 10, self.top)
+        v = Via(Point2(300, 300), self.vp_all, 10)
+
+        arrays = GeomArrays([poly, t, v])
+        self.assertDistancesEqual(arrays.distances([0, 0, 1], [1, 2, 0]).tolist(),
+                                  [distance(poly, t), distance(poly, v), distance(t, poly)])
+
+    def test_distances_to(self):
+        geoms = self.__random_geoms(100, seed=4)
+        q = Trace(Point2(0, 0), Point2(3000, 3000), 100, self.top)
+        self.assertDistancesEqual(distances_to(q, geoms), [distance(q, g) for g in geoms])
+        self.assertEqual(distances_to(q, []), [])
+
+
+@benchmark
+class test_geom_batch_benchmark(unittest.TestCase):
+    def test_query_intersect(self):
+        p = Project()
+        build_random_board(p, 100000)
+        layer = p.stackup.layers[0]
+
+        # Long queries, so each has many bbox candidates
+        rng = random.Random(1)
+        extent = 100 * math.sqrt(len(p.artwork.traces) + len(p.artwork.vias))
+        queries = []
+        for _ in range(2000):
+            p0 = Point2(rng.uniform(0, extent), rng.uniform(0, extent))
+            queries.append(Trace(p0, p0 + Point2(3000, 3000), 40, layer))
+
+        def run():
+            start = time.perf_counter()
+            res = [len(p.artwork.query_intersect(q)) for q in queries]
+            return res, time.perf_counter() - start
+
+        batched, t_batched = run()
+        with mock.patch.object(pcbre.algo.geom_batch, "BATCH_MIN", sys.maxsize):
+            scalar, t_scalar = run()
+
+        bench_report("query_intersect: %d queries, batched %.3fs, scalar %.3fs" % (
+            len(queries), t_batched, t_scalar))
+
+        self.assertEqual(batched, scalar)
@@ -0,0 +1,230 @@
+import threading
+import time
+import unittest
+
+import cv2
+import numpy
+
+from pcbre.matrix import Point2, Rect
+from pcbre.model.project import Project
+from pcbre.model.imagelayer import ImageLayer
+from pcbre.model.imagepyramid import ImagePyramid, TileCache, image_shape
+from pcbre.model.serialization import PersistentIDClass
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+
+def _test_image(h, w):
+    y, x = numpy.mgrid[0:h, 0:w]
+    im = numpy.dstack([x % 256, y % 256, (x + y) % 256]).astype(numpy.uint8)
+    return im
+
+
+def _encode(im, ext):
+    ok, buf = cv2.imencode(ext, im)
+    assert ok
+    return buf.tobytes()
+
+
+def _layer(p, data):
+    return ImageLayer(p, p.unique_id_registry.generate(PersistentIDClass.ImageLayer), "scan", data)
+
+
+class test_image_shape(unittest.TestCase):
+    def test_headers(self):
+        im = _test_image(123, 457)
+        self.assertEqual(image_shape(_encode(im, ".png")), (123, 457))
+        self.assertEqual(image_shape(_encode(im, ".jpg")), (123, 457))
+        self.assertIsNone(image_shape(_encode(im, ".bmp")))
+
+
+class test_tile_cache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TileCache(budget=300)
+        tiles = {k: numpy.zeros(100, dtype=numpy.uint8) for k in "abcd"}
+        for k in "abc":
+            cache.put(k, tiles[k])
+        self.assertEqual(cache.nbytes, 300)
+
+        # Touch a, so b is the least recently used
+        self.assertIs(cache.get("a"), tiles["a"])
+        cache.put("d", tiles["d"])
+
+        self.assertNotIn("b", cache)
+        self.assertEqual(set(k for k in "abcd" if k in cache), {"a", "c", "d"})
+        self.assertEqual((cache.hits, cache.evictions), (1, 1))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.misses, 1)
+
+        # An oversize tile evicts everything else, but stays
+        cache.put("big", numpy.zeros(1000, dtype=numpy.uint8))
+        self.assertEqual(len(cache), 1)
+        self.assertIn("big", cache)
+
+
+class test_image_pyramid(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.im = _test_image(1100, 1500)
+
+    def __pyramid(self, cache_bytes=1 << 30):
+        il = _layer(self.p, _encode(self.im, ".png"))
+        return il, ImagePyramid(il.decode_level, il.shape, tile_size=256, cache=TileCache(cache_bytes))
+
+    def test_levels(self):
+        il, pyr = self.__pyramid()
+        self.assertEqual(il.shape, (1100, 1500))
+        self.assertEqual(pyr.levels, 4)
+        self.assertEqual(pyr.level_shape(1), (550, 750))
+        self.assertEqual(pyr.level_shape(3), (138, 188))
+        self.assertEqual(pyr.tile_grid(0), (5, 6))
+        self.assertEqual(pyr.tile_grid(3), (1, 1))
+
+        self.assertEqual([pyr.level_for_scale(s) for s in (0.5, 1, 1.9, 2, 5, 1000)], [0, 0, 0, 1, 2, 3])
+
+        # Shape from the header, without decoding
+        self.assertIsNone(il._ImageLayer__cached_decode)
+
+    def test_tiles_lazy(self):
+        il, pyr = self.__pyramid()
+        self.assertEqual(pyr.decodes, 0)
+
+        tiles = pyr.get_tiles(0, [(1, 0), (5, 4)])
+        self.assertEqual(pyr.decodes, 1)
+        numpy.testing.assert_array_equal(tiles[0].image, self.im[0:256, 256:512])
+        numpy.testing.assert_array_equal(tiles[1].image, self.im[1024:1100, 1280:1500])
+        self.assertEqual(tiles[1][3:7], (1280, 1024, 1500, 1100))
+
+        # Neighbours came from the same decode
+        pyr.get_tiles(0, [(0, 0), (2, 1)])
+        self.assertEqual(pyr.decodes, 1)
+
+        low = pyr.get_tiles(2, [(1, 1)])[0]
+        self.assertEqual(pyr.decodes, 2)
+        self.assertEqual(low.image.shape, (275 - 256, 375 - 256, 3))
+        self.assertEqual(low[3:7], (1024, 1024, 1500, 1100))
+
+    def test_cache_budget(self):
+        tile_bytes = 256 * 256 * 3
+        il, pyr = self.__pyramid(cache_bytes=4 * tile_bytes)
+
+        pyr.get_tiles(0, [(0, 0), (1, 0)])
+        self.assertLessEqual(pyr.cache.nbytes, pyr.cache.budget)
+        self.assertEqual(pyr.decodes, 1)
+
+        # Requested tiles survive the neighbours cached with them
+        pyr.get_tiles(0, [(0, 0), (1, 0)])
+        self.assertEqual(pyr.decodes, 1)
+
+        # Far away tiles weren't cached
+        pyr.get_tiles(0, [(5, 4)])
+        self.assertEqual(pyr.decodes, 2)
+
+    def test_view(self):
+        il, pyr = self.__pyramid()
+        # Image spans -1..1 in x, world units are normalized units scaled by 1000
+        n2w = numpy.diag([1000., 1000., 1.])
+
+        # Whole image at one screen pixel per 4 image pixels
+        level, tiles = pyr.view(n2w, Rect.from_points(Point2(-1000, -1000), Point2(1000, 1000)),
+                                4 * 2000 / 1500)
+        self.assertEqual(level, 2)
+        self.assertEqual(len(tiles), 4)
+
+        # Zoomed into the lower-left corner at full resolution
+        level, tiles = pyr.view(n2w, Rect.from_points(Point2(-1000, -733), Point2(-900, -633)), 2000 / 1500 / 2)
+        self.assertEqual(level, 0)
+        self.assertEqual([(t.tx, t.ty) for t in tiles], [(0, 0)])
+
+        # Off the image
+        self.assertEqual(pyr.view(n2w, Rect.from_points(Point2(5000, 5000), Point2(6000, 6000)), 1), (0, []))
+
+    def test_view_background(self):
+        il, pyr = self.__pyramid()
+        n2w = numpy.diag([1000., 1000., 1.])
+        rect = Rect.from_points(Point2(-1000, -733), Point2(-900, -633))
+        scale = 2000 / 1500 / 2
+
+        release = threading.Event()
+        decoded = []
+
+        def decode(level):
+            release.wait(10)
+            decoded.append(level)
+            return il.decode_level(level)
+
+        pyr = ImagePyramid(decode, il.shape, tile_size=256, cache=TileCache())
+
+        # Nothing is ready, so nothing is drawn, and the render thread doesn't decode
+        self.assertEqual(pyr.view(n2w, rect, scale, background=True), (0, []))
+        self.assertTrue(pyr.pending)
+        self.assertEqual(decoded, [])
+
+        release.set()
+        while pyr.pending:
+            pyr.poll()
+            time.sleep(0.01)
+
+        # The coarsest level was decoded first
+        self.assertEqual(decoded, [3, 0])
+
+        level, tiles = pyr.view(n2w, rect, scale, background=True)
+        self.assertEqual(level, 0)
+        numpy.testing.assert_array_equal(tiles[0].image, self.im[0:256, 0:256])
+        self.assertEqual(pyr.decodes, 2)
+
+        # Zooming out to a level that isn't ready falls back to the coarsest, which is cached
+        release.clear()
+        level, tiles = pyr.view(n2w, Rect.from_points(Point2(-1000, -1000), Point2(1000, 1000)),
+                                2 * 2000 / 1500, background=True)
+        self.assertEqual(level, 3)
+        self.assertEqual(len(tiles), 1)
+        release.set()
+
+        # Drawing the image off screen still collects the finished decode
+        off = Rect.from_points(Point2(5000, 5000), Point2(6000, 6000))
+        for _ in range(1000):
+            self.assertEqual(pyr.view(n2w, off, 1, background=True), (0, []))
+            if not pyr.pending:
+                break
+            time.sleep(0.01)
+        self.assertFalse(pyr.pending)
+
+    def test_jpeg_reduced_decode(self):
+        il = _layer(self.p, _encode(self.im, ".jpg"))
+        self.assertEqual(il.decode_level(2).shape, (275, 375, 3))
+        self.assertEqual(il.decode_level(5).shape, (35, 47, 3))
+
+        # Decoded data replaces the file
+        il.set_decoded_data(self.im[:500, :600])
+        self.assertEqual(il.pyramid.level_shape(0), (500, 600))
+
+
+@benchmark
+class test_image_pyramid_benchmark(unittest.TestCase):
+    def test_overview(self):
+        h, w = 15000, 20000
+        rng = numpy.random.default_rng(0)
+        im = cv2.resize(rng.integers(0, 255, (h // 16, w // 16, 3), dtype=numpy.uint8), (w, h))
+        data = _encode(im, ".jpg")
+        del im
+
+        p = Project()
+
+        start = time.perf_counter()
+        _layer(p, data).decoded_image
+        t_full = time.perf_counter() - start
+
+        il = _layer(p, data)
+        pyr = ImagePyramid(il.decode_level, il.shape, cache=TileCache())
+        start = time.perf_counter()
+        level, tiles = pyr.view(numpy.identity(3), Rect.from_points(Point2(-1, -1), Point2(1, 1)), 2 / 1000)
+        t_overview = time.perf_counter() - start
+
+        bench_report("image %dx%d: full decode %.2fs, overview (level %d, %d tiles) %.2fs" % (
+            w, h, t_full, level, len(tiles), t_overview))
+
+        self.assertGreater(level, 0)
+
+        self.assertLess(t_overview, t_full)
@@ -0,0 +1,84 @@
+import time
+import unittest
+from tempfile import TemporaryFile
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Trace, Via, Polygon
+from pcbre.model.serialization_capnp import CapnpIO
+from pcbre.algo.geom import distance
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def _poly_built(aw):
+    if isinstance(aw, Trace):
+        return aw._Trace__poly_repr is not None
+    return aw._Via__poly_repr is not None
+
+
+class test_lazy_poly_repr(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.top = self.p.stackup.add_layer("top", (1, 0, 0))
+        self.bottom = self.p.stackup.add_layer("bottom", (0, 0, 1))
+        self.vp = self.p.stackup.add_via_pair(self.top, self.bottom)
+
+    def test_built_on_demand(self):
+        t = Trace(Point2(0, 0), Point2(100, 0), 10, self.top)
+        v = Via(Point2(0, 0), self.vp, 10)
+        self.assertFalse(_poly_built(t))
+        self.assertFalse(_poly_built(v))
+
+        # Trace-via distance doesn't need the polygons
+        distance(t, v)
+        self.assertFalse(_poly_built(t))
+
+        poly = Polygon(self.top, [Point2(50, 0), Point2(200, 0), Point2(200, 200)], [])
+        self.assertLessEqual(distance(poly, t), 0)
+        self.assertTrue(_poly_built(t))
+
+        # Cached
+        self.assertIs(t.get_poly_repr(), t.get_poly_repr())
+        self.assertAlmostEqual(t.get_poly_repr().bounds[2], 105)
+
+    def test_drop(self):
+        build_random_board(self.p, 100)
+        for aw in self.p.artwork.get_all_artwork():
+            aw.get_poly_repr()
+
+        self.p.artwork.drop_poly_reprs()
+        self.assertFalse(any(_poly_built(aw) for aw in self.p.artwork.get_all_artwork()))
+
+        # Rebuilt on next use
+        v = next(iter(self.p.artwork.vias))
+        self.assertAlmostEqual(v.get_poly_repr().area, v.get_poly_repr().area)
+        self.assertTrue(_poly_built(v))
+
+
+@benchmark
+class test_lazy_poly_repr_benchmark(unittest.TestCase):
+    def test_load(self):
+        p = Project()
+        build_random_board(p, 50000)
+
+        with TemporaryFile(buffering=0) as fd:
+            CapnpIO.save_fd(p, fd)
+
+            fd.seek(0)
+            start = time.perf_counter()
+            p_new = CapnpIO.open_fd(fd)
+            t_load = time.perf_counter() - start
+
+        all_aw = list(p_new.artwork.get_all_artwork())
+        self.assertFalse(any(_poly_built(aw) for aw in all_aw))
+
+        # What the load used to pay up front
+        start = time.perf_counter()
+        for aw in all_aw:
+            aw.get_poly_repr()
+        t_poly = time.perf_counter() - start
+
+        bench_report("capnp load, %d objects: %.2fs, deferred shapely construction %.2fs" % (
+            len(all_aw), t_load, t_poly))
@@ -6,7 +6,7 @@ __author__ = 'davidc'
 import unittest
 from pcbre.model.project import Project
 from pcbre.model.artwork import Via
-from pcbre.model.artwork_geom import Airwire, Via
+from pcbre.model.artwork_geom import Airwire, Via, Trace
 from pcbre.model.serialization import PersistentIDClass
 from pcbre.model.stackup import Layer, ViaPair
 from pcbre.model.net import Net
@@ -61,3 +61,67 @@ class test_nets(unittest.TestCase):
 
 
 
+
+
+class test_net_index(unittest.TestCase):
+    def setUp(self):
+        self.p = Project.create()
+        self.l1 = self.p.stackup.add_layer("Top", (0, 0, 0))
+
+    def assertIndexConsistent(self):
+        for net in self.p.nets.nets:
+            expected = set(i for i in self.p.artwork.get_all_artwork() if i.net is net)
+            self.assertEqual(set(self.p.artwork.get_geom_for_net(net)), expected)
+
+    def test_merge_tracks_nets(self):
+        t1 = Trace(Point2(0, 0), Point2(100, 0), 10, self.l1)
+        t2 = Trace(Point2(200, 0), Point2(300, 0), 10, self.l1)
+        self.p.artwork.merge_artwork(t1)
+        self.p.artwork.merge_artwork(t2)
+        self.assertIsNot(t1.net, t2.net)
+        self.assertIndexConsistent()
+
+        # Bridge joins both nets
+        t3 = Trace(Point2(100, 0), Point2(200, 0), 10, self.l1)
+        self.p.artwork.merge_artwork(t3)
+        self.assertIs(t1.net, t2.net)
+        self.assertEqual(set(self.p.artwork.get_geom_for_net(t1.net)), {t1, t2, t3})
+        self.assertIndexConsistent()
+
+        # And removing the bridge splits them again
+        self.p.artwork.remove_artwork(t3)
+        self.assertIsNot(t1.net, t2.net)
+        self.assertEqual(list(self.p.artwork.get_geom_for_net(t1.net)), [t1])
+        self.assertEqual(list(self.p.artwork.get_geom_for_net(t2.net)), [t2])
+        self.assertIndexConsistent()
+
+    def test_merge_relabels_smaller(self):
+        big = [Trace(Point2(i * 10, 0), Point2(i * 10 + 10, 0), 2, self.l1) for i in range(10)]
+        for t in big:
+            self.p.artwork.merge_artwork(t)
+
+        small = Trace(Point2(0, 100), Point2(0, 200), 2, self.l1)
+        self.p.artwork.merge_artwork(small)
+
+        big_net = big[0].net
+        self.assertEqual(len(self.p.artwork.get_geom_for_net(big_net)), 10)
+
+        bridge = Trace(Point2(0, 0), Point2(0, 100), 2, self.l1)
+        self.p.artwork.merge_artwork(bridge)
+
+        self.assertIs(small.net, big_net)
+        self.assertIs(bridge.net, big_net)
+        self.assertIndexConsistent()
+
+    def test_removed_geom_unindexed(self):
+        t1 = Trace(Point2(0, 0), Point2(100, 0), 10, self.l1)
+        self.p.artwork.merge_artwork(t1)
+        net = t1.net
+
+        self.p.artwork.remove_artwork(t1)
+        self.assertEqual(len(self.p.artwork.get_geom_for_net(net)), 0)
+        self.assertNotIn(net, self.p.nets.nets)
+
+        # Geometry outside the artwork does not touch the index
+        t1.net = self.p.nets.new()
+        self.assertEqual(len(self.p.artwork.get_geom_for_net(t1.net)), 0)
@@ -0,0 +1,90 @@
+import time
+import unittest
+
+from pcbre.matrix import Point2
+from pcbre.model.artwork_geom import Trace, Via, Airwire
+from pcbre.model.const import SIDE
+from pcbre.model.dipcomponent import DIPComponent
+from pcbre.model.project import Project
+from test.common import benchmark, bench_report, build_random_board
+
+__author__ = 'davidc'
+
+
+def as_lists(groups):
+    return [sorted(id(i) for i in g) for g in groups]
+
+
+def net_members(p, geoms):
+    """Geometry of each net, by position in geoms"""
+    pos = {id(g): n for n, g in enumerate(geoms)}
+    return sorted(sorted(pos[id(g)] for g in p.artwork.get_geom_for_net(net)) for net in p.nets.nets)
+
+
+class test_parallel_connectivity(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.geoms = build_random_board(self.p, 3000)
+
+    def test_groups_identical(self):
+        all_geom = list(self.p.artwork.get_all_artwork())
+
+        serial = self.p.artwork.compute_connected(all_geom)
+        parallel = self.p.artwork.compute_connected(all_geom, workers=3)
+
+        self.assertEqual(as_lists(serial), as_lists(parallel))
+        self.assertLess(len(serial), len(all_geom))
+
+    def test_tile_edges(self):
+        # A long trace spans every tile, and a via grid sits on many tile boundaries
+        layer = self.p.stackup.layers[0]
+        vp = self.p.stackup.via_pairs[0]
+        self.p.artwork.add_artwork(Trace(Point2(0, 2000), Point2(5500, 2000), 40, layer, self.p.nets.new()))
+        for x in range(0, 5500, 250):
+            for y in range(0, 5500, 250):
+                self.p.artwork.add_artwork(Via(Point2(x, y), vp, 130, self.p.nets.new()))
+
+        all_geom = list(self.p.artwork.get_all_artwork())
+        for workers in (2, 5):
+            self.assertEqual(as_lists(self.p.artwork.compute_connected(all_geom)),
+                             as_lists(self.p.artwork.compute_connected(all_geom, workers=workers)))
+
+    def test_pads_airwires(self):
+        top, bottom = self.p.stackup.layers
+        cmp = DIPComponent(self.p, Point2(1000, 1000), 0, SIDE.Top, self.p, 8, 1000, 3000, 600)
+        self.p.artwork.merge_component(cmp)
+
+        self.p.artwork.merge_artwork(Airwire(Point2(0, 0), Point2(1000, 1000), top, top, None))
+
+        all_geom = list(self.p.artwork.get_all_artwork())
+        self.assertEqual(as_lists(self.p.artwork.compute_connected(all_geom)),
+                         as_lists(self.p.artwork.compute_connected(all_geom, workers=2)))
+
+    def test_rebuild_parallel(self):
+        ref = Project()
+        ref_geoms = build_random_board(ref, 3000)
+
+        self.p.artwork.rebuild_connectivity(workers=2)
+        ref.artwork.rebuild_connectivity()
+
+        self.assertEqual(net_members(self.p, self.geoms), net_members(ref, ref_geoms))
+
+
+@benchmark
+class test_parallel_connectivity_benchmark(unittest.TestCase):
+    def test_benchmark(self):
+        n = 200000
+        p = Project()
+        build_random_board(p, n, seed=2)
+        all_geom = list(p.artwork.get_all_artwork())
+
+        start = time.perf_counter()
+        serial = p.artwork.compute_connected(all_geom)
+        t_serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parallel = p.artwork.compute_connected(all_geom, workers=4)
+        t_parallel = time.perf_counter() - start
+
+        bench_report("connectivity %d segments: serial %.2fs, 4 workers %.2fs" % (n, t_serial, t_parallel))
+        self.assertEqual(as_lists(serial), as_lists(parallel))
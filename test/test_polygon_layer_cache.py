@@ -0,0 +1,147 @@
+import random
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+from pcbre.model.artwork_geom import Polygon
+import pcbre.view.cachedpolygonrenderer as cachedpolygonrenderer
+from pcbre.view.cachedpolygonrenderer import PolygonLayerCache
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+
+def _area(tris):
+    """Total area of (n, 3, 2) triangle corners"""
+    u, v = tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0]
+    return abs(u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]).sum() / 2
+
+
+def _tri_area(arrays):
+    return _area(arrays.vertices.astype(numpy.float64)[arrays.indices[:arrays.tri_count].reshape(-1, 3)])
+
+
+def _rings(arrays):
+    """Outline rings as lists of points"""
+    rings = [[]]
+    for i in arrays.indices[arrays.tri_count:]:
+        if i == PolygonLayerCache.RESTART_INDEX:
+            rings.append([])
+        else:
+            rings[-1].append(tuple(arrays.vertices[i]))
+    return rings[:-1]
+
+
+class test_polygon_layer_cache(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.layer = self.p.stackup.add_layer("top", (1, 0, 0))
+
+    def square(self, x, y, size=1000, holes=()):
+        pts = [Point2(x, y), Point2(x + size, y), Point2(x + size, y + size), Point2(x, y + size)]
+        return Polygon(self.layer, pts, [list(h) for h in holes], self.p.nets.new())
+
+    def test_arrays(self):
+        hole = [Point2(200, 200), Point2(400, 200), Point2(400, 400), Point2(200, 400)]
+        a = self.square(0, 0, holes=[hole])
+        b = self.square(1000, 0)
+
+        cache = PolygonLayerCache()
+        cache.add(a)
+        cache.add(b)
+        arrays = cache.arrays()
+
+        self.assertEqual(arrays.vertices.dtype, numpy.float32)
+        self.assertEqual(arrays.indices.dtype, numpy.uint32)
+        self.assertAlmostEqual(_tri_area(arrays), 1000 * 1000 - 200 * 200 + 1000 * 1000)
+
+        # The shared edge's points are only stored once
+        self.assertEqual(len(arrays.vertices), 10)
+
+        rings = sorted(_rings(arrays))
+        self.assertEqual(len(rings), 3)
+        for ring in rings:
+            self.assertEqual(ring[0], ring[-1])
+        self.assertIn({(200, 200), (400, 200), (400, 400), (200, 400)}, [set(r) for r in rings])
+
+    def test_version(self):
+        cache = PolygonLayerCache()
+        a, b = self.square(0, 0), self.square(5000, 0)
+        cache.add(a)
+
+        arrays = cache.arrays()
+        version = cache.version
+        self.assertIs(cache.arrays(), arrays)
+
+        cache.add(b)
+        self.assertGreater(cache.version, version)
+        self.assertAlmostEqual(_tri_area(cache.arrays()), 2 * 1000 * 1000)
+
+        # Removal doesn't triangulate anything again
+        version = cache.version
+        with mock.patch.object(cachedpolygonrenderer, "_triangulate", side_effect=AssertionError):
+            cache.remove(a)
+            arrays = cache.arrays()
+        self.assertGreater(cache.version, version)
+        self.assertAlmostEqual(_tri_area(arrays), 1000 * 1000)
+        self.assertEqual(len(_rings(arrays)), 1)
+
+        cache.remove(b)
+        empty = cache.arrays()
+        self.assertEqual((len(empty.vertices), len(empty.indices), empty.tri_count), (0, 0, 0))
+
+    def test_fallback_triangulation(self):
+        hole = [Point2(200, 200), Point2(400, 200), Point2(400, 400), Point2(200, 400)]
+        polys = [self.square(0, 0, holes=[hole]), self.square(3000, 0)]
+
+        bulk = cachedpolygonrenderer._triangulate(polys)
+        with mock.patch.object(cachedpolygonrenderer, "shapely", SimpleNamespace()):
+            single = cachedpolygonrenderer._triangulate(polys)
+
+        self.assertEqual(len(single), len(polys))
+        for a, b in zip(bulk, single):
+            self.assertAlmostEqual(_area(a), _area(b))
+
+
+@benchmark
+class test_polygon_layer_cache_benchmark(unittest.TestCase):
+    def test_frame(self):
+        p = Project()
+        layer = p.stackup.add_layer("top", (1, 0, 0))
+        rng = random.Random(0)
+        n = 20000
+
+        cache = PolygonLayerCache()
+        for _ in range(n):
+            x, y = rng.randrange(0, 10 ** 6), rng.randrange(0, 10 ** 6)
+            pts = [Point2(x, y), Point2(x + 500, y), Point2(x + 500, y + 300), Point2(x + 200, y + 600),
+                   Point2(x, y + 300)]
+            cache.add(Polygon(layer, pts, [], p.nets.new()))
+
+        start = time.perf_counter()
+        arrays = cache.arrays()
+        t_build = time.perf_counter() - start
+
+        # What each frame used to cost, just the copy out of Python lists
+        vertices = arrays.vertices.tolist()
+        indices = arrays.indices.tolist()
+        start = time.perf_counter()
+        ar = numpy.zeros(len(vertices), dtype=[("vertex", numpy.float32, 2)])
+        ar["vertex"] = vertices
+        numpy.array(indices[:arrays.tri_count] + indices[arrays.tri_count:], dtype=numpy.uint32)
+        t_copy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100):
+            cache.arrays()
+        t_cached = (time.perf_counter() - start) / 100
+
+        bench_report("polygon layer, %d polygons: build %.1fms, old per-frame copy %.2fms, unchanged frame %.4fms" % (
+            n, t_build * 1000, t_copy * 1000, t_cached * 1000))
+
+        self.assertLess(t_cached, t_copy)
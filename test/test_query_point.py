@@ -0,0 +1,125 @@
+import time
+import unittest
+from unittest import mock
+
+from pcbre.matrix import Point2
+from pcbre.model.project import Project
+import pcbre.model.artwork
+from pcbre.model.artwork_geom import Trace, Via, Airwire
+from pcbre.model.const import SIDE
+from pcbre.model.passivecomponent import Passive2Component, Passive2BodyType, PassiveSymType
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+
+N_QUERIES = 2000
+
+
+def build_grid(p, n_side, pitch=1000):
+    """Add an n_side x n_side grid of short, unconnected traces on the top layer"""
+    layer = p.stackup.layers[0]
+    for x in range(n_side):
+        for y in range(n_side):
+            t = Trace(Point2(x * pitch, y * pitch), Point2(x * pitch + pitch / 4, y * pitch), 10, layer,
+                      p.nets.new())
+            p.artwork.add_artwork(t)
+
+
+def query_grid(test, n_side):
+    """
+    Run N_QUERIES point queries over an n_side x n_side grid, each hitting one trace
+
+    :return: (elapsed seconds, exact point_inside tests run)
+    """
+    p = Project()
+    p.stackup.add_layer("top", (1, 0, 0))
+    build_grid(p, n_side)
+
+    pts = [Point2((i % n_side) * 1000 + 100, ((i * 7) % n_side) * 1000) for i in range(N_QUERIES)]
+
+    with mock.patch.object(pcbre.model.artwork, "point_inside", wraps=pcbre.model.artwork.point_inside) as m:
+        start = time.perf_counter()
+        for pt in pts:
+            test.assertEqual(len(p.artwork.query_point_multiple(pt)), 1)
+        elapsed = time.perf_counter() - start
+
+    return elapsed, m.call_count
+
+
+class test_query_point(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.top = self.p.stackup.add_layer("top", (1, 0, 0))
+        self.bottom = self.p.stackup.add_layer("bottom", (0, 0, 1))
+        self.vp = self.p.stackup.add_via_pair(self.top, self.bottom)
+
+    def test_miss(self):
+        build_grid(self.p, 4)
+        self.assertIsNone(self.p.artwork.query_point(Point2(500, 500)))
+        self.assertEqual(len(self.p.artwork.query_point_multiple(Point2(500, 500))), 0)
+
+    def test_bbox_hit_is_exact_tested(self):
+        # Point is inside the trace bbox, but not inside the trace
+        t = Trace(Point2(0, 0), Point2(1000, 1000), 10, self.top, self.p.nets.new())
+        self.p.artwork.add_artwork(t)
+
+        self.assertIs(self.p.artwork.query_point(Point2(500, 500)), t)
+        self.assertIsNone(self.p.artwork.query_point(Point2(900, 100)))
+
+    def test_pick_priority(self):
+        n = self.p.nets.new()
+        t = Trace(Point2(-1000, 0), Point2(1000, 0), 100, self.top, n)
+        self.p.artwork.add_artwork(t)
+
+        aw = Airwire(Point2(0, -1000), Point2(0, 1000), self.top, self.top, n)
+        self.p.artwork.add_artwork(aw)
+
+        v = Via(Point2(0, 0), self.vp, 50, n)
+        self.p.artwork.add_artwork(v)
+
+        cmp = Passive2Component(self.p, Point2(0, 0), 0, SIDE.Top, PassiveSymType.TYPE_RES,
+                                Passive2BodyType.CHIP, 1000, Point2(200, 200), Point2(300, 300), self.p)
+        self.p.artwork.merge_component(cmp)
+
+        res = self.p.artwork.query_point_multiple(Point2(0, 0))
+
+        self.assertEqual(res[:3], [v, aw, t])
+        self.assertIs(res[-1], cmp)
+        self.assertIs(self.p.artwork.query_point(Point2(0, 0)), v)
+
+    def test_insertion_order_tiebreak(self):
+        traces = []
+        for i in range(10):
+            t = Trace(Point2(-1000, i), Point2(1000, i), 100, self.top, self.p.nets.new())
+            self.p.artwork.add_artwork(t)
+            traces.append(t)
+
+        self.assertEqual(self.p.artwork.query_point_multiple(Point2(0, 0)), traces)
+
+    def test_removed_not_found(self):
+        t = Trace(Point2(0, 0), Point2(1000, 0), 10, self.top)
+        self.p.artwork.merge_artwork(t)
+        self.assertIs(self.p.artwork.query_point(Point2(500, 0)), t)
+
+        self.p.artwork.remove_artwork(t)
+        self.assertIsNone(self.p.artwork.query_point(Point2(500, 0)))
+
+    def test_exact_tests_independent_of_size(self):
+        # Exact tests are only run against bbox candidates, so there's one per query whatever the board size
+        for n_side in (10, 100):
+            _, calls = query_grid(self, n_side)
+            self.assertEqual(calls, N_QUERIES)
+
+
+@benchmark
+class test_query_point_benchmark(unittest.TestCase):
+    def test_query_cost_flat(self):
+        t_small, _ = query_grid(self, 10)
+        t_large, _ = query_grid(self, 100)
+
+        bench_report("query_point_multiple: %d queries, 100 objs %.3fs, 10k objs %.3fs" % (
+            N_QUERIES, t_small, t_large))
+
+        # 100x the objects must not be anywhere near 100x the time
+        self.assertLess(t_large, t_small * 10)
@@ -4,6 +4,8 @@ import pcbre.algo.skyline as S
 import unittest
 import numpy
 
+from test.common import benchmark, bench_report
+
 
 def splitright(node, left, rightheight):
     """
@@ -160,3 +162,99 @@ class TestSkyline(unittest.TestCase):
                 ar[y0:y1, x0:x1] = 1
             else:
                 break
+
+
+def _reference_find(s, width, height):
+    """Lowest, then leftmost, fit found by walking every start"""
+    nodes = list(s.first_iter())
+    best = None
+    for i, node in enumerate(nodes):
+        if node.left + width > s.width:
+            continue
+        y = max(n.height for n in nodes[i:] if n.left < node.left + width or n is node)
+        if y + height <= s.height and (best is None or y < best[1]):
+            best = node.left, y
+    return best
+
+
+def _assert_packed(test, s, rects, positions):
+    ar = numpy.zeros((s.height, s.width), numpy.uint8)
+    for (w, h), (x0, y0) in zip(rects, positions):
+        test.assertTrue(x0 + w <= s.width and y0 + h <= s.height)
+        test.assertFalse(ar[y0:y0 + h, x0:x0 + w].any())
+        ar[y0:y0 + h, x0:x0 + w] = 1
+
+
+class TestSkylineIndexed(unittest.TestCase):
+    def test_find_matches_reference(self):
+        import random
+        r = random.Random(1)
+
+        s = S.SkyLine(256, 256)
+        while True:
+            w, h = r.randint(1, 40), r.randint(1, 40)
+            for qw in (1, 7, 30, 100, 256):
+                cand = s.find(qw, 5)
+                ref = _reference_find(s, qw, 5)
+                self.assertEqual(None if cand is None else (cand.node.left, cand.height), ref)
+
+            if s.pack(w, h) is None:
+                break
+
+    def test_pack_multiple_matches_unindexed(self):
+        import random
+        r = random.Random(2)
+        rects = [(r.randint(1, 30), r.randint(1, 30)) for _ in range(300)]
+
+        s = S.SkyLine(512, 512)
+        positions = s.pack_multiple(rects)
+        _assert_packed(self, s, rects, positions)
+
+        # The same choices, finding every remaining rect again after each placement
+        ref = S.SkyLine(512, 512)
+        left = list(enumerate(rects))
+        expected = [None] * len(rects)
+        while left:
+            scores = []
+            for k, (n, (w, h)) in enumerate(left):
+                cand = ref.find(w, h)
+                if cand is not None:
+                    scores.append((cand.height + h, cand.wasted_width, k, cand))
+            top, _, k, cand = min(scores, key=lambda x: x[:3])
+            n, (w, h) = left.pop(k)
+            ref.split(cand.node, cand.node.left + w, cand.height + h)
+            expected[n] = cand.node.left, cand.height
+
+        self.assertEqual(positions, expected)
+
+    def test_pack_multiple_full(self):
+        s = S.SkyLine(16, 16)
+        self.assertEqual(s.pack_multiple([]), [])
+        with self.assertRaises(ValueError):
+            s.pack_multiple([(8, 8)] * 5)
+
+
+@benchmark
+class TestSkylineBenchmark(unittest.TestCase):
+    def test_pack_multiple(self):
+        import random
+        import time
+
+        r = random.Random(0)
+        rects = [(r.randint(4, 40), r.randint(4, 40)) for _ in range(10000)]
+
+        s = S.SkyLine(4096, 4096)
+        start = time.perf_counter()
+        positions = s.pack_multiple(rects)
+        t_multiple = time.perf_counter() - start
+
+        s_single = S.SkyLine(4096, 4096)
+        start = time.perf_counter()
+        for w, h in rects:
+            s_single.pack(w, h)
+        t_single = time.perf_counter() - start
+
+        bench_report("skyline, %d sprites: pack_multiple %.2fs, pack one at a time %.2fs" % (
+            len(rects), t_multiple, t_single))
+
+        _assert_packed(self, s, rects, positions)
@@ -0,0 +1,100 @@
+import time
+import unittest
+
+from pcbre.model.project import Project, StorageType
+from pcbre.matrix import Point2
+from pcbre.model.artwork_geom import Trace, Via
+from pcbre.algo.geom import dist_via_trace, dist_via_via
+from test.common import benchmark, bench_report, build_random_board, saverestore
+
+__author__ = 'davidc'
+
+
+class test_stackup_cache(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.layers = [self.p.stackup.add_layer("l%d" % i, (1, 1, 1)) for i in range(4)]
+        self.vp = self.p.stackup.add_via_pair(self.layers[2], self.layers[0])
+
+    def test_masks(self):
+        l0, l1, l2, l3 = self.layers
+        self.assertEqual([i.mask for i in self.layers], [1, 2, 4, 8])
+        self.assertEqual(self.vp.layer_mask, 0b111)
+        self.assertEqual(self.vp.layers, (l0, l2))
+        self.assertEqual(self.vp.all_layers, [l0, l1, l2])
+
+        other = Project().stackup.add_layer("x", (1, 1, 1))
+        self.assertEqual(self.p.stackup._layer_mask(other), 0)
+        with self.assertRaises(ValueError):
+            self.p.stackup._order_for_layer(other)
+
+    def test_invalidate_on_reorder(self):
+        l0, l1, l2, l3 = self.layers
+        self.assertEqual(self.vp.layer_mask, 0b111)
+
+        self.p.stackup.set_layer_order(l3, 0)
+        self.assertEqual(l3.order, 0)
+        self.assertEqual(l0.order, 1)
+        self.assertEqual(self.vp.layer_mask, 0b1110)
+        self.assertEqual(self.vp.all_layers, [l0, l1, l2])
+
+    def test_invalidate_on_add_remove(self):
+        l0, l1, l2, l3 = self.layers
+        self.p.stackup.remove_layer(l1)
+        self.assertEqual(self.vp.all_layers, [l0, l2])
+        self.assertEqual(l3.order, 2)
+
+        l4 = self.p.stackup.add_layer("l4", (1, 1, 1))
+        self.assertEqual(l4.mask, 8)
+
+    def test_invalidate_on_viapair_change(self):
+        l0, l1, l2, l3 = self.layers
+        self.assertEqual(self.vp.layer_mask, 0b111)
+
+        self.vp.layers = (l1, l3)
+        self.assertEqual(self.vp.layers, (l1, l3))
+        self.assertEqual(self.vp.layer_mask, 0b1110)
+
+    def test_distance_layer_checks(self):
+        l0, l1, l2, l3 = self.layers
+        v = Via(Point2(0, 0), self.vp, 10)
+        self.assertLess(dist_via_trace(v, Trace(Point2(0, 0), Point2(10, 0), 1, l1)), 0)
+        self.assertEqual(dist_via_trace(v, Trace(Point2(0, 0), Point2(10, 0), 1, l3)), float("inf"))
+
+        vp_low = self.p.stackup.add_via_pair(l3, l2)
+        self.assertLess(dist_via_via(v, Via(Point2(0, 0), vp_low, 10)), 0)
+        vp_bottom = self.p.stackup.add_via_pair(l3, self.p.stackup.add_layer("l4", (1, 1, 1)))
+        self.assertEqual(dist_via_via(v, Via(Point2(0, 0), vp_bottom, 10)), float("inf"))
+
+    def test_after_load(self):
+        for mode in (StorageType.Packed, StorageType.Dir):
+            p_new = saverestore(self.p, mode)
+            vp = p_new.stackup.via_pairs[0]
+            self.assertEqual([i.name for i in vp.all_layers], ["l0", "l1", "l2"])
+            self.assertEqual(vp.layer_mask, 0b111)
+
+
+@benchmark
+class test_stackup_cache_benchmark(unittest.TestCase):
+    def test_multilayer_rebuild(self):
+        p = Project()
+        layers = [p.stackup.add_layer("l%d" % i, (1, 1, 1)) for i in range(8)]
+        p.stackup.add_via_pair(layers[0], layers[7])
+        p.stackup.add_via_pair(layers[1], layers[4])
+        build_random_board(p, 50000, seed=2)
+
+        vias = list(p.artwork.vias)
+        traces = list(p.artwork.traces)
+        pairs = [(vias[i % len(vias)], traces[i % len(traces)]) for i in range(500000)]
+
+        start = time.perf_counter()
+        for v, t in pairs:
+            dist_via_trace(v, t)
+        t_dist = time.perf_counter() - start
+
+        start = time.perf_counter()
+        p.artwork.rebuild_connectivity()
+        t_rebuild = time.perf_counter() - start
+
+        bench_report("8 layer board: %d dist_via_trace %.2fs, rebuild_connectivity %.2fs" % (
+            len(pairs), t_dist, t_rebuild))
@@ -0,0 +1,101 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import numpy
+import pkg_resources
+
+import pcbre.ui.gl.textatlas as textatlas
+from pcbre.ui.gl.textatlas import SDFTextAtlas, _ATLAS_FIELDS
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+FONT = pkg_resources.resource_filename('pcbre.resources', 'Vera.ttf')
+
+
+def _entries(atlas):
+    return {k: tuple(getattr(v, f) for f in _ATLAS_FIELDS) for k, v in atlas.atlas.items()}
+
+
+class test_textatlas_cache(unittest.TestCase):
+    def setUp(self):
+        self.__tmp = TemporaryDirectory()
+        self.__env = mock.patch.dict(os.environ, {"PCBRE_CACHE_DIR": self.__tmp.name})
+        self.__env.start()
+
+    def tearDown(self):
+        self.__env.stop()
+        self.__tmp.cleanup()
+
+    def test_warm_matches_cold(self):
+        cold = SDFTextAtlas(FONT)
+        path = textatlas.atlasCachePath(FONT, cold.margin, cold.packer.width)
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(path.startswith(self.__tmp.name))
+
+        # No glyph is generated on a warm start
+        with mock.patch.object(textatlas, "distance_transform_bitmap", side_effect=AssertionError):
+            warm = SDFTextAtlas(FONT)
+
+        self.assertTrue(numpy.array_equal(warm.image, cold.image))
+        self.assertEqual(_entries(warm), _entries(cold))
+
+        # Glyphs added afterwards land in the same free space, rather than over the cached ones
+        for atlas in (cold, warm):
+            atlas.addGlyph("é")
+        self.assertTrue(numpy.array_equal(warm.image, cold.image))
+        self.assertEqual(_entries(warm), _entries(cold))
+
+    def test_bad_cache_regenerated(self):
+        cold = SDFTextAtlas(FONT)
+        path = textatlas.atlasCachePath(FONT, cold.margin, cold.packer.width)
+        with open(path, "wb") as fd:
+            fd.write(b"not an atlas")
+
+        with mock.patch.object(textatlas, "distance_transform_bitmap",
+                               wraps=textatlas.distance_transform_bitmap) as dt:
+            again = SDFTextAtlas(FONT, workers=1)
+            self.assertTrue(dt.called)
+
+        self.assertTrue(numpy.array_equal(again.image, cold.image))
+
+        # And the regenerated atlas was stored again
+        self.assertIsNotNone(textatlas.loadCached(path, cold.packer.width))
+        self.assertFalse([n for n in os.listdir(os.path.dirname(path)) if n.endswith(".tmp")])
+
+    def test_stale_removed(self):
+        glyphs = os.path.join(self.__tmp.name, "glyphs")
+        os.makedirs(glyphs)
+        for name in ("sdf-old.npz", "other.txt"):
+            with open(os.path.join(glyphs, name), "wb") as fd:
+                fd.write(b"x")
+
+        atlas = SDFTextAtlas(FONT)
+        path = textatlas.atlasCachePath(FONT, atlas.margin, atlas.packer.width)
+        self.assertEqual(sorted(os.listdir(glyphs)), sorted([os.path.basename(path), "other.txt"]))
+
+    def test_key(self):
+        a = textatlas.atlasCachePath(FONT, 3, 1024)
+        self.assertEqual(a, textatlas.atlasCachePath(FONT, 3, 1024))
+        self.assertNotEqual(a, textatlas.atlasCachePath(FONT, 4, 1024))
+        with mock.patch.object(textatlas, "PRESCALE", 2):
+            self.assertNotEqual(a, textatlas.atlasCachePath(FONT, 3, 1024))
+
+
+@benchmark
+class test_textatlas_cache_benchmark(unittest.TestCase):
+    def test_startup(self):
+        with TemporaryDirectory() as path, mock.patch.dict(os.environ, {"PCBRE_CACHE_DIR": path}):
+            start = time.perf_counter()
+            SDFTextAtlas(FONT)
+            t_cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            SDFTextAtlas(FONT)
+            t_warm = time.perf_counter() - start
+
+        bench_report("sdf atlas: cold start %.1fms, warm start %.1fms" % (t_cold * 1000, t_warm * 1000))
+        self.assertLess(t_warm, t_cold)
@@ -0,0 +1,123 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import numpy
+import pkg_resources
+
+from pcbre.ui.gl.textatlas import SDFTextAtlas, _ATLAS_FIELDS
+from pcbre.ui.gl.textrender import TextRender
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+FONT = pkg_resources.resource_filename('pcbre.resources', 'Vera.ttf')
+
+
+def _entries(atlas):
+    return {k: tuple(getattr(v, f) for f in _ATLAS_FIELDS) for k, v in atlas.atlas.items()}
+
+
+def _wait(atlas, timeout=30):
+    end = time.monotonic() + timeout
+    while atlas.pending:
+        if time.monotonic() > end:
+            raise AssertionError("glyphs not generated")
+        atlas.poll()
+        time.sleep(0.01)
+
+
+class test_textatlas_parallel(unittest.TestCase):
+    def setUp(self):
+        # No cached atlas, every atlas is generated from scratch
+        self.__tmp = TemporaryDirectory()
+        self.__env = mock.patch.dict(os.environ, {"PCBRE_CACHE_DIR": self.__tmp.name})
+        self.__env.start()
+        self.__cache = mock.patch("pcbre.ui.gl.textatlas.loadCached", return_value=None)
+        self.__cache.start()
+
+    def tearDown(self):
+        self.__cache.stop()
+        self.__env.stop()
+        self.__tmp.cleanup()
+
+    def test_matches_serial(self):
+        serial = SDFTextAtlas(FONT, workers=1)
+        parallel = SDFTextAtlas(FONT, workers=3)
+
+        self.assertEqual(_entries(parallel), _entries(serial))
+        self.assertEqual(parallel.image.tobytes(), serial.image.tobytes())
+
+        extra = "àéîõü€"
+        serial.addGlyphs(extra)
+        parallel.addGlyphs(extra)
+        self.assertEqual(_entries(parallel), _entries(serial))
+        self.assertEqual(parallel.image.tobytes(), serial.image.tobytes())
+        parallel.close()
+
+    def test_background_glyph(self):
+        atlas = SDFTextAtlas(FONT, workers=2)
+        serial = SDFTextAtlas(FONT, workers=1)
+        image = atlas.image.copy()
+
+        generation = atlas.generation
+        ph = atlas.getGlyph("é")
+        self.assertTrue(ph.placeholder)
+        self.assertTrue(atlas.pending)
+        self.assertEqual((ph.sx, ph.sy, ph.tx, ph.ty), (0, 0, 0, 0))
+
+        # Laid out like the real glyph
+        real = serial.getGlyph("é")
+        self.assertEqual((ph.w, ph.h, ph.l, ph.t, ph.hb), (real.w, real.h, real.l, real.t, real.hb))
+
+        # Asking again doesn't start another
+        self.assertIs(atlas.getGlyph("é"), ph)
+        self.assertNotIn("é", atlas.atlas)
+        self.assertTrue(numpy.array_equal(atlas.image, image))
+
+        _wait(atlas)
+        self.assertFalse(atlas.getGlyph("é").placeholder)
+        self.assertEqual(atlas.generation, generation + 1)
+        self.assertEqual(_entries(atlas), _entries(serial))
+        self.assertEqual(atlas.image.tobytes(), serial.image.tobytes())
+
+        # Generated on a thread, which stops once nothing is pending. No worker processes are started for it
+        self.assertIsNone(atlas._SDFTextAtlas__executor)
+        self.assertIsNone(atlas._SDFTextAtlas__glyph_thread)
+        atlas.close()
+
+    def test_placeholder_strings_not_kept(self):
+        atlas = SDFTextAtlas(FONT, workers=2)
+        tr = TextRender(None, atlas)
+
+        a = tr.getStringMetrics("aé")
+        self.assertIsNot(tr.getStringMetrics("aé"), a)
+
+        _wait(atlas)
+        b = tr.getStringMetrics("aé")
+        self.assertIs(tr.getStringMetrics("aé"), b)
+        atlas.close()
+
+
+@benchmark
+class test_textatlas_parallel_benchmark(unittest.TestCase):
+    def test_cold_start(self):
+        workers = min(os.cpu_count() or 1, 8)
+        if workers < 4:
+            self.skipTest("needs a few cores")
+
+        with TemporaryDirectory() as path, mock.patch.dict(os.environ, {"PCBRE_CACHE_DIR": path}), \
+                mock.patch("pcbre.ui.gl.textatlas.loadCached", return_value=None):
+            start = time.perf_counter()
+            SDFTextAtlas(FONT, workers=1)
+            t_serial = time.perf_counter() - start
+
+            start = time.perf_counter()
+            SDFTextAtlas(FONT, workers=workers)
+            t_parallel = time.perf_counter() - start
+
+        bench_report("sdf atlas cold start: serial %.1fms, %d workers %.1fms" % (t_serial * 1000, workers,
+                                                                                t_parallel * 1000))
+        self.assertLess(t_parallel, t_serial)
@@ -0,0 +1,147 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import cv2
+import numpy
+
+import pcbre.model.imagelayer
+import pcbre.model.imagepyramid
+from pcbre.matrix import Point2, Rect
+from pcbre.model.project import Project
+from pcbre.model.imagelayer import ImageLayer
+from pcbre.model.imagepyramid import ImagePyramid, TileCache
+from pcbre.model.serialization import PersistentIDClass
+from pcbre.model.serialization_dirtext import DirTextIO
+from pcbre.model.tilestore import TileStore
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+
+def _layer(p, im):
+    ok, buf = cv2.imencode(".png", im)
+    assert ok
+    return ImageLayer(p, p.unique_id_registry.generate(PersistentIDClass.ImageLayer), "scan", buf.tobytes())
+
+
+class test_tilestore(unittest.TestCase):
+    def setUp(self):
+        self.__tmp = TemporaryDirectory()
+        self.store = TileStore(self.__tmp.name)
+        self.p = Project()
+
+        rng = numpy.random.default_rng(0)
+        self.im = rng.integers(0, 255, (700, 900, 3), dtype=numpy.uint8)
+
+    def tearDown(self):
+        self.__tmp.cleanup()
+
+    def test_save_load(self):
+        self.assertIsNone(self.store.load("abc", 0, 256, (700, 900)))
+
+        self.store.save("abc", 0, 256, self.im)
+        tiles = self.store.load("abc", 0, 256, (700, 900))
+        self.assertEqual(tiles.shape, (3, 4, 256, 256, 3))
+        self.assertIsInstance(tiles, numpy.memmap)
+        numpy.testing.assert_array_equal(tiles[2, 3, :700 - 512, :900 - 768], self.im[512:, 768:])
+        self.assertFalse(tiles[2, 3, 700 - 512:].any())
+
+        # Wrong shape is a miss
+        self.assertIsNone(self.store.load("abc", 0, 256, (701, 900)))
+        self.assertIsNone(self.store.load("abc", 0, 128, (700, 900)))
+
+    def test_collect_lru(self):
+        for n, key in enumerate(("a", "b", "c")):
+            self.store.save(key, 0, 256, self.im)
+            entry = os.path.join(self.store.root, "v%d" % TileStore.VERSION, key)
+            os.utime(entry, (1000 + n, 1000 + n))
+
+        size = self.store.nbytes() // 3
+
+        # a is least recently stored, but was used since
+        self.assertIsNotNone(self.store.load("a", 0, 256, (700, 900)))
+
+        self.store.max_bytes = 2 * size
+        self.store.collect()
+        self.assertIsNone(self.store.load("b", 0, 256, (700, 900)))
+        self.assertIsNotNone(self.store.load("c", 0, 256, (700, 900)))
+
+        # The entry being written is kept even if it alone is over the limit
+        self.store.max_bytes = size // 2
+        self.store.collect(keep="c")
+        self.assertIsNotNone(self.store.load("c", 0, 256, (700, 900)))
+        self.assertIsNone(self.store.load("a", 0, 256, (700, 900)))
+
+    def test_pyramid_warm(self):
+        il = _layer(self.p, self.im)
+
+        def pyramid():
+            return ImagePyramid(il.decode_level, il.shape, tile_size=256, cache=TileCache(),
+                                key=il.content_hash, store=self.store)
+
+        cold = pyramid()
+        cold_tiles = cold.get_tiles(0, [(0, 0), (3, 2)])
+        self.assertEqual((cold.decodes, cold.loads), (1, 0))
+
+        warm = pyramid()
+        warm_tiles = warm.get_tiles(0, [(0, 0), (3, 2)])
+        self.assertEqual((warm.decodes, warm.loads), (0, 1))
+        for a, b in zip(cold_tiles, warm_tiles):
+            self.assertEqual(a[:7], b[:7])
+            numpy.testing.assert_array_equal(a.image, b.image)
+
+        # Coarser levels were stored from the level 0 decode
+        warm.get_tiles(2, [(0, 0)])
+        self.assertEqual((warm.decodes, warm.loads), (0, 2))
+
+        with self.assertRaises(ValueError):
+            ImagePyramid(il.decode_level, il.shape, store=self.store)
+
+    def test_layer_uses_store(self):
+        il = _layer(self.p, self.im)
+        with mock.patch.object(pcbre.model.imagelayer, "default_tile_store", return_value=self.store):
+            self.assertIs(il.pyramid.store, self.store)
+
+            il.set_decoded_data(self.im[:100])
+            self.assertIsNone(il.pyramid.store)
+
+
+@benchmark
+class test_tilestore_benchmark(unittest.TestCase):
+    def test_open(self):
+        h, w = 15000, 20000
+        n_images = 4
+
+        p = Project()
+        rng = numpy.random.default_rng(0)
+        for _ in range(n_images):
+            im = cv2.resize(rng.integers(0, 255, (h // 16, w // 16, 3), dtype=numpy.uint8), (w, h))
+            ok, buf = cv2.imencode(".jpg", im)
+            p.imagery.add_imagelayer(ImageLayer(p, p.unique_id_registry.generate(PersistentIDClass.ImageLayer),
+                                                "scan", buf.tobytes()))
+        del im
+
+        # Open, then fetch every tile needed to show each scan at full resolution across a 2000px wide view
+        def open_and_view(path):
+            start = time.perf_counter()
+            with mock.patch.object(pcbre.model.imagepyramid, "_default_cache", TileCache()):
+                p_new = DirTextIO.open_path(path)
+                for il in p_new.imagery.imagelayers:
+                    il.pyramid.view(numpy.identity(3), Rect.from_points(Point2(-0.2, -0.2), Point2(0.2, 0.2)),
+                                    0.4 / 2000)
+            return time.perf_counter() - start
+
+        with TemporaryDirectory() as path, TemporaryDirectory() as store_path:
+            DirTextIO.save_path(path, p)
+
+            store = TileStore(store_path)
+            with mock.patch.object(pcbre.model.imagelayer, "default_tile_store", return_value=store):
+                t_cold = open_and_view(path)
+                t_warm = open_and_view(path)
+
+        bench_report("open with %d %dx%d scans: cold tile store %.2fs, warm %.2fs" % (n_images, w, h, t_cold, t_warm))
+
+        self.assertLess(t_warm, t_cold)
@@ -0,0 +1,112 @@
+import unittest
+
+from pcbre.algo.geom import intersect
+from pcbre.algo.unionfind import UnionFind
+from pcbre.matrix import Point2
+from pcbre.model.artwork_geom import Trace
+from pcbre.model.project import Project
+from test.common import build_random_board
+
+__author__ = 'davidc'
+
+
+class test_unionfind(unittest.TestCase):
+    def test_singletons(self):
+        uf = UnionFind(range(5))
+        self.assertEqual(len(uf), 5)
+        self.assertEqual(len(uf.groups()), 5)
+        self.assertFalse(uf.connected(1, 2))
+
+    def test_union(self):
+        uf = UnionFind(range(6))
+        self.assertTrue(uf.union(0, 1))
+        self.assertTrue(uf.union(2, 3))
+        self.assertTrue(uf.union(1, 3))
+        self.assertFalse(uf.union(0, 2))
+
+        self.assertTrue(uf.connected(0, 3))
+        self.assertFalse(uf.connected(0, 4))
+        self.assertEqual(sorted(map(sorted, uf.groups())), [[0, 1, 2, 3], [4], [5]])
+
+    def test_incremental_add(self):
+        uf = UnionFind()
+        uf.add("a")
+        uf.add("b")
+        uf.union("a", "b")
+        uf.add("c")
+        uf.add("a")
+        self.assertEqual(len(uf), 3)
+        self.assertEqual(sorted(map(sorted, uf.groups())), [["a", "b"], ["c"]])
+
+    def test_groups_canonical(self):
+        pairs = [(0, 3), (4, 1), (3, 4), (5, 6)]
+
+        uf_a = UnionFind(range(8))
+        uf_a.union_all(pairs)
+
+        uf_b = UnionFind(range(8))
+        uf_b.union_all(reversed(pairs))
+
+        self.assertEqual(uf_a.groups(), uf_b.groups())
+        self.assertEqual(uf_a.groups(), [{0, 1, 3, 4}, {2}, {5, 6}, {7}])
+
+    def test_long_chain(self):
+        n = 10000
+        uf = UnionFind(range(n))
+        uf.union_all((i, i + 1) for i in range(n - 1))
+        self.assertEqual(len(uf.groups()), 1)
+        self.assertTrue(uf.connected(0, n - 1))
+
+
+class test_connectivity(unittest.TestCase):
+    def setUp(self):
+        self.p = Project()
+        self.l1 = self.p.stackup.add_layer("top", (1, 0, 0))
+        self.l2 = self.p.stackup.add_layer("bottom", (0, 0, 1))
+        self.vp = self.p.stackup.add_via_pair(self.l1, self.l2)
+
+    def test_matches_bruteforce(self):
+        build_random_board(self.p, 400)
+
+        all_geom = list(self.p.artwork.get_all_artwork())
+
+        ref = UnionFind(all_geom)
+        for n, a in enumerate(all_geom):
+            for b in all_geom[n + 1:]:
+                if intersect(a, b):
+                    ref.union(a, b)
+
+        expected = set(frozenset(i) for i in ref.groups())
+        got = set(frozenset(i) for i in self.p.artwork.compute_connected(all_geom))
+        self.assertEqual(got, expected)
+
+    def test_progress_reported(self):
+        build_random_board(self.p, 50)
+        calls = []
+        self.p.artwork.compute_connected(self.p.artwork.get_all_artwork(), lambda x, y: calls.append((x, y)))
+        self.assertEqual(calls, [(i, 50) for i in range(50)])
+
+    def test_incremental_edges(self):
+        a = Trace(Point2(0, 0), Point2(100, 0), 10, self.l1, self.p.nets.new())
+        b = Trace(Point2(1000, 0), Point2(1100, 0), 10, self.l1, self.p.nets.new())
+        self.p.artwork.add_artwork(a)
+        self.p.artwork.add_artwork(b)
+
+        uf = self.p.artwork.connectivity_for(self.p.artwork.get_all_artwork())
+        self.assertFalse(uf.connected(a, b))
+
+        c = Trace(Point2(100, 0), Point2(1000, 0), 10, self.l1, self.p.nets.new())
+        self.p.artwork.add_artwork(c)
+        uf.add(c)
+        for _, other in self.p.artwork.query_intersect(c):
+            if other in uf:
+                uf.union(c, other)
+
+        self.assertTrue(uf.connected(a, b))
+
+    def test_rebuild_random_board(self):
+        build_random_board(self.p, 10000, seed=1)
+        self.p.artwork.rebuild_connectivity()
+
+        for net in self.p.nets.nets:
+            self.assertGreater(len(self.p.artwork.get_geom_for_net(net)), 0)
@@ -0,0 +1,133 @@
+import time
+import unittest
+from unittest import mock
+
+import pcbre.accel.vert_array as vert_array
+from pcbre.accel.vert_array import VA_xy, VA_thickline, VA_via, alloc_stats, clear_pool
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+
+class test_va_alloc(unittest.TestCase):
+    def setUp(self):
+        clear_pool()
+
+    def tearDown(self):
+        clear_pool()
+
+    def test_growth_keeps_contents(self):
+        va = VA_xy(1)
+        for i in range(5000):
+            va.add_vertex(i, -i)
+
+        self.assertEqual(va.count(), 5000)
+        self.assertGreaterEqual(va.size(), 5000)
+        a = va.as_numpy()["vertex"]
+        self.assertEqual(a[0].tolist(), [0, 0])
+        self.assertEqual(a[-1].tolist(), [4999, -4999])
+
+    def test_growth_is_geometric(self):
+        va = VA_xy(1)
+        before = alloc_stats()
+        for i in range(100000):
+            va.add_vertex(i, i)
+        self.assertLess(alloc_stats().reallocs - before.reallocs, 20)
+
+    def test_zero_size(self):
+        va = VA_thickline(0)
+        va.add_thickline_array([[0, 0, 1, 1, 2]] * 3)
+        self.assertEqual(va.count(), 3)
+
+    def test_reserve_and_shrink(self):
+        va = VA_via(16)
+        va.reserve(10000)
+        self.assertGreaterEqual(va.size(), 10000)
+
+        # Reserving less than the capacity is a no-op
+        va.reserve(10)
+        self.assertGreaterEqual(va.size(), 10000)
+
+        before = alloc_stats()
+        va.add_donut_array([[i, i, 10, 5] for i in range(10000)])
+        self.assertEqual(alloc_stats().reallocs, before.reallocs)
+
+        data = bytes(va.buffer())
+        va.add_donut(0, 0, 1, 0)
+        va.shrink_to_fit()
+        self.assertEqual(va.size(), 10001)
+        self.assertEqual(bytes(va.buffer())[:len(data)], data)
+
+        va.clear()
+        va.shrink_to_fit()
+        self.assertEqual(va.size(), 1)
+
+    def test_pool(self):
+        VA_xy(1024).add_line(0, 0, 1, 1)
+        before = alloc_stats()
+
+        # Each frame's overlay array comes back out of the pool, emptied
+        for _ in range(10):
+            va = VA_xy(1024)
+            self.assertEqual(va.count(), 0)
+            va.add_line(0, 0, 1, 1)
+            del va
+
+        after = alloc_stats()
+        self.assertEqual(after.allocs, before.allocs)
+        self.assertEqual(after.pool_hits - before.pool_hits, 10)
+
+        # Only arrays of the same stride are shared
+        VA_thickline(16)
+        self.assertEqual(alloc_stats().allocs, after.allocs + 1)
+
+    def test_pool_limits(self):
+        with mock.patch.object(vert_array, "POOL_MAX_PER_STRIDE", 2):
+            arrays = [VA_xy(16) for _ in range(4)]
+            stride = arrays[0].stride
+            del arrays
+            self.assertEqual(len(vert_array._pool[stride]), 2)
+
+        # Large arrays are given back to malloc
+        clear_pool()
+        big = VA_xy(vert_array.POOL_MAX_BYTES)
+        del big
+        self.assertEqual(len(vert_array._pool[stride]), 0)
+
+        before = alloc_stats()
+        VA_xy(16)
+        self.assertEqual(alloc_stats().allocs, before.allocs + 1)
+
+
+@benchmark
+class test_va_alloc_benchmark(unittest.TestCase):
+    def test_overlay_frames(self):
+        n = 20000
+
+        # Large enough that malloc serves it with its own mmap, and munmaps it again on free
+        def frames():
+            for _ in range(n):
+                va = VA_xy(65536)
+                va.add_line(0, 0, 1, 1)
+                del va
+
+        clear_pool()
+        with mock.patch.object(vert_array, "POOL_MAX_PER_STRIDE", 0):
+            before = alloc_stats()
+            start = time.perf_counter()
+            frames()
+            t_malloc = (time.perf_counter() - start) / n
+            allocs_malloc = alloc_stats().allocs - before.allocs
+
+        before = alloc_stats()
+        start = time.perf_counter()
+        frames()
+        t_pool = (time.perf_counter() - start) / n
+        allocs_pool = alloc_stats().allocs - before.allocs
+        clear_pool()
+
+        bench_report("overlay VA per frame: malloc %.2fus (%d allocs), pooled %.2fus (%d allocs)" % (
+            t_malloc * 1e6, allocs_malloc, t_pool * 1e6, allocs_pool))
+
+        self.assertEqual(allocs_malloc, n)
+        self.assertLessEqual(allocs_pool, 1)
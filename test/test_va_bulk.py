@@ -0,0 +1,98 @@
+import time
+import unittest
+
+import numpy
+
+from pcbre.accel.vert_array import VA_xy, VA_thickline, VA_via, VA_tex
+from test.common import benchmark, bench_report
+
+__author__ = 'davidc'
+
+
+def _cases(n, seed=0):
+    rng = numpy.random.default_rng(seed)
+    return {
+        "thickline": (VA_thickline, VA_thickline.add_thickline, VA_thickline.add_thickline_array,
+                      rng.uniform(-1000, 1000, (n, 5))),
+        "donut": (VA_via, VA_via.add_donut, VA_via.add_donut_array,
+                  numpy.column_stack([rng.uniform(-1000, 1000, (n, 2)), rng.uniform(10, 20, n),
+                                      rng.uniform(0, 10, n)])),
+        "line": (VA_xy, VA_xy.add_line, VA_xy.add_line_array, rng.uniform(-1000, 1000, (n, 4))),
+        "box": (VA_xy, VA_xy.add_box, VA_xy.add_box_array,
+                numpy.column_stack([rng.uniform(-1000, 1000, (n, 4)), rng.uniform(0, 6, n)])),
+        "tex": (VA_tex, VA_tex.add_tex, VA_tex.add_tex_array, rng.uniform(0, 1, (n, 4))),
+    }
+
+
+class test_va_bulk(unittest.TestCase):
+    def test_matches_per_object(self):
+        for name, (cls, add_one, add_array, rows) in _cases(100).items():
+            one = cls(16)
+            for row in rows:
+                add_one(one, *row)
+
+            bulk = cls(16)
+            add_array(bulk, rows[:30])
+            add_array(bulk, rows[30:])
+
+            self.assertEqual(bulk.count(), one.count(), name)
+            self.assertEqual(bytes(bulk.buffer()), bytes(one.buffer()), name)
+
+    def test_empty_and_shape(self):
+        va = VA_thickline(16)
+        va.add_thickline_array([])
+        va.add_thickline_array(numpy.zeros((0, 5)))
+        self.assertEqual(va.count(), 0)
+
+        with self.assertRaises(ValueError):
+            va.add_thickline_array(numpy.zeros((3, 4)))
+        with self.assertRaises(ValueError):
+            va.add_thickline_array(numpy.zeros(5))
+
+        # Any array-like of numbers, in any layout
+        va.add_thickline_array([(0, 1, 2, 3, 4)])
+        va.add_thickline_array(numpy.arange(10, dtype=numpy.int32).reshape(5, 2).T)
+        self.assertEqual(va.as_numpy()["thickness"].tolist(), [4, 8, 9])
+
+    def test_as_numpy(self):
+        va = VA_via(16)
+        va.add_donut(1, 2, 4, 2)
+        va.add_donut(5, 6, 10, 0)
+
+        view = va.as_numpy()
+        self.assertEqual(view.dtype.itemsize, va.stride)
+        self.assertEqual(view["pos"].tolist(), [[1, 2], [5, 6]])
+        self.assertEqual(view["r"].tolist(), [4, 10])
+        self.assertEqual(view["r_inside_frac_sq"].tolist(), [0.25, 0])
+
+        # Writes go straight to the VA
+        view["r"][1] = 7
+        self.assertEqual(va.as_numpy()["r"][1], 7)
+
+        self.assertEqual(len(VA_xy(16).as_numpy()), 0)
+        for cls in (VA_xy, VA_thickline, VA_via, VA_tex):
+            self.assertEqual(cls.dtype.itemsize, cls(1).stride)
+
+
+@benchmark
+class test_va_bulk_benchmark(unittest.TestCase):
+    def test_append(self):
+        n = 1000000
+
+        for name, (cls, add_one, add_array, rows) in _cases(n).items():
+            row_list = rows.tolist()
+
+            start = time.perf_counter()
+            va = cls(1024)
+            for row in row_list:
+                add_one(va, *row)
+            t_one = time.perf_counter() - start
+
+            start = time.perf_counter()
+            va = cls(1024)
+            add_array(va, rows)
+            t_bulk = time.perf_counter() - start
+
+            bench_report("VA %s, %d rows: per object %.1fms, array %.2fms" % (name, n, t_one * 1000, t_bulk * 1000))
+
+            self.assertLess(t_bulk, t_one)